@@ -0,0 +1,81 @@
+"""
+Recall/latency benchmark of the in-process IVF index against exact search.
+
+Runs on an existing snapshot (``--dir``, as written by
+``python -m src.services.storage.snapshot``) or on a synthetic clustered
+corpus (``--synthetic N``), and prints one row per ``nprobe`` value so it can
+be tuned for the corpus size::
+
+    python -m benchmarks.ivf_recall --dir data/snapshot --nprobe 1 2 4 8 16 32
+    python -m benchmarks.ivf_recall --synthetic 100000 --lists 316
+"""
+import argparse
+import tempfile
+
+import numpy as np
+
+from src.services.storage.snapshot import EmbeddingSnapshot, write_snapshot
+
+SYNTHETIC_MODEL = "synthetic"
+
+
+def synthetic_pages(count: int, dim: int, clusters: int, page_size: int = 10_000, seed: int = 0):
+    """Pages of snapshot rows drawn around random cluster centers, like topical embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    for start in range(0, count, page_size):
+        size = min(page_size, count - start)
+        vectors = centers[rng.integers(0, clusters, size)] + 0.6 * rng.normal(size=(size, dim)).astype(np.float32)
+        yield [
+            {"id": f"row-{start + i}", "created_at": f"{start + i:012d}", "embeddings": vector.tolist()}
+            for i, vector in enumerate(vectors)
+        ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--dir", help="Existing snapshot directory")
+    source.add_argument("--synthetic", type=int, metavar="N", help="Build a synthetic snapshot of N vectors")
+    parser.add_argument("--model", default="text-embedding-ada-002", help="Embedding model of the --dir snapshot")
+    parser.add_argument("--dim", type=int, default=1536, help="Synthetic vector dimension")
+    parser.add_argument("--clusters", type=int, default=200, help="Synthetic topic clusters")
+    parser.add_argument("--lists", type=int, default=0, help="Synthetic IVF lists (0 = ~sqrt(N))")
+    parser.add_argument("--no-quantize", action="store_true", help="Score IVF candidates at full precision")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rerank-factor", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        if args.synthetic:
+            directory, model = scratch, SYNTHETIC_MODEL
+            pages = synthetic_pages(args.synthetic, args.dim, args.clusters)
+            write_snapshot(directory, pages, model, quantized=not args.no_quantize, ivf_lists=args.lists)
+        else:
+            directory, model = args.dir, args.model
+
+        snapshot = EmbeddingSnapshot.open(directory, model, quantized=not args.no_quantize)
+        if snapshot is None:
+            parser.error(f"No {model} snapshot in {directory}")
+        if snapshot.ivf is None:
+            parser.error("Snapshot has no IVF index; rewrite it without --ivf-lists -1")
+
+        sizes = snapshot.ivf.list_sizes()
+        print(f"{len(snapshot.ids)} vectors, {snapshot.ivf.n_lists} lists "
+              f"(sizes min {sizes.min()} / median {int(np.median(sizes))} / max {sizes.max()}), "
+              f"quantized={snapshot.quantized is not None}")
+        print(f"{'nprobe':>7} {'recall@' + str(args.limit):>10} {'ivf ms':>9} {'exact ms':>9} {'speedup':>8}")
+
+        for nprobe in args.nprobe:
+            report = snapshot.measure_recall(
+                queries=args.queries, limit=args.limit, rerank_factor=args.rerank_factor, nprobe=nprobe
+            )
+            speedup = report["exact_ms"] / report["approximate_ms"] if report["approximate_ms"] else float("inf")
+            print(f"{nprobe:>7} {report['recall']:>10.3f} {report['approximate_ms']:>9.2f} "
+                  f"{report['exact_ms']:>9.2f} {speedup:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
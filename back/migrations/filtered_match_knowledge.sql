@@ -0,0 +1,187 @@
+-- Migration: Filtered semantic search
+-- Resolves category / tags / content_type / created_after filters to the set of
+-- matching knowledge ids first and scores only those vectors, so a filtered search
+-- returns a true top-k of the filtered set and costs less than an unfiltered one.
+-- Category, tags (datainstances.tags must contain every filter tag) and content_type
+-- match the datainstances a knowledge row is attached to; created_after matches the
+-- knowledge row. Requires scoped_match_knowledge.sql and knowledge_chunks.sql.
+
+-- 1. Knowledge ids matching a scope (optional pet or wallet) and the filters
+CREATE OR REPLACE FUNCTION knowledge_filter_ids(
+  target_pet_id uuid DEFAULT NULL,
+  target_wallet_address text DEFAULT NULL,
+  filter_category text DEFAULT NULL,
+  filter_tags text[] DEFAULT NULL,
+  filter_content_type text DEFAULT NULL,
+  filter_created_after timestamptz DEFAULT NULL
+)
+RETURNS TABLE (knowledge_id uuid)
+LANGUAGE sql STABLE
+AS $$
+  SELECT DISTINCT dk.knowledge_id
+  FROM datainstances d
+  JOIN datainstance_knowledge dk ON dk.datainstance_id = d.id
+  JOIN knowledge k ON k.id = dk.knowledge_id
+  WHERE (target_pet_id IS NULL OR d.pet_id = target_pet_id)
+  AND (
+    target_wallet_address IS NULL
+    OR d.pet_id IN (SELECT p.id FROM pets p WHERE p.owner_wallet = target_wallet_address)
+  )
+  AND (filter_category IS NULL OR d.category = filter_category)
+  AND (filter_tags IS NULL OR d.tags @> filter_tags)
+  AND (filter_content_type IS NULL OR d.content_type = filter_content_type)
+  AND (filter_created_after IS NULL OR k.created_at >= filter_created_after);
+$$;
+
+-- 2. Exact top-k over the filtered knowledge
+CREATE OR REPLACE FUNCTION match_filtered_knowledge(
+  query_embedding vector(1536),
+  match_threshold float,
+  match_count int,
+  target_pet_id uuid DEFAULT NULL,
+  target_wallet_address text DEFAULT NULL,
+  filter_category text DEFAULT NULL,
+  filter_tags text[] DEFAULT NULL,
+  filter_content_type text DEFAULT NULL,
+  filter_created_after timestamptz DEFAULT NULL
+)
+RETURNS TABLE (
+  id uuid,
+  url text,
+  content text,
+  title text,
+  content_hash text,
+  metadata jsonb,
+  created_at timestamptz,
+  similarity float
+)
+LANGUAGE sql STABLE
+AS $$
+  WITH candidates AS MATERIALIZED (
+    SELECT f.knowledge_id
+    FROM knowledge_filter_ids(
+      target_pet_id, target_wallet_address,
+      filter_category, filter_tags, filter_content_type, filter_created_after
+    ) f
+  )
+  SELECT
+    k.id,
+    k.url,
+    k.content,
+    k.title,
+    k.content_hash,
+    k.metadata,
+    k.created_at,
+    1 - (k.embeddings <=> query_embedding) AS similarity
+  FROM candidates
+  JOIN knowledge k ON k.id = candidates.knowledge_id
+  WHERE k.embeddings IS NOT NULL
+  AND 1 - (k.embeddings <=> query_embedding) >= match_threshold
+  -- "+ 0" keeps the planner off the ivfflat index: only the candidates are scored, exactly
+  ORDER BY (k.embeddings <=> query_embedding) + 0
+  LIMIT match_count;
+$$;
+
+-- 3. Best passage per filtered knowledge item (document embedding for items without passages)
+CREATE OR REPLACE FUNCTION match_filtered_knowledge_chunks(
+  query_embedding vector(1536),
+  match_threshold float,
+  match_count int,
+  target_pet_id uuid DEFAULT NULL,
+  target_wallet_address text DEFAULT NULL,
+  filter_category text DEFAULT NULL,
+  filter_tags text[] DEFAULT NULL,
+  filter_content_type text DEFAULT NULL,
+  filter_created_after timestamptz DEFAULT NULL
+)
+RETURNS TABLE (
+  id uuid,
+  url text,
+  title text,
+  content text,
+  content_hash text,
+  metadata jsonb,
+  created_at timestamptz,
+  chunk_id uuid,
+  chunk_index int,
+  similarity float
+)
+LANGUAGE sql STABLE
+AS $$
+  WITH candidates AS MATERIALIZED (
+    SELECT f.knowledge_id
+    FROM knowledge_filter_ids(
+      target_pet_id, target_wallet_address,
+      filter_category, filter_tags, filter_content_type, filter_created_after
+    ) f
+  ),
+  best AS (
+    SELECT DISTINCT ON (c.knowledge_id)
+      c.id,
+      c.knowledge_id,
+      c.chunk_index,
+      c.content,
+      1 - (c.embeddings <=> query_embedding) AS similarity
+    FROM candidates
+    JOIN knowledge_chunks c ON c.knowledge_id = candidates.knowledge_id
+    WHERE c.embeddings IS NOT NULL
+    ORDER BY c.knowledge_id, c.embeddings <=> query_embedding
+  ),
+  ranked AS (
+    SELECT
+      k.id,
+      k.url,
+      k.title,
+      best.content,
+      k.content_hash,
+      k.metadata,
+      k.created_at,
+      best.id AS chunk_id,
+      best.chunk_index,
+      best.similarity
+    FROM best
+    JOIN knowledge k ON k.id = best.knowledge_id
+    UNION ALL
+    -- Knowledge without passages is ranked by its document embedding
+    SELECT
+      k.id,
+      k.url,
+      k.title,
+      k.content,
+      k.content_hash,
+      k.metadata,
+      k.created_at,
+      NULL::uuid AS chunk_id,
+      NULL::int AS chunk_index,
+      1 - (k.embeddings <=> query_embedding) AS similarity
+    FROM candidates
+    JOIN knowledge k ON k.id = candidates.knowledge_id
+    WHERE k.embeddings IS NOT NULL
+    AND NOT EXISTS (SELECT 1 FROM best WHERE best.knowledge_id = k.id)
+  )
+  SELECT *
+  FROM ranked
+  WHERE ranked.similarity >= match_threshold
+  ORDER BY ranked.similarity DESC
+  LIMIT match_count;
+$$;
+
+-- 4. Indexes for resolving the filters
+CREATE INDEX IF NOT EXISTS idx_datainstances_category
+ON public.datainstances(category);
+
+CREATE INDEX IF NOT EXISTS idx_datainstances_content_type
+ON public.datainstances(content_type);
+
+CREATE INDEX IF NOT EXISTS idx_datainstances_tags
+ON public.datainstances USING gin(tags);
+
+-- 5. Add comments for documentation
+COMMENT ON FUNCTION knowledge_filter_ids IS 'Distinct knowledge ids in a pet/wallet scope whose datainstances match category, tags and content_type filters';
+COMMENT ON FUNCTION match_filtered_knowledge IS 'Exact top-k cosine similarity search over the knowledge matching knowledge_filter_ids';
+COMMENT ON FUNCTION match_filtered_knowledge_chunks IS 'Best passage (document embedding for items without passages) per knowledge item matching knowledge_filter_ids';
+
+-- 6. Grant necessary permissions (adjust based on your setup)
+-- GRANT EXECUTE ON FUNCTION knowledge_filter_ids TO authenticated;
+-- GRANT EXECUTE ON FUNCTION match_filtered_knowledge TO authenticated;
+-- GRANT EXECUTE ON FUNCTION match_filtered_knowledge_chunks TO authenticated;
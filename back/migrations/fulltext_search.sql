@@ -0,0 +1,274 @@
+-- Migration: Ranked full-text search over the existing GIN tsvector indexes
+-- Matches use websearch_to_tsquery against to_tsvector('english', content), the
+-- same expression as idx_datainstances_content_fts / idx_knowledge_content_fts,
+-- so the GIN indexes drive the search. Hits are ranked with ts_rank, paged on
+-- (rank, id) and returned with a ts_headline snippet.
+
+-- 1. DataInstances of one pet
+CREATE OR REPLACE FUNCTION search_pet_datainstances(
+  search_query text,
+  target_pet_id uuid,
+  match_count int,
+  after_rank real DEFAULT NULL,
+  after_id uuid DEFAULT NULL
+)
+RETURNS TABLE (
+  id uuid,
+  pet_id uuid,
+  content text,
+  content_type text,
+  content_hash text,
+  category text,
+  tags text[],
+  metadata jsonb,
+  created_at timestamptz,
+  rank real,
+  snippet text
+)
+LANGUAGE sql STABLE
+AS $$
+  WITH hits AS (
+    SELECT
+      d.id,
+      d.pet_id,
+      d.content,
+      d.content_type,
+      d.content_hash,
+      d.category,
+      d.tags,
+      d.metadata,
+      d.created_at,
+      ts_rank(to_tsvector('english', d.content), q.query) AS rank,
+      q.query
+    FROM datainstances d, websearch_to_tsquery('english', search_query) AS q(query)
+    WHERE to_tsvector('english', d.content) @@ q.query
+    AND d.pet_id = target_pet_id
+  ),
+  page AS (
+    SELECT * FROM hits
+    WHERE after_rank IS NULL
+    OR (hits.rank, hits.id) < (after_rank, after_id)
+    ORDER BY hits.rank DESC, hits.id DESC
+    LIMIT match_count
+  )
+  -- Snippets are only built for the rows on the page
+  SELECT
+    page.id,
+    page.pet_id,
+    page.content,
+    page.content_type,
+    page.content_hash,
+    page.category,
+    page.tags,
+    page.metadata,
+    page.created_at,
+    page.rank,
+    ts_headline('english', page.content, page.query, 'MaxFragments=2, MinWords=8, MaxWords=30') AS snippet
+  FROM page
+  ORDER BY page.rank DESC, page.id DESC;
+$$;
+
+-- 2. DataInstances of every pet owned by a wallet
+CREATE OR REPLACE FUNCTION search_user_datainstances(
+  search_query text,
+  target_wallet_address text,
+  match_count int,
+  after_rank real DEFAULT NULL,
+  after_id uuid DEFAULT NULL
+)
+RETURNS TABLE (
+  id uuid,
+  pet_id uuid,
+  content text,
+  content_type text,
+  content_hash text,
+  category text,
+  tags text[],
+  metadata jsonb,
+  created_at timestamptz,
+  rank real,
+  snippet text
+)
+LANGUAGE sql STABLE
+AS $$
+  WITH hits AS (
+    SELECT
+      d.id,
+      d.pet_id,
+      d.content,
+      d.content_type,
+      d.content_hash,
+      d.category,
+      d.tags,
+      d.metadata,
+      d.created_at,
+      ts_rank(to_tsvector('english', d.content), q.query) AS rank,
+      q.query
+    FROM datainstances d, websearch_to_tsquery('english', search_query) AS q(query)
+    WHERE to_tsvector('english', d.content) @@ q.query
+    AND d.pet_id IN (SELECT p.id FROM pets p WHERE p.owner_wallet = target_wallet_address)
+  ),
+  page AS (
+    SELECT * FROM hits
+    WHERE after_rank IS NULL
+    OR (hits.rank, hits.id) < (after_rank, after_id)
+    ORDER BY hits.rank DESC, hits.id DESC
+    LIMIT match_count
+  )
+  -- Snippets are only built for the rows on the page
+  SELECT
+    page.id,
+    page.pet_id,
+    page.content,
+    page.content_type,
+    page.content_hash,
+    page.category,
+    page.tags,
+    page.metadata,
+    page.created_at,
+    page.rank,
+    ts_headline('english', page.content, page.query, 'MaxFragments=2, MinWords=8, MaxWords=30') AS snippet
+  FROM page
+  ORDER BY page.rank DESC, page.id DESC;
+$$;
+
+-- 3. Knowledge attached to one pet's datainstances
+CREATE OR REPLACE FUNCTION search_pet_knowledge(
+  search_query text,
+  target_pet_id uuid,
+  match_count int,
+  after_rank real DEFAULT NULL,
+  after_id uuid DEFAULT NULL
+)
+RETURNS TABLE (
+  id uuid,
+  url text,
+  title text,
+  content text,
+  content_hash text,
+  metadata jsonb,
+  created_at timestamptz,
+  rank real,
+  snippet text
+)
+LANGUAGE sql STABLE
+AS $$
+  WITH hits AS (
+    SELECT
+      k.id,
+      k.url,
+      k.title,
+      k.content,
+      k.content_hash,
+      k.metadata,
+      k.created_at,
+      ts_rank(to_tsvector('english', k.content), q.query) AS rank,
+      q.query
+    FROM knowledge k, websearch_to_tsquery('english', search_query) AS q(query)
+    WHERE to_tsvector('english', k.content) @@ q.query
+    AND EXISTS (
+      SELECT 1
+      FROM datainstance_knowledge dk
+      JOIN datainstances d ON d.id = dk.datainstance_id
+      WHERE dk.knowledge_id = k.id
+      AND d.pet_id = target_pet_id
+    )
+  ),
+  page AS (
+    SELECT * FROM hits
+    WHERE after_rank IS NULL
+    OR (hits.rank, hits.id) < (after_rank, after_id)
+    ORDER BY hits.rank DESC, hits.id DESC
+    LIMIT match_count
+  )
+  -- Snippets are only built for the rows on the page
+  SELECT
+    page.id,
+    page.url,
+    page.title,
+    page.content,
+    page.content_hash,
+    page.metadata,
+    page.created_at,
+    page.rank,
+    ts_headline('english', page.content, page.query, 'MaxFragments=2, MinWords=8, MaxWords=30') AS snippet
+  FROM page
+  ORDER BY page.rank DESC, page.id DESC;
+$$;
+
+-- 4. Knowledge attached to the datainstances of a wallet's pets
+CREATE OR REPLACE FUNCTION search_user_knowledge(
+  search_query text,
+  target_wallet_address text,
+  match_count int,
+  after_rank real DEFAULT NULL,
+  after_id uuid DEFAULT NULL
+)
+RETURNS TABLE (
+  id uuid,
+  url text,
+  title text,
+  content text,
+  content_hash text,
+  metadata jsonb,
+  created_at timestamptz,
+  rank real,
+  snippet text
+)
+LANGUAGE sql STABLE
+AS $$
+  WITH hits AS (
+    SELECT
+      k.id,
+      k.url,
+      k.title,
+      k.content,
+      k.content_hash,
+      k.metadata,
+      k.created_at,
+      ts_rank(to_tsvector('english', k.content), q.query) AS rank,
+      q.query
+    FROM knowledge k, websearch_to_tsquery('english', search_query) AS q(query)
+    WHERE to_tsvector('english', k.content) @@ q.query
+    AND EXISTS (
+      SELECT 1
+      FROM datainstance_knowledge dk
+      JOIN datainstances d ON d.id = dk.datainstance_id
+      JOIN pets p ON p.id = d.pet_id
+      WHERE dk.knowledge_id = k.id
+      AND p.owner_wallet = target_wallet_address
+    )
+  ),
+  page AS (
+    SELECT * FROM hits
+    WHERE after_rank IS NULL
+    OR (hits.rank, hits.id) < (after_rank, after_id)
+    ORDER BY hits.rank DESC, hits.id DESC
+    LIMIT match_count
+  )
+  -- Snippets are only built for the rows on the page
+  SELECT
+    page.id,
+    page.url,
+    page.title,
+    page.content,
+    page.content_hash,
+    page.metadata,
+    page.created_at,
+    page.rank,
+    ts_headline('english', page.content, page.query, 'MaxFragments=2, MinWords=8, MaxWords=30') AS snippet
+  FROM page
+  ORDER BY page.rank DESC, page.id DESC;
+$$;
+
+-- 5. Add comments for documentation
+COMMENT ON FUNCTION search_pet_datainstances IS 'Ranked full-text search over a pet''s datainstances, with snippets';
+COMMENT ON FUNCTION search_user_datainstances IS 'Ranked full-text search over the datainstances of a wallet''s pets, with snippets';
+COMMENT ON FUNCTION search_pet_knowledge IS 'Ranked full-text search over the knowledge attached to a pet, with snippets';
+COMMENT ON FUNCTION search_user_knowledge IS 'Ranked full-text search over the knowledge attached to a wallet''s pets, with snippets';
+
+-- 6. Grant necessary permissions (adjust based on your setup)
+-- GRANT EXECUTE ON FUNCTION search_pet_datainstances TO authenticated;
+-- GRANT EXECUTE ON FUNCTION search_user_datainstances TO authenticated;
+-- GRANT EXECUTE ON FUNCTION search_pet_knowledge TO authenticated;
+-- GRANT EXECUTE ON FUNCTION search_user_knowledge TO authenticated;
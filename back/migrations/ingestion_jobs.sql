@@ -0,0 +1,53 @@
+-- Migration: Background knowledge ingestion jobs
+-- Durable queue behind POST /storage/pets/{pet_id}/instances: the data instance is
+-- written inline and its knowledge_list is scraped, embedded and attached by the
+-- in-process worker pool (src/services/storage/ingestion.py). Jobs survive restarts;
+-- a running job's lease is renewed by its worker, and a job left running by a dead
+-- worker is picked up again once its lease expires.
+
+-- 1. Jobs table
+CREATE TABLE IF NOT EXISTS public.ingestion_jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    datainstance_id UUID NOT NULL REFERENCES public.datainstances(id) ON DELETE CASCADE,
+    pet_id UUID NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued'
+        CHECK (status IN ('queued', 'running', 'succeeded', 'partial', 'failed')),
+    items JSONB NOT NULL DEFAULT '[]',  -- per-item input, status, error and knowledge_id
+    total INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 4,
+    last_error TEXT,
+    lease_id UUID,
+    run_after TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    locked_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Tables created before leases were tracked
+ALTER TABLE public.ingestion_jobs ADD COLUMN IF NOT EXISTS lease_id UUID;
+
+-- 2. Indexes for claiming due jobs and listing an instance's jobs
+CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_due
+ON public.ingestion_jobs(run_after)
+WHERE status = 'queued';
+
+CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_running
+ON public.ingestion_jobs(locked_at)
+WHERE status = 'running';
+
+CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_datainstance
+ON public.ingestion_jobs(datainstance_id);
+
+-- 3. Add comments for documentation
+COMMENT ON TABLE public.ingestion_jobs IS 'Background scrape/embed/attach jobs for data instance knowledge';
+COMMENT ON COLUMN public.ingestion_jobs.items IS 'One entry per knowledge item: input, status (pending/stored/retrying/failed), error, knowledge_id';
+COMMENT ON COLUMN public.ingestion_jobs.run_after IS 'Earliest time a queued job may run; pushed back with exponential backoff on retry';
+COMMENT ON COLUMN public.ingestion_jobs.lease_id IS 'Claim currently allowed to run the job and record its results';
+COMMENT ON COLUMN public.ingestion_jobs.locked_at IS 'When the worker holding the lease last renewed it; running jobs older than the lease are reclaimed';
+
+-- 4. Grant necessary permissions (adjust based on your setup)
+-- GRANT SELECT, INSERT, UPDATE ON public.ingestion_jobs TO authenticated;
@@ -0,0 +1,293 @@
+-- Migration: Chunked knowledge passages with their own embeddings
+-- Long knowledge content is split into overlapping, token-bounded passages that
+-- are embedded one by one. Semantic search ranks passages and returns the best
+-- passage per knowledge item, so each hit carries a short, relevant excerpt
+-- instead of the whole document. Requires add_embeddings.sql to have been applied.
+
+-- 1. Passage table
+CREATE TABLE IF NOT EXISTS public.knowledge_chunks (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  knowledge_id UUID NOT NULL REFERENCES public.knowledge(id) ON DELETE CASCADE,
+  chunk_index INT NOT NULL,
+  content TEXT NOT NULL,
+  char_start INT NOT NULL,
+  char_end INT NOT NULL,
+  token_count INT NOT NULL,
+  embeddings vector(1536),
+  created_at TIMESTAMPTZ DEFAULT NOW(),
+  UNIQUE(knowledge_id, chunk_index)
+);
+
+-- 2. Indexes: passage vectors, and the lookup from a knowledge item to its passages
+CREATE INDEX IF NOT EXISTS idx_knowledge_chunks_embeddings
+ON public.knowledge_chunks
+USING ivfflat (embeddings vector_cosine_ops)
+WITH (lists = 100);
+
+CREATE INDEX IF NOT EXISTS idx_knowledge_chunks_knowledge
+ON public.knowledge_chunks(knowledge_id);
+
+-- 3. Best passage per knowledge item across all knowledge.
+-- The nearest candidate_count passages (default 5 x match_count) are taken from the
+-- vector index, then reduced to the best one per knowledge item. Knowledge without
+-- passages (stored before this migration and not yet backfilled, or whose chunking
+-- failed) is ranked by its document embedding instead, so it stays searchable.
+CREATE OR REPLACE FUNCTION match_all_knowledge_chunks(
+  query_embedding vector(1536),
+  match_threshold float,
+  match_count int,
+  candidate_count int DEFAULT NULL
+)
+RETURNS TABLE (
+  id uuid,
+  url text,
+  title text,
+  content text,
+  content_hash text,
+  metadata jsonb,
+  created_at timestamptz,
+  chunk_id uuid,
+  chunk_index int,
+  similarity float
+)
+LANGUAGE sql STABLE
+AS $$
+  WITH candidates AS (
+    SELECT
+      c.id,
+      c.knowledge_id,
+      c.chunk_index,
+      c.content,
+      1 - (c.embeddings <=> query_embedding) AS similarity
+    FROM knowledge_chunks c
+    WHERE c.embeddings IS NOT NULL
+    ORDER BY c.embeddings <=> query_embedding
+    LIMIT COALESCE(candidate_count, match_count * 5)
+  ),
+  best AS (
+    SELECT DISTINCT ON (candidates.knowledge_id) *
+    FROM candidates
+    WHERE candidates.similarity >= match_threshold
+    ORDER BY candidates.knowledge_id, candidates.similarity DESC
+  ),
+  documents AS (
+    SELECT
+      k.id,
+      1 - (k.embeddings <=> query_embedding) AS similarity
+    FROM knowledge k
+    WHERE k.embeddings IS NOT NULL
+    ORDER BY k.embeddings <=> query_embedding
+    LIMIT COALESCE(candidate_count, match_count * 5)
+  ),
+  ranked AS (
+    SELECT
+      k.id,
+      k.url,
+      k.title,
+      best.content,
+      k.content_hash,
+      k.metadata,
+      k.created_at,
+      best.id AS chunk_id,
+      best.chunk_index,
+      best.similarity
+    FROM best
+    JOIN knowledge k ON k.id = best.knowledge_id
+    UNION ALL
+    SELECT
+      k.id,
+      k.url,
+      k.title,
+      k.content,
+      k.content_hash,
+      k.metadata,
+      k.created_at,
+      NULL::uuid AS chunk_id,
+      NULL::int AS chunk_index,
+      documents.similarity
+    FROM documents
+    JOIN knowledge k ON k.id = documents.id
+    WHERE documents.similarity >= match_threshold
+    AND NOT EXISTS (
+      SELECT 1 FROM knowledge_chunks c
+      WHERE c.knowledge_id = documents.id AND c.embeddings IS NOT NULL
+    )
+  )
+  SELECT *
+  FROM ranked
+  ORDER BY ranked.similarity DESC
+  LIMIT match_count;
+$$;
+
+-- 4. Best passage per knowledge item attached to one pet's datainstances.
+-- The pet's knowledge ids are resolved first and all of their passages are scored
+-- exactly (filtering an index scan afterwards would under-return); items without
+-- passages fall back to their document embedding. candidate_count is unused.
+CREATE OR REPLACE FUNCTION match_pet_knowledge_chunks(
+  query_embedding vector(1536),
+  match_threshold float,
+  match_count int,
+  target_pet_id uuid,
+  candidate_count int DEFAULT NULL
+)
+RETURNS TABLE (
+  id uuid,
+  url text,
+  title text,
+  content text,
+  content_hash text,
+  metadata jsonb,
+  created_at timestamptz,
+  chunk_id uuid,
+  chunk_index int,
+  similarity float
+)
+LANGUAGE sql STABLE
+AS $$
+  WITH candidates AS MATERIALIZED (
+    SELECT DISTINCT dk.knowledge_id
+    FROM datainstance_knowledge dk
+    JOIN datainstances d ON d.id = dk.datainstance_id
+    WHERE d.pet_id = target_pet_id
+  ),
+  best AS (
+    SELECT DISTINCT ON (c.knowledge_id)
+      c.id,
+      c.knowledge_id,
+      c.chunk_index,
+      c.content,
+      1 - (c.embeddings <=> query_embedding) AS similarity
+    FROM candidates
+    JOIN knowledge_chunks c ON c.knowledge_id = candidates.knowledge_id
+    WHERE c.embeddings IS NOT NULL
+    ORDER BY c.knowledge_id, c.embeddings <=> query_embedding
+  ),
+  ranked AS (
+    SELECT
+      k.id,
+      k.url,
+      k.title,
+      best.content,
+      k.content_hash,
+      k.metadata,
+      k.created_at,
+      best.id AS chunk_id,
+      best.chunk_index,
+      best.similarity
+    FROM best
+    JOIN knowledge k ON k.id = best.knowledge_id
+    UNION ALL
+    SELECT
+      k.id,
+      k.url,
+      k.title,
+      k.content,
+      k.content_hash,
+      k.metadata,
+      k.created_at,
+      NULL::uuid AS chunk_id,
+      NULL::int AS chunk_index,
+      1 - (k.embeddings <=> query_embedding) AS similarity
+    FROM candidates
+    JOIN knowledge k ON k.id = candidates.knowledge_id
+    WHERE k.embeddings IS NOT NULL
+    AND NOT EXISTS (SELECT 1 FROM best WHERE best.knowledge_id = k.id)
+  )
+  SELECT *
+  FROM ranked
+  WHERE ranked.similarity >= match_threshold
+  ORDER BY ranked.similarity DESC
+  LIMIT match_count;
+$$;
+
+-- 5. Best passage per knowledge item attached to any pet owned by a wallet, scored
+-- like match_pet_knowledge_chunks
+CREATE OR REPLACE FUNCTION match_user_knowledge_chunks(
+  query_embedding vector(1536),
+  match_threshold float,
+  match_count int,
+  target_wallet_address text,
+  candidate_count int DEFAULT NULL
+)
+RETURNS TABLE (
+  id uuid,
+  url text,
+  title text,
+  content text,
+  content_hash text,
+  metadata jsonb,
+  created_at timestamptz,
+  chunk_id uuid,
+  chunk_index int,
+  similarity float
+)
+LANGUAGE sql STABLE
+AS $$
+  WITH candidates AS MATERIALIZED (
+    SELECT DISTINCT dk.knowledge_id
+    FROM datainstance_knowledge dk
+    JOIN datainstances d ON d.id = dk.datainstance_id
+    JOIN pets p ON p.id = d.pet_id
+    WHERE p.owner_wallet = target_wallet_address
+  ),
+  best AS (
+    SELECT DISTINCT ON (c.knowledge_id)
+      c.id,
+      c.knowledge_id,
+      c.chunk_index,
+      c.content,
+      1 - (c.embeddings <=> query_embedding) AS similarity
+    FROM candidates
+    JOIN knowledge_chunks c ON c.knowledge_id = candidates.knowledge_id
+    WHERE c.embeddings IS NOT NULL
+    ORDER BY c.knowledge_id, c.embeddings <=> query_embedding
+  ),
+  ranked AS (
+    SELECT
+      k.id,
+      k.url,
+      k.title,
+      best.content,
+      k.content_hash,
+      k.metadata,
+      k.created_at,
+      best.id AS chunk_id,
+      best.chunk_index,
+      best.similarity
+    FROM best
+    JOIN knowledge k ON k.id = best.knowledge_id
+    UNION ALL
+    SELECT
+      k.id,
+      k.url,
+      k.title,
+      k.content,
+      k.content_hash,
+      k.metadata,
+      k.created_at,
+      NULL::uuid AS chunk_id,
+      NULL::int AS chunk_index,
+      1 - (k.embeddings <=> query_embedding) AS similarity
+    FROM candidates
+    JOIN knowledge k ON k.id = candidates.knowledge_id
+    WHERE k.embeddings IS NOT NULL
+    AND NOT EXISTS (SELECT 1 FROM best WHERE best.knowledge_id = k.id)
+  )
+  SELECT *
+  FROM ranked
+  WHERE ranked.similarity >= match_threshold
+  ORDER BY ranked.similarity DESC
+  LIMIT match_count;
+$$;
+
+-- 6. Add comments for documentation
+COMMENT ON TABLE public.knowledge_chunks IS 'Overlapping, token-bounded passages of knowledge content, each with its own embedding';
+COMMENT ON FUNCTION match_all_knowledge_chunks IS 'Best-matching passage per knowledge item (document embedding for items without passages), across all knowledge';
+COMMENT ON FUNCTION match_pet_knowledge_chunks IS 'Exact best-matching passage per knowledge item (document embedding for items without passages) attached to a pet';
+COMMENT ON FUNCTION match_user_knowledge_chunks IS 'Exact best-matching passage per knowledge item (document embedding for items without passages) attached to a wallet''s pets';
+
+-- 7. Grant necessary permissions (adjust based on your setup)
+-- GRANT SELECT, INSERT, UPDATE, DELETE ON public.knowledge_chunks TO authenticated;
+-- GRANT EXECUTE ON FUNCTION match_all_knowledge_chunks TO authenticated;
+-- GRANT EXECUTE ON FUNCTION match_pet_knowledge_chunks TO authenticated;
+-- GRANT EXECUTE ON FUNCTION match_user_knowledge_chunks TO authenticated;
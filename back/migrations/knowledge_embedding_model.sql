@@ -0,0 +1,22 @@
+-- Migration: Record the embedding model of each knowledge vector
+-- Lets ingestion reuse the stored vector of any knowledge row with the same
+-- content_hash (e.g. a popular link attached by many pets) instead of calling
+-- the embeddings API again. Requires add_embeddings.sql to have been applied.
+
+-- 1. Add the model column
+ALTER TABLE public.knowledge
+ADD COLUMN IF NOT EXISTS embedding_model TEXT;
+
+-- 2. Existing vectors were all produced by ada-002
+UPDATE public.knowledge
+SET embedding_model = 'text-embedding-ada-002'
+WHERE embeddings IS NOT NULL
+AND embedding_model IS NULL;
+
+-- 3. Lookup index for (content_hash, embedding_model) among rows that have a vector
+CREATE INDEX IF NOT EXISTS idx_knowledge_content_hash_model
+ON public.knowledge(content_hash, embedding_model)
+WHERE embeddings IS NOT NULL;
+
+-- 4. Add comments for documentation
+COMMENT ON COLUMN public.knowledge.embedding_model IS 'Embedding model that produced the embeddings vector';
@@ -0,0 +1,56 @@
+-- Migration: Pet- and wallet-scoped knowledge functions
+-- Return each knowledge row linked to a pet (or to any pet of a wallet) exactly
+-- once, in a single round trip. Both are plain SQL functions returning
+-- SETOF knowledge, so PostgREST select/order/limit/filters on the RPC call are
+-- inlined into the query plan.
+
+-- 1. Knowledge attached to one pet's datainstances
+CREATE OR REPLACE FUNCTION pet_knowledge(target_pet_id uuid)
+RETURNS SETOF knowledge
+LANGUAGE sql STABLE
+AS $$
+  SELECT k.*
+  FROM knowledge k
+  WHERE EXISTS (
+    SELECT 1
+    FROM datainstance_knowledge dk
+    JOIN datainstances d ON d.id = dk.datainstance_id
+    WHERE dk.knowledge_id = k.id
+    AND d.pet_id = target_pet_id
+  );
+$$;
+
+-- 2. Knowledge attached to any pet owned by a wallet
+CREATE OR REPLACE FUNCTION user_knowledge(target_wallet_address text)
+RETURNS SETOF knowledge
+LANGUAGE sql STABLE
+AS $$
+  SELECT k.*
+  FROM knowledge k
+  WHERE EXISTS (
+    SELECT 1
+    FROM datainstance_knowledge dk
+    JOIN datainstances d ON d.id = dk.datainstance_id
+    JOIN pets p ON p.id = d.pet_id
+    WHERE dk.knowledge_id = k.id
+    AND p.owner_wallet = target_wallet_address
+  );
+$$;
+
+-- 3. Supporting indexes for the scope joins and the (created_at, id) keyset order
+CREATE INDEX IF NOT EXISTS idx_datainstance_knowledge_knowledge
+ON public.datainstance_knowledge(knowledge_id);
+
+CREATE INDEX IF NOT EXISTS idx_datainstances_pet_created
+ON public.datainstances(pet_id, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_knowledge_created
+ON public.knowledge(created_at DESC, id DESC);
+
+-- 4. Add comments for documentation
+COMMENT ON FUNCTION pet_knowledge IS 'Distinct knowledge attached to a pet''s datainstances';
+COMMENT ON FUNCTION user_knowledge IS 'Distinct knowledge attached to the datainstances of a wallet''s pets';
+
+-- 5. Grant necessary permissions (adjust based on your setup)
+-- GRANT EXECUTE ON FUNCTION pet_knowledge TO authenticated;
+-- GRANT EXECUTE ON FUNCTION user_knowledge TO authenticated;
@@ -0,0 +1,141 @@
+-- Migration: Scoped pgVector semantic search functions
+-- Pushes ranking into Postgres so only the top-k rows (without their vectors)
+-- are returned over PostgREST. Requires add_embeddings.sql to have been applied.
+-- The scoped functions resolve the pet's (or wallet's) knowledge ids first and score
+-- only those exactly: an ivfflat scan filtered afterwards only sees the probed lists
+-- (ivfflat.probes = 1 by default) and silently returns fewer than match_count rows.
+
+-- 1. Global search across all knowledge
+CREATE OR REPLACE FUNCTION match_all_knowledge(
+  query_embedding vector(1536),
+  match_threshold float,
+  match_count int
+)
+RETURNS TABLE (
+  id uuid,
+  url text,
+  content text,
+  title text,
+  content_hash text,
+  metadata jsonb,
+  created_at timestamptz,
+  similarity float
+)
+LANGUAGE sql STABLE
+AS $$
+  SELECT
+    k.id,
+    k.url,
+    k.content,
+    k.title,
+    k.content_hash,
+    k.metadata,
+    k.created_at,
+    1 - (k.embeddings <=> query_embedding) AS similarity
+  FROM knowledge k
+  WHERE k.embeddings IS NOT NULL
+  AND 1 - (k.embeddings <=> query_embedding) >= match_threshold
+  ORDER BY k.embeddings <=> query_embedding
+  LIMIT match_count;
+$$;
+
+-- 2. Search restricted to the knowledge attached to one pet's datainstances
+CREATE OR REPLACE FUNCTION match_pet_knowledge(
+  query_embedding vector(1536),
+  match_threshold float,
+  match_count int,
+  target_pet_id uuid
+)
+RETURNS TABLE (
+  id uuid,
+  url text,
+  content text,
+  title text,
+  content_hash text,
+  metadata jsonb,
+  created_at timestamptz,
+  similarity float
+)
+LANGUAGE sql STABLE
+AS $$
+  WITH candidates AS MATERIALIZED (
+    SELECT DISTINCT dk.knowledge_id
+    FROM datainstance_knowledge dk
+    JOIN datainstances d ON d.id = dk.datainstance_id
+    WHERE d.pet_id = target_pet_id
+  )
+  SELECT
+    k.id,
+    k.url,
+    k.content,
+    k.title,
+    k.content_hash,
+    k.metadata,
+    k.created_at,
+    1 - (k.embeddings <=> query_embedding) AS similarity
+  FROM candidates
+  JOIN knowledge k ON k.id = candidates.knowledge_id
+  WHERE k.embeddings IS NOT NULL
+  AND 1 - (k.embeddings <=> query_embedding) >= match_threshold
+  -- "+ 0" keeps the planner off the ivfflat index: only the candidates are scored, exactly
+  ORDER BY (k.embeddings <=> query_embedding) + 0
+  LIMIT match_count;
+$$;
+
+-- 3. Search restricted to the knowledge attached to any pet owned by a wallet
+CREATE OR REPLACE FUNCTION match_user_knowledge(
+  query_embedding vector(1536),
+  match_threshold float,
+  match_count int,
+  target_wallet_address text
+)
+RETURNS TABLE (
+  id uuid,
+  url text,
+  content text,
+  title text,
+  content_hash text,
+  metadata jsonb,
+  created_at timestamptz,
+  similarity float
+)
+LANGUAGE sql STABLE
+AS $$
+  WITH candidates AS MATERIALIZED (
+    SELECT DISTINCT dk.knowledge_id
+    FROM datainstance_knowledge dk
+    JOIN datainstances d ON d.id = dk.datainstance_id
+    JOIN pets p ON p.id = d.pet_id
+    WHERE p.owner_wallet = target_wallet_address
+  )
+  SELECT
+    k.id,
+    k.url,
+    k.content,
+    k.title,
+    k.content_hash,
+    k.metadata,
+    k.created_at,
+    1 - (k.embeddings <=> query_embedding) AS similarity
+  FROM candidates
+  JOIN knowledge k ON k.id = candidates.knowledge_id
+  WHERE k.embeddings IS NOT NULL
+  AND 1 - (k.embeddings <=> query_embedding) >= match_threshold
+  -- "+ 0" keeps the planner off the ivfflat index: only the candidates are scored, exactly
+  ORDER BY (k.embeddings <=> query_embedding) + 0
+  LIMIT match_count;
+$$;
+
+-- 4. Supporting index for the join from knowledge back to its datainstances
+CREATE INDEX IF NOT EXISTS idx_datainstance_knowledge_knowledge
+ON public.datainstance_knowledge(knowledge_id);
+
+-- 5. Add comments for documentation
+COMMENT ON FUNCTION match_all_knowledge IS 'Top-k cosine similarity search over all knowledge, without returning vectors';
+COMMENT ON FUNCTION match_pet_knowledge IS 'Exact top-k cosine similarity search over the knowledge attached to a pet';
+COMMENT ON FUNCTION match_user_knowledge IS 'Exact top-k cosine similarity search over the knowledge attached to a wallet''s pets';
+
+-- 6. Grant necessary permissions (adjust based on your setup)
+-- GRANT EXECUTE ON FUNCTION match_all_knowledge TO authenticated;
+-- GRANT EXECUTE ON FUNCTION match_pet_knowledge TO authenticated;
+-- GRANT EXECUTE ON FUNCTION match_user_knowledge TO authenticated;
@@ -38,6 +38,105 @@ class Settings(BaseSettings):
     supabase_url_prod: str | None = Field(None, env="SUPABASE_URL_PROD")
     supabase_key_prod: str | None = Field(None, env="SUPABASE_KEY_PROD")
 
+    # Semantic search: rank in Postgres via the match_*_knowledge RPCs
+    # (migrations/scoped_match_knowledge.sql), falling back to in-process scoring
+    semantic_search_rpc: bool = Field(True, env="SEMANTIC_SEARCH_RPC")
+
+    # Hybrid search: hits taken from each retriever before reciprocal rank fusion, and the RRF k constant
+    hybrid_search_candidates: int = Field(50, env="HYBRID_SEARCH_CANDIDATES")
+    hybrid_rrf_k: int = Field(60, env="HYBRID_RRF_K")
+
+    # Knowledge passages (migrations/knowledge_chunks.sql): content is split into overlapping,
+    # token-bounded chunks embedded on their own; semantic search returns the best chunk per item
+    knowledge_chunks_enabled: bool = Field(True, env="KNOWLEDGE_CHUNKS_ENABLED")
+    chunk_max_tokens: int = Field(400, env="CHUNK_MAX_TOKENS")
+    chunk_overlap_tokens: int = Field(50, env="CHUNK_OVERLAP_TOKENS")
+    # Whole-document embedding inputs are truncated to stay under the model's input limit
+    embedding_max_input_tokens: int = Field(6000, env="EMBEDDING_MAX_INPUT_TOKENS")
+
+    # Embedding cache: in-memory LRU, plus an optional SQLite tier when a path is set
+    embedding_cache_size: int = Field(2048, env="EMBEDDING_CACHE_SIZE")
+    embedding_cache_path: str | None = Field(None, env="EMBEDDING_CACHE_PATH")
+    embedding_cache_disk_entries: int = Field(100_000, env="EMBEDDING_CACHE_DISK_ENTRIES")
+
+    # In-process semantic search: memory budget for cached per-pet / per-wallet vector shards, and
+    # how long a shard is served before it is reloaded (picks up writes from other processes)
+    vector_shard_cache_mb: int = Field(256, env="VECTOR_SHARD_CACHE_MB")
+    vector_shard_ttl_seconds: float = Field(300.0, env="VECTOR_SHARD_TTL_SECONDS")
+    # Memory-mapped snapshot of all knowledge vectors for global search, and how often it pulls newer rows
+    embedding_snapshot_dir: str | None = Field(None, env="EMBEDDING_SNAPSHOT_DIR")
+    embedding_snapshot_refresh_seconds: int = Field(60, env="EMBEDDING_SNAPSHOT_REFRESH_SECONDS")
+    # Int8 codes (optionally PCA-reduced) score the snapshot first; the best limit * factor
+    # candidates are re-ranked with the full-precision vectors
+    embedding_snapshot_quantized: bool = Field(True, env="EMBEDDING_SNAPSHOT_QUANTIZED")
+    embedding_snapshot_pca_dim: int = Field(0, env="EMBEDDING_SNAPSHOT_PCA_DIM")
+    quantized_rerank_factor: int = Field(10, env="QUANTIZED_RERANK_FACTOR")
+    # IVF index over the snapshot: lists trained when it is written (0 = ~sqrt(rows)), and lists
+    # probed per query unless the request sets nprobe (0 = exact scan)
+    ivf_lists: int = Field(0, env="IVF_LISTS")
+    ivf_nprobe: int = Field(0, env="IVF_NPROBE")
+    # Filtered in-process semantic search scores only the matching knowledge when the filters match at
+    # most this many items; broader filters (or a missing knowledge_filter_ids RPC) rank unfiltered,
+    # over-fetching OVERFETCH x limit results and post-filtering them, checking at most MAX_IDS results
+    knowledge_filter_max_ids: int = Field(50_000, env="KNOWLEDGE_FILTER_MAX_IDS")
+    knowledge_filter_overfetch: int = Field(4, env="KNOWLEDGE_FILTER_OVERFETCH")
+
+    # URL ingestion: scrapes run concurrently on a shared pool of this many threads; a scrape
+    # running (or queued) longer than the timeout is reported as timed out for that URL
+    scrape_max_workers: int = Field(8, env="SCRAPE_MAX_WORKERS")
+    scrape_timeout_seconds: float = Field(45.0, env="SCRAPE_TIMEOUT_SECONDS")
+    # Most URLs accepted by one POST /scraper/batch request
+    scrape_batch_max_urls: int = Field(100, env="SCRAPE_BATCH_MAX_URLS")
+
+    # Scrape cache keyed by canonical URL: results are fresh for the TTL, then served stale for up to
+    # SCRAPE_CACHE_STALE_SECONDS more while a background scrape refreshes them. In-memory LRU, plus
+    # an optional SQLite tier (bounded by payload size) when a path is set
+    scrape_cache_ttl_seconds: int = Field(6 * 3600, env="SCRAPE_CACHE_TTL_SECONDS")
+    scrape_cache_stale_seconds: int = Field(7 * 24 * 3600, env="SCRAPE_CACHE_STALE_SECONDS")
+    scrape_cache_size: int = Field(1024, env="SCRAPE_CACHE_SIZE")
+    scrape_cache_path: str | None = Field(None, env="SCRAPE_CACHE_PATH")
+    scrape_cache_disk_mb: int = Field(512, env="SCRAPE_CACHE_DISK_MB")
+
+    # Background ingestion (migrations/ingestion_jobs.sql): worker threads, attempts per job before
+    # giving up on failed items, exponential retry backoff bounds, idle poll interval, and how long
+    # a running job may go without finishing before another worker reclaims it
+    ingestion_workers: int = Field(4, env="INGESTION_WORKERS")
+    ingestion_max_attempts: int = Field(4, env="INGESTION_MAX_ATTEMPTS")
+    ingestion_retry_base_seconds: float = Field(5.0, env="INGESTION_RETRY_BASE_SECONDS")
+    ingestion_retry_max_seconds: float = Field(300.0, env="INGESTION_RETRY_MAX_SECONDS")
+    ingestion_poll_seconds: float = Field(5.0, env="INGESTION_POLL_SECONDS")
+    ingestion_lease_seconds: float = Field(600.0, env="INGESTION_LEASE_SECONDS")
+
+    # Scraper guard: Notte calls in flight at once, per-domain token bucket (rate and burst), how long a
+    # scrape may wait for a token or slot, and consecutive failures that open the circuit breaker
+    # for SCRAPE_BREAKER_RESET_SECONDS (cached pages are served meanwhile, otherwise it fails fast)
+    scrape_max_concurrency: int = Field(8, env="SCRAPE_MAX_CONCURRENCY")
+    scrape_domain_rate_per_second: float = Field(1.0, env="SCRAPE_DOMAIN_RATE_PER_SECOND")
+    scrape_domain_burst: int = Field(5, env="SCRAPE_DOMAIN_BURST")
+    scrape_max_wait_seconds: float = Field(30.0, env="SCRAPE_MAX_WAIT_SECONDS")
+    scrape_breaker_failures: int = Field(5, env="SCRAPE_BREAKER_FAILURES")
+    scrape_breaker_reset_seconds: float = Field(30.0, env="SCRAPE_BREAKER_RESET_SECONDS")
+
+    # Bulk ingestion: inputs per embeddings request, bounded by count and estimated tokens
+    embedding_batch_size: int = Field(100, env="EMBEDDING_BATCH_SIZE")
+    embedding_batch_tokens: int = Field(200_000, env="EMBEDDING_BATCH_TOKENS")
+
+    # Export: DataInstances per page / per batched knowledge+images lookup
+    export_batch_size: int = Field(200, env="EXPORT_BATCH_SIZE")
+
+    # Worker threads used by AsyncSupabase to keep blocking storage calls off the event loop
+    storage_max_workers: int = Field(32, env="STORAGE_MAX_WORKERS")
+
+    # Hot read paths can bypass PostgREST and query Postgres through an asyncpg pool.
+    # DATABASE_URL must be a session-mode connection when prepared statements are cached.
+    storage_read_backend: Literal["postgrest", "asyncpg"] = Field(
+        "postgrest", env="STORAGE_READ_BACKEND"
+    )
+    database_url: str | None = Field(None, env="DATABASE_URL")
+    database_pool_min_size: int = Field(1, env="DATABASE_POOL_MIN_SIZE")
+    database_pool_max_size: int = Field(10, env="DATABASE_POOL_MAX_SIZE")
+    database_statement_cache_size: int = Field(100, env="DATABASE_STATEMENT_CACHE_SIZE")
+
     model_config = SettingsConfigDict(
         env_file=".env", 
         env_file_encoding="utf-8", 
@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -7,6 +9,14 @@ from src.routes import storage as storage_routes
 from src.routes import ai as ai_routes
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Shut down the storage, ingestion and scraper thread pools and connections on exit."""
+    yield
+    await storage_routes.close_storage()
+    scraper.scrape_pool.shutdown()
+
+
 def create_app() -> FastAPI:
     """Create and configure FastAPI application."""
     
@@ -15,6 +25,7 @@ def create_app() -> FastAPI:
         "title": settings.app_name,
         "version": settings.app_version,
         "debug": settings.debug,
+        "lifespan": lifespan,
     }
     
     # Hide docs in production
@@ -31,6 +42,7 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor"],
     )
     
     # Include routers
@@ -2,13 +2,14 @@ from fastapi import APIRouter, HTTPException, status, Depends
 from pydantic import BaseModel
 from typing import Optional, List
 import os
-from openai import OpenAI
+from openai import AsyncOpenAI
 import json
 from datetime import datetime, timezone
 import random
-import time
+import asyncio
 
-from src.services.storage.supabase import Supabase
+from src.services.storage.async_supabase import AsyncSupabase
+from src.routes.storage import get_storage
 
 router = APIRouter(prefix="/ai", tags=["AI"])
 
@@ -161,30 +162,18 @@ class TriviaGameSessionResponse(BaseModel):
     points_awarded: int
 
 
-def get_openai_client() -> OpenAI:
-    """Get OpenAI client instance."""
+def get_openai_client() -> AsyncOpenAI:
+    """Get a shared async OpenAI client instance."""
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="OpenAI API is not configured"
         )
-    return OpenAI(api_key=api_key)
-
-
-def get_storage() -> Supabase:
-    """Return a singleton instance of the Supabase storage helper configured
-    from environment variables `SUPABASE_URL` and `SUPABASE_KEY`."""
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_KEY")
-    openai_key = os.getenv("OPENAI_API_KEY")
-    if not url or not key:
-        raise RuntimeError("SUPABASE_URL and SUPABASE_KEY environment variables must be set.")
-
-    # Re-use a single instance to avoid recreating connections on every request
-    if not hasattr(get_storage, "_instance"):
-        get_storage._instance = Supabase(url, key, openai_key)
-    return get_storage._instance
+    # Re-use a single client so its HTTP connection pool is shared across requests
+    if not hasattr(get_openai_client, "_instance"):
+        get_openai_client._instance = AsyncOpenAI(api_key=api_key)
+    return get_openai_client._instance
 
 
 def determine_difficulty(level: int, accuracy_rate: float, current_difficulty: str) -> str:
@@ -206,7 +195,7 @@ def determine_difficulty(level: int, accuracy_rate: float, current_difficulty: s
 @router.post("/inference", response_model=InferenceResponse)
 async def generate_inference(
     payload: InferenceRequest,
-    openai_client: OpenAI = Depends(get_openai_client)
+    openai_client: AsyncOpenAI = Depends(get_openai_client)
 ):
     """
     Generate AI-powered insights and inferences from provided context using RAG.
@@ -249,7 +238,7 @@ Please provide:
 Focus on being helpful and insightful while staying grounded in the provided data."""
 
         # Generate response using OpenAI
-        response = openai_client.chat.completions.create(
+        response = await openai_client.chat.completions.create(
             model="gpt-4.1",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -277,7 +266,7 @@ Focus on being helpful and insightful while staying grounded in the provided dat
 @router.post("/chat")
 async def chat_with_knowledge(
     payload: InferenceRequest,
-    openai_client: OpenAI = Depends(get_openai_client)
+    openai_client: AsyncOpenAI = Depends(get_openai_client)
 ):
     """
     Interactive chat interface with the knowledge base.
@@ -315,7 +304,7 @@ Instructions:
 - Make connections between different pieces of information when relevant
 - Be helpful and engaging while staying grounded in the available sources"""
 
-        response = openai_client.chat.completions.create(
+        response = await openai_client.chat.completions.create(
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -341,8 +330,8 @@ Instructions:
 @router.post("/generate-flashcards", response_model=FlashcardResponse)
 async def generate_flashcards(
     payload: FlashcardRequest,
-    openai_client: OpenAI = Depends(get_openai_client),
-    storage: Supabase = Depends(get_storage)
+    openai_client: AsyncOpenAI = Depends(get_openai_client),
+    storage: AsyncSupabase = Depends(get_storage)
 ):
     """
     Generate language flashcards using OpenAI for educational language learning games.
@@ -445,7 +434,7 @@ Mix different categories: actions, objects, adjectives, expressions, etc.
 
 Return valid JSON only, no additional text."""
 
-        response = openai_client.chat.completions.create(
+        response = await openai_client.chat.completions.create(
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -568,7 +557,7 @@ Return valid JSON only, no additional text."""
 @router.post("/generate-content", response_model=ContentGenerationResponse)
 async def generate_content(
     payload: ContentGenerationRequest,
-    openai_client: OpenAI = Depends(get_openai_client)
+    openai_client: AsyncOpenAI = Depends(get_openai_client)
 ):
     """
     Generate various types of content from knowledge base, similar to NotebookLM Studio.
@@ -649,7 +638,7 @@ Knowledge Base:
 
 Generate the {payload.content_type.replace('_', ' ')} based on the provided knowledge."""
 
-        response = openai_client.chat.completions.create(
+        response = await openai_client.chat.completions.create(
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -675,7 +664,7 @@ Generate the {payload.content_type.replace('_', ' ')} based on the provided know
 @router.post("/complete-session", response_model=GameSessionResponse)
 async def complete_flashcard_session(
     payload: GameSessionRequest,
-    storage: Supabase = Depends(get_storage)
+    storage: AsyncSupabase = Depends(get_storage)
 ):
     """
     Complete a flashcard session and update user progress
@@ -706,7 +695,7 @@ async def complete_flashcard_session(
         }
         
         # Insert session record
-        session_result = storage.client.table("flashcard_sessions").insert(session_record).execute()
+        session_result = await storage.client.table("flashcard_sessions").insert(session_record).execute()
         session_id = session_result.data[0]['id']
         
         # Update or create learned words
@@ -718,7 +707,7 @@ async def complete_flashcard_session(
             is_correct = payload.answers_data[i].get('is_correct', False)
             
             # Check if word already exists
-            existing_word = storage.client.table("learned_words").select("*").eq(
+            existing_word = await storage.client.table("learned_words").select("*").eq(
                 "wallet_address", payload.wallet_address
             ).eq(
                 "language", payload.language
@@ -743,7 +732,7 @@ async def complete_flashcard_session(
                 else:
                     new_mastery = max(0, current_word['mastery_level'] - 5)
                 
-                storage.client.table("learned_words").update({
+                await storage.client.table("learned_words").update({
                     'times_seen': new_times_seen,
                     'times_correct': new_times_correct,
                     'mastery_level': new_mastery,
@@ -766,7 +755,7 @@ async def complete_flashcard_session(
                     'created_at': datetime.now(timezone.utc).isoformat(),
                     'updated_at': datetime.now(timezone.utc).isoformat()
                 }
-                storage.client.table("learned_words").insert(new_word).execute()
+                await storage.client.table("learned_words").insert(new_word).execute()
             
             if is_correct:
                 words_learned += 1
@@ -816,7 +805,7 @@ async def complete_flashcard_session(
             'updated_at': datetime.now(timezone.utc).isoformat()
         }
         
-        storage.client.table("language_progress").update(progress_update).eq(
+        await storage.client.table("language_progress").update(progress_update).eq(
             'wallet_address', payload.wallet_address
         ).eq(
             'language', payload.language
@@ -842,7 +831,7 @@ async def complete_flashcard_session(
 async def get_language_progress(
     wallet_address: str, 
     language: str,
-    storage: Supabase = Depends(get_storage)
+    storage: AsyncSupabase = Depends(get_storage)
 ):
     """Get user's progress for a specific language"""
     try:
@@ -875,7 +864,7 @@ async def get_language_progress(
 @router.post("/generate-sentiment-texts", response_model=SentimentTextResponse)
 async def generate_sentiment_texts(
     payload: SentimentTextRequest,
-    openai_client: OpenAI = Depends(get_openai_client)
+    openai_client: AsyncOpenAI = Depends(get_openai_client)
 ):
     """
     Generate sentiment labeling texts using OpenAI for sentiment analysis training games.
@@ -955,7 +944,7 @@ The goal is to train AI models, so accuracy in labeling is crucial.
 
 Return valid JSON only, no additional text."""
 
-        response = openai_client.chat.completions.create(
+        response = await openai_client.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -1074,7 +1063,7 @@ Return valid JSON only, no additional text."""
 @router.post("/complete-sentiment-session", response_model=SentimentGameSessionResponse)
 async def complete_sentiment_session(
     payload: SentimentGameSessionRequest,
-    storage: Supabase = Depends(get_storage)
+    storage: AsyncSupabase = Depends(get_storage)
 ):
     """
     Complete a sentiment labeling session and record user progress
@@ -1103,7 +1092,7 @@ async def complete_sentiment_session(
         }
         
         # Insert session record
-        session_result = storage.client.table("sentiment_sessions").insert(session_record).execute()
+        session_result = await storage.client.table("sentiment_sessions").insert(session_record).execute()
         session_id = session_result.data[0]['id']
         
         return SentimentGameSessionResponse(
@@ -1125,7 +1114,7 @@ async def complete_sentiment_session(
 @router.post("/complete-trivia-session", response_model=TriviaGameSessionResponse)
 async def complete_trivia_session(
     payload: TriviaGameSessionRequest,
-    storage: Supabase = Depends(get_storage)
+    storage: AsyncSupabase = Depends(get_storage)
 ):
     """
     Complete a trivia game session and record user progress
@@ -1158,7 +1147,7 @@ async def complete_trivia_session(
         }
         
         # Insert session record
-        session_result = storage.client.table("trivia_sessions").insert(session_record).execute()
+        session_result = await storage.client.table("trivia_sessions").insert(session_record).execute()
         session_id = session_result.data[0]['id']
         
         return TriviaGameSessionResponse(
@@ -1178,9 +1167,9 @@ async def complete_trivia_session(
 
 
 # Helper functions
-async def get_user_progress(wallet_address: str, language: str, storage: Supabase) -> Optional[dict]:
+async def get_user_progress(wallet_address: str, language: str, storage: AsyncSupabase) -> Optional[dict]:
     """Get user's progress for a specific language"""
-    result = storage.client.table("language_progress").select("*").eq(
+    result = await storage.client.table("language_progress").select("*").eq(
         "wallet_address", wallet_address
     ).eq(
         "language", language
@@ -1640,7 +1629,7 @@ def create_fallback_trivia_questions(count: int = 6, difficulty: str = "easy") -
 @router.post("/generate-trivia-questions", response_model=TriviaQuestionResponse)
 async def generate_trivia_questions(
     payload: TriviaQuestionRequest,
-    openai_client: OpenAI = Depends(get_openai_client)
+    openai_client: AsyncOpenAI = Depends(get_openai_client)
 ):
     """
     Generate trivia questions using OpenAI for knowledge trivia games.
@@ -1789,7 +1778,7 @@ Remember: Every question should make someone think "I had no idea!" and want to
 
 Return valid JSON only, no additional text."""
 
-        response = openai_client.chat.completions.create(
+        response = await openai_client.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -1957,7 +1946,7 @@ class ImageQualitySessionResponse(BaseModel):
     pet_knowledge_updated: bool
 
 
-def generate_image_prompts_for_round(round_number: int, openai_client: OpenAI) -> str:
+async def generate_image_prompts_for_round(round_number: int, openai_client: AsyncOpenAI) -> str:
     """Generate a single high-quality image prompt for a specific round."""
     try:
         # Define prompt themes based on round number
@@ -1994,7 +1983,7 @@ Example format: "A majestic mountain landscape at golden hour with dramatic clou
 
 Theme: {theme}"""
 
-        response = openai_client.chat.completions.create(
+        response = await openai_client.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -2026,7 +2015,7 @@ Theme: {theme}"""
         return fallback_prompts[round_number % len(fallback_prompts)]
 
 
-def generate_image_variations_with_parameters(base_prompt: str, round_number: int, openai_client: OpenAI) -> List[ImageData]:
+async def generate_image_variations_with_parameters(base_prompt: str, round_number: int, openai_client: AsyncOpenAI) -> List[ImageData]:
     """Generate multiple image variations from the same prompt using different generation parameters."""
     
     # Define different parameter sets that would affect image quality and style
@@ -2069,7 +2058,7 @@ def generate_image_variations_with_parameters(base_prompt: str, round_number: in
             enhanced_prompt = f"{base_prompt}{params['prompt_enhancement']}"
             
             # Generate image using OpenAI DALL-E
-            response = openai_client.images.generate(
+            response = await openai_client.images.generate(
                 model="dall-e-3",
                 prompt=enhanced_prompt,
                 size=params["size"],
@@ -2105,7 +2094,7 @@ def generate_image_variations_with_parameters(base_prompt: str, round_number: in
             generated_images.append(image_data)
             
             # Small delay to avoid hitting rate limits
-            time.sleep(0.5)
+            await asyncio.sleep(0.5)
             
         except Exception as e:
             print(f"Error generating image variation {i}: {e}")
@@ -2134,8 +2123,8 @@ def generate_image_variations_with_parameters(base_prompt: str, round_number: in
 @router.post("/get-image-quality-round", response_model=ImageQualityRoundResponse)
 async def get_image_quality_round(
     payload: ImageQualityRoundRequest,
-    openai_client: OpenAI = Depends(get_openai_client),
-    storage: Supabase = Depends(get_storage)
+    openai_client: AsyncOpenAI = Depends(get_openai_client),
+    storage: AsyncSupabase = Depends(get_storage)
 ):
     """
     Get or generate an image quality evaluation round.
@@ -2144,7 +2133,7 @@ async def get_image_quality_round(
     """
     try:
         # Check if this round already exists
-        existing_round = storage.client.table("image_quality_rounds").select("*").eq(
+        existing_round = await storage.client.table("image_quality_rounds").select("*").eq(
             "round_number", payload.round_number
         ).eq("is_active", True).execute()
         
@@ -2167,10 +2156,10 @@ async def get_image_quality_round(
             is_first_player = True
             
             # Generate a single high-quality prompt for this round
-            base_prompt = generate_image_prompts_for_round(payload.round_number, openai_client)
+            base_prompt = await generate_image_prompts_for_round(payload.round_number, openai_client)
             
             # Generate multiple variations of the same prompt with different parameters
-            generated_images = generate_image_variations_with_parameters(base_prompt, payload.round_number, openai_client)
+            generated_images = await generate_image_variations_with_parameters(base_prompt, payload.round_number, openai_client)
             
             # Store the round in database
             round_data = {
@@ -2183,7 +2172,7 @@ async def get_image_quality_round(
                 "updated_at": datetime.now(timezone.utc).isoformat()
             }
             
-            result = storage.client.table("image_quality_rounds").insert(round_data).execute()
+            result = await storage.client.table("image_quality_rounds").insert(round_data).execute()
             stored_round = result.data[0]
             
             return ImageQualityRoundResponse(
@@ -2208,7 +2197,7 @@ async def get_image_quality_round(
 @router.post("/complete-image-quality-session", response_model=ImageQualitySessionResponse)
 async def complete_image_quality_session(
     payload: ImageQualitySessionRequest,
-    storage: Supabase = Depends(get_storage)
+    storage: AsyncSupabase = Depends(get_storage)
 ):
     """
     Complete an image quality evaluation session and update pet knowledge.
@@ -2227,7 +2216,7 @@ async def complete_image_quality_session(
             "created_at": datetime.now(timezone.utc).isoformat()
         }
         
-        session_result = storage.client.table("image_quality_sessions").insert(session_data).execute()
+        session_result = await storage.client.table("image_quality_sessions").insert(session_data).execute()
         session_id = session_result.data[0]["id"]
         
         # Update pet image knowledge based on user selections
@@ -2265,7 +2254,7 @@ async def complete_image_quality_session(
                         }
                         
                         # Check if this image already exists for this pet
-                        existing = storage.client.table("pet_image_knowledge").select("*").eq(
+                        existing = await storage.client.table("pet_image_knowledge").select("*").eq(
                             "pet_id", payload.pet_id
                         ).eq("image_url", selected_image["url"]).execute()
                         
@@ -2282,7 +2271,7 @@ async def complete_image_quality_session(
                                 "updated_at": knowledge_data["updated_at"]
                             }
                             
-                            storage.client.table("pet_image_knowledge").update(updated_data).eq(
+                            await storage.client.table("pet_image_knowledge").update(updated_data).eq(
                                 "id", current_entry["id"]
                             ).execute()
                         else:
@@ -2293,7 +2282,7 @@ async def complete_image_quality_session(
                                 "created_at": datetime.now(timezone.utc).isoformat()
                             })
                             
-                            storage.client.table("pet_image_knowledge").insert(knowledge_data).execute()
+                            await storage.client.table("pet_image_knowledge").insert(knowledge_data).execute()
                             high_quality_images_added += 1
         
         return ImageQualitySessionResponse(
@@ -2311,7 +2300,7 @@ async def complete_image_quality_session(
         )
 
 
-def generate_image_prompts_for_round(round_number: int, openai_client: OpenAI) -> List[str]:
+async def generate_image_prompts_for_round(round_number: int, openai_client: AsyncOpenAI) -> List[str]:
     """Generate diverse image prompts for a specific round."""
     try:
         # Define prompt themes based on round number
@@ -2347,7 +2336,7 @@ Each prompt should be 10-15 words describing a specific scene or subject related
 Example format:
 ["prompt 1", "prompt 2", "prompt 3", "prompt 4"]"""
 
-        response = openai_client.chat.completions.create(
+        response = await openai_client.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -2379,9 +2368,9 @@ Example format:
 
 
 # Helper functions
-async def get_user_progress(wallet_address: str, language: str, storage: Supabase) -> Optional[dict]:
+async def get_user_progress(wallet_address: str, language: str, storage: AsyncSupabase) -> Optional[dict]:
     """Get user's progress for a specific language"""
-    result = storage.client.table("language_progress").select("*").eq(
+    result = await storage.client.table("language_progress").select("*").eq(
         "wallet_address", wallet_address
     ).eq(
         "language", language
@@ -2390,9 +2379,9 @@ async def get_user_progress(wallet_address: str, language: str, storage: Supabas
     return result.data[0] if result.data else None
 
 
-async def get_learned_words(wallet_address: str, language: str, storage: Supabase, mastery_threshold: int = 80) -> List[str]:
+async def get_learned_words(wallet_address: str, language: str, storage: AsyncSupabase, mastery_threshold: int = 80) -> List[str]:
     """Get words the user has already mastered"""
-    result = storage.client.table("learned_words").select("word").eq(
+    result = await storage.client.table("learned_words").select("word").eq(
         "wallet_address", wallet_address
     ).eq(
         "language", language
@@ -2403,9 +2392,9 @@ async def get_learned_words(wallet_address: str, language: str, storage: Supabas
     return [row['word'] for row in result.data]
 
 
-async def get_recently_shown_words(wallet_address: str, language: str, storage: Supabase, last_sessions: int = 5) -> List[str]:
+async def get_recently_shown_words(wallet_address: str, language: str, storage: AsyncSupabase, last_sessions: int = 5) -> List[str]:
     """Get words shown in recent sessions"""
-    result = storage.client.table("flashcard_sessions").select("session_data").eq(
+    result = await storage.client.table("flashcard_sessions").select("session_data").eq(
         "wallet_address", wallet_address
     ).eq(
         "language", language
@@ -2435,7 +2424,7 @@ async def get_recently_shown_words(wallet_address: str, language: str, storage:
     return list(set(shown_words))
 
 
-async def create_or_update_progress(wallet_address: str, language: str, storage: Supabase) -> dict:
+async def create_or_update_progress(wallet_address: str, language: str, storage: AsyncSupabase) -> dict:
     """Create or get existing progress for user-language combination"""
     # Try to get existing progress
     progress = await get_user_progress(wallet_address, language, storage)
@@ -2458,7 +2447,7 @@ async def create_or_update_progress(wallet_address: str, language: str, storage:
             'updated_at': datetime.now(timezone.utc).isoformat()
         }
         
-        result = storage.client.table("language_progress").insert(new_progress).execute()
+        result = await storage.client.table("language_progress").insert(new_progress).execute()
         progress = result.data[0]
     
     return progress
\ No newline at end of file
@@ -1,7 +1,14 @@
 from fastapi import APIRouter, HTTPException, status
-from pydantic import BaseModel, HttpUrl
-from typing import Optional
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, HttpUrl
+from typing import Any, Dict, Iterator, List, Optional
+import json
+
+from src.config import settings
+from src.scraper.guard import ScraperUnavailable, scrape_domain
 from src.scraper.notte import NotteScraper
+from src.scraper.pool import SCRAPE_OK, ScrapePool
 
 router = APIRouter(prefix="/scraper", tags=["Scraper"])
 
@@ -15,15 +22,55 @@ class ScrapeResponse(BaseModel):
     data: dict  # Adjust according to actual NotteClient response schema
 
 
+class BatchScrapeRequest(BaseModel):
+    items: List[ScrapeRequest] = Field(..., description="URLs to scrape, each with an optional instruction")
+    instruction: Optional[str] = Field(None, description="Instruction for items that don't set their own")
+
+
+DEFAULT_INSTRUCTION = "Extract the text from the url above"
+TWEET_INSTRUCTION = "Extract the text from the tweet above"
+TWEET_DOMAINS = {"x.com", "twitter.com"}
+
 scraper_service = NotteScraper()
+# Shares the scrape cache and guard with knowledge ingestion
+scrape_pool = ScrapePool(
+    scraper_service,
+    max_workers=settings.scrape_max_workers,
+    timeout=settings.scrape_timeout_seconds
+)
+
+
+@router.get("/cache", response_model=Dict[str, Any])
+async def scrape_cache_stats():
+    """Return hit/miss counters and sizes for the scrape cache shared with knowledge ingestion."""
+    return scraper_service.cache.stats()
+
+
+@router.get("/health", response_model=Dict[str, Any])
+async def scraper_health():
+    """Circuit breaker state, in-flight scrapes and throttled domains of the scrape guard."""
+    return scraper_service.guard.stats()
+
 
+def _unavailable(exc: ScraperUnavailable) -> HTTPException:
+    headers = {"Retry-After": str(max(1, round(exc.retry_after)))} if exc.retry_after is not None else None
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(exc),
+        headers=headers,
+    )
 
+
+# Scrape handlers are plain functions: waiting on the scrape guard and Notte blocks, so
+# FastAPI runs them on its threadpool instead of the event loop
 @router.post("/", response_model=ScrapeResponse, status_code=status.HTTP_200_OK)
-async def scrape_endpoint(payload: ScrapeRequest):
+def scrape_endpoint(payload: ScrapeRequest):
     """Scrape a webpage using Notte and return the structured data."""
 
     try:
-        result = scraper_service.scrape(url=str(payload.url), instruction="Extract the text from the url above")
+        result = scraper_service.scrape(url=str(payload.url), instruction=payload.instruction or DEFAULT_INSTRUCTION)
+    except ScraperUnavailable as exc:
+        raise _unavailable(exc)
     except Exception as exc: 
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -33,15 +80,57 @@ async def scrape_endpoint(payload: ScrapeRequest):
     return result
 
 @router.post("/twitter")
-async def scrape_twitter_endpoint(payload: ScrapeRequest):
+def scrape_twitter_endpoint(payload: ScrapeRequest):
     """Scrape a twitter post using Notte and return the structured data."""
 
     try:
-        result = scraper_service.scrape(url=str(payload.url), instruction="Extract the text from the tweet above")
+        result = scraper_service.scrape(url=str(payload.url), instruction=payload.instruction or TWEET_INSTRUCTION)
+    except ScraperUnavailable as exc:
+        raise _unavailable(exc)
     except Exception as exc: 
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(exc),
         )
 
-    return result
\ No newline at end of file
+    return result
+
+
+@router.post("/batch")
+def scrape_batch_endpoint(payload: BatchScrapeRequest):
+    """
+    Scrape many URLs concurrently and stream one NDJSON line per URL as soon as
+    it completes: ``{"index", "url", "status", "data"}``, or ``"error"`` in
+    place of ``data`` when its status is ``failed`` or ``timeout``.
+    """
+    if not payload.items:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No URLs to scrape")
+    if len(payload.items) > settings.scrape_batch_max_urls:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.scrape_batch_max_urls} URLs per batch",
+        )
+
+    jobs = []
+    for item in payload.items:
+        url = str(item.url)
+        default = TWEET_INSTRUCTION if scrape_domain(url) in TWEET_DOMAINS else DEFAULT_INSTRUCTION
+        jobs.append((url, item.instruction or payload.instruction or default))
+    # Submitted before the response starts, so scraping overlaps the first bytes going out
+    outcome_groups = scrape_pool.scrape_many(jobs)
+
+    def ndjson_lines() -> Iterator[str]:
+        try:
+            for group in outcome_groups:
+                for outcome in group:
+                    line: Dict[str, Any] = {"index": outcome.index, "url": outcome.url, "status": outcome.status}
+                    if outcome.status == SCRAPE_OK:
+                        line["data"] = jsonable_encoder(outcome.result)
+                    else:
+                        line["error"] = outcome.error
+                    yield json.dumps(line, default=str) + "\n"
+        finally:
+            # Client disconnected: don't start the scrapes still queued
+            outcome_groups.close()
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
@@ -1,13 +1,34 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, HttpUrl
 from typing import Optional, List, Dict, Any
+from datetime import datetime, timezone
 import os
+import json
+import asyncio
 from enum import Enum
 
-from src.services.storage.supabase import Supabase
+from src.config import settings
+from src.services.export import ParquetExporter
+from src.services.storage.async_supabase import AsyncSupabase
+from src.services.storage.schemas import KnowledgeFilter
+from src.services.storage.pagination import (
+    Keyset,
+    RankKeyset,
+    decode_cursor,
+    decode_search_cursor,
+    next_cursor,
+    next_search_cursor,
+)
 
-def get_storage() -> Supabase:
-    """Return a singleton instance of the Supabase storage helper configured
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+CURSOR_DESCRIPTION = f"Opaque cursor from the previous page's `{NEXT_CURSOR_HEADER}` response header"
+
+_storage_lock = asyncio.Lock()
+
+
+async def get_storage() -> AsyncSupabase:
+    """Return a singleton instance of the async Supabase storage facade configured
     from environment variables `SUPABASE_URL` and `SUPABASE_KEY`."""
     url = os.getenv("SUPABASE_URL")
     key = os.getenv("SUPABASE_KEY")
@@ -16,11 +37,48 @@ def get_storage() -> Supabase:
         raise RuntimeError("SUPABASE_URL and SUPABASE_KEY environment variables must be set.")
 
     # Re-use a single instance to avoid recreating connections on every request
-    if not hasattr(get_storage, "_instance"):
-        get_storage._instance = Supabase(url, key, openai_key)
+    async with _storage_lock:
+        if not hasattr(get_storage, "_instance"):
+            get_storage._instance = await AsyncSupabase.create(url, key, openai_key)
     return get_storage._instance
 
 
+async def close_storage() -> None:
+    """Shut down the instance created by :func:`get_storage`, if any (called on app shutdown)."""
+    async with _storage_lock:
+        instance = getattr(get_storage, "_instance", None)
+        if instance is not None:
+            del get_storage._instance
+            await instance.close()
+
+
+def _parse_cursor(cursor: Optional[str]) -> Optional[Keyset]:
+    try:
+        return decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def _parse_search_cursor(cursor: Optional[str]) -> Optional[Dict[str, RankKeyset]]:
+    try:
+        return decode_search_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def _set_next_cursor(response: Response, rows: List[Dict[str, Any]], limit: int) -> None:
+    """Expose the cursor for the following page, if there is one, as a response header."""
+    cursor = next_cursor(rows, limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+
+
+def _set_next_search_cursor(response: Response, results: Dict[str, List[Dict[str, Any]]], limit: int) -> None:
+    cursor = next_search_cursor(results, limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+
+
 class DataCategory(str, Enum):
     social = "social"
     trivia = "trivia"
@@ -66,6 +124,7 @@ class DataInstanceResponse(BaseModel):
     created_at: str
     knowledge: Optional[List[Dict[str, Any]]]
     images: Optional[List[Dict[str, Any]]]
+    job_id: Optional[str] = Field(None, description="Background job attaching the knowledge_list, if any")
 
     class Config:
         orm_mode = True
@@ -92,35 +151,99 @@ router = APIRouter(prefix="/storage", tags=["Storage"])
 
 
 @router.get("/users/{wallet_address}/pets", response_model=List[PetResponse])
-async def list_user_pets(wallet_address: str, storage: Supabase = Depends(get_storage)):
+async def list_user_pets(wallet_address: str, storage: AsyncSupabase = Depends(get_storage)):
     """Return all pets belonging to `wallet_address` (ordered by creation date DESC)."""
     try:
-        return storage.get_user_pets(wallet_address)
+        return await storage.get_user_pets(wallet_address)
     except Exception as exc:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc))
 
 
 @router.get("/pets/{pet_id}", response_model=PetResponse)
-async def get_pet(pet_id: str, storage: Supabase = Depends(get_storage)):
+async def get_pet(pet_id: str, storage: AsyncSupabase = Depends(get_storage)):
     """Retrieve a single pet by its ID."""
-    result = storage.get_pet(pet_id)
+    result = await storage.get_pet(pet_id)
     if not result:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pet not found")
     return result
 
 
+class ExportFormat(str, Enum):
+    json = "json"
+    ndjson = "ndjson"
+
+
 @router.get("/pets/{pet_id}/export", response_model=Dict[str, Any])
-async def export_pet_data(pet_id: str, storage: Supabase = Depends(get_storage)):
+async def export_pet_data(
+    pet_id: str,
+    format: ExportFormat = Query(ExportFormat.json, description="`json` for one nested document (up to 1000 instances), `ndjson` to stream every instance, one per line"),
+    storage: AsyncSupabase = Depends(get_storage),
+):
     """Export complete pet data including all nested instances, knowledge, and images."""
-    result = storage.export_pet_data(pet_id)
+    if format == ExportFormat.ndjson:
+        if not await storage.get_pet(pet_id):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pet not found")
+
+        async def ndjson_lines():
+            async for instance in storage.iter_pet_export(pet_id):
+                yield json.dumps(instance, default=str) + "\n"
+
+        return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+    result = await storage.export_pet_data(pet_id)
     if not result:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pet not found")
     return result
 
 
-@router.post("/pets/{pet_id}/instances", response_model=DataInstanceResponse, status_code=status.HTTP_201_CREATED)
-async def create_datainstance(pet_id: str, payload: DataInstanceCreate, storage: Supabase = Depends(get_storage)):
-    """Create a DataInstance for the specified pet. Optionally attach knowledge items and images in one request."""
+def _export_dir(*parts: str) -> str:
+    """Fresh, timestamped output directory for a Parquet export under DATA_DIR."""
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    return os.path.join(settings.data_dir, "exports", *parts, stamp)
+
+
+@router.post("/pets/{pet_id}/export/parquet", response_model=Dict[str, Any], status_code=status.HTTP_201_CREATED)
+async def export_pet_parquet(pet_id: str, storage: AsyncSupabase = Depends(get_storage)):
+    """Write a pet's instances, knowledge (with embeddings) and images as a partitioned Parquet dataset."""
+    exporter = ParquetExporter(storage.storage)
+    try:
+        manifest = await storage.run(exporter.export_pet, pet_id, _export_dir("pets", pet_id))
+    except Exception as exc:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc))
+    if manifest is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pet not found")
+    return manifest
+
+
+@router.post("/users/{wallet_address}/export/parquet", response_model=Dict[str, Any], status_code=status.HTTP_201_CREATED)
+async def export_user_parquet(wallet_address: str, storage: AsyncSupabase = Depends(get_storage)):
+    """Write every pet of a wallet plus its game sessions as a partitioned Parquet dataset."""
+    exporter = ParquetExporter(storage.storage)
+    try:
+        return await storage.run(exporter.export_user, wallet_address, _export_dir("users", wallet_address))
+    except Exception as exc:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc))
+
+
+@router.post(
+    "/pets/{pet_id}/instances",
+    response_model=DataInstanceResponse,
+    status_code=status.HTTP_201_CREATED,
+    responses={status.HTTP_202_ACCEPTED: {"model": DataInstanceResponse, "description": "Knowledge is being attached in the background"}},
+)
+async def create_datainstance(
+    pet_id: str,
+    payload: DataInstanceCreate,
+    response: Response,
+    storage: AsyncSupabase = Depends(get_storage)
+):
+    """
+    Create a DataInstance for the specified pet. Optionally attach knowledge items and images in one request.
+
+    The instance and its images are written immediately. A `knowledge_list` is scraped, embedded and
+    attached in the background: the response is then `202 Accepted` with a `job_id` to poll at
+    `/storage/jobs/{job_id}`.
+    """
     try:
         # Convert knowledge list properly
         knowledge_list = None
@@ -132,76 +255,105 @@ async def create_datainstance(pet_id: str, payload: DataInstanceCreate, storage:
                     knowledge_dict['url'] = str(knowledge_dict['url'])  # Convert HttpUrl to string
                 knowledge_list.append(knowledge_dict)
         
-        instance = storage.create_complete_datainstance(
+        instance = await storage.create_complete_datainstance(
             pet_id=pet_id,
             content=payload.content,
             content_type=payload.content_type,
-            knowledge_list=knowledge_list,
             image_urls=[str(url) for url in payload.image_urls] if payload.image_urls else None,
             metadata=payload.metadata,
             category=payload.category.value,
             tags=payload.tags,
         )
+        
+        if knowledge_list:
+            job = await storage.enqueue_knowledge_ingestion(instance["id"], pet_id, knowledge_list)
+            instance["job_id"] = job["id"]
+            response.status_code = status.HTTP_202_ACCEPTED
     except Exception as exc:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc))
     return instance
 
 
+@router.get("/jobs/{job_id}", response_model=Dict[str, Any])
+async def get_ingestion_job(job_id: str, storage: AsyncSupabase = Depends(get_storage)):
+    """
+    Progress of a background knowledge ingestion job: `status` (queued, running, succeeded, partial,
+    failed), `completed`/`failed` out of `total`, and per-item status and errors in `items`.
+    """
+    try:
+        job = await storage.get_ingestion_job(job_id)
+    except Exception as exc:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc))
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+
 @router.get("/pets/{pet_id}/instances", response_model=List[Dict[str, Any]])
 async def list_pet_instances(
     pet_id: str,
+    response: Response,
     limit: int = Query(100, ge=1, le=1000),
-    offset: int = Query(0, ge=0),
-    storage: Supabase = Depends(get_storage),
+    offset: int = Query(0, ge=0, description="Ignored when `cursor` is given"),
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
+    storage: AsyncSupabase = Depends(get_storage),
 ):
     """Return basic information for DataInstances contained in the pet (paginated)."""
-    return storage.get_pet_instances(pet_id, limit=limit, offset=offset)
+    after = _parse_cursor(cursor)
+    instances = await storage.get_pet_instances(pet_id, limit=limit, offset=offset, after=after)
+    _set_next_cursor(response, instances, limit)
+    return instances
 
 
 @router.get("/pets/{pet_id}/knowledge", response_model=List[Dict[str, Any]])
 async def list_pet_knowledge(
     pet_id: str,
+    response: Response,
     limit: int = Query(100, ge=1, le=1000),
-    storage: Supabase = Depends(get_storage),
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
+    storage: AsyncSupabase = Depends(get_storage),
 ):
-    """Return all knowledge items associated with a pet's data instances."""
+    """Return all knowledge items associated with a pet's data instances (paginated)."""
+    after = _parse_cursor(cursor)
     try:
-        return storage.get_pet_knowledge(pet_id, limit=limit)
+        knowledge = await storage.get_pet_knowledge(pet_id, limit=limit, after=after)
     except Exception as exc:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc))
+    _set_next_cursor(response, knowledge, limit)
+    return knowledge
 
 
 @router.get("/datainstances/{datainstance_id}", response_model=DataInstanceResponse)
-async def get_datainstance(datainstance_id: str, storage: Supabase = Depends(get_storage)):
+async def get_datainstance(datainstance_id: str, storage: AsyncSupabase = Depends(get_storage)):
     """Retrieve a DataInstance along with its related knowledge and images."""
-    instance = storage.get_datainstance_with_content(datainstance_id)
+    instance = await storage.get_datainstance_with_content(datainstance_id)
     if not instance:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="DataInstance not found")
     return instance
 
 
 @router.get("/datainstances/{datainstance_id}/knowledge", response_model=List[Dict[str, Any]])
-async def get_datainstance_knowledge(datainstance_id: str, storage: Supabase = Depends(get_storage)):
+async def get_datainstance_knowledge(datainstance_id: str, storage: AsyncSupabase = Depends(get_storage)):
     """Retrieve all knowledge associated with a specific DataInstance."""
     try:
-        knowledge = storage.get_datainstance_knowledge(datainstance_id)
+        knowledge = await storage.get_datainstance_knowledge(datainstance_id)
         return knowledge
     except Exception as exc:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc))
 
 
 @router.get("/datainstances/{datainstance_id}/images", response_model=List[Dict[str, Any]])
-async def get_datainstance_images(datainstance_id: str, storage: Supabase = Depends(get_storage)):
+async def get_datainstance_images(datainstance_id: str, storage: AsyncSupabase = Depends(get_storage)):
     """Retrieve all images associated with a specific DataInstance."""
     try:
-        images = storage.get_datainstance_images(datainstance_id)
+        images = await storage.get_datainstance_images(datainstance_id)
         return images
     except Exception as exc:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc))
 
 
 @router.post("/datainstances/{datainstance_id}/knowledge", response_model=List[Dict[str, Any]], status_code=status.HTTP_200_OK)
-async def add_knowledge(datainstance_id: str, payload: List[KnowledgeCreate], storage: Supabase = Depends(get_storage)):
+async def add_knowledge(datainstance_id: str, payload: List[KnowledgeCreate], storage: AsyncSupabase = Depends(get_storage)):
     """Attach one or more Knowledge documents to an existing DataInstance."""
     # Validate and convert knowledge data
     knowledge_data = []
@@ -219,7 +371,7 @@ async def add_knowledge(datainstance_id: str, payload: List[KnowledgeCreate], st
         knowledge_data.append(knowledge_dict)
     
     try:
-        results = storage.bulk_add_knowledge(datainstance_id, knowledge_data)
+        results = await storage.bulk_add_knowledge(datainstance_id, knowledge_data)
         return results
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
@@ -228,39 +380,88 @@ async def add_knowledge(datainstance_id: str, payload: List[KnowledgeCreate], st
 
 
 @router.post("/datainstances/{datainstance_id}/images", response_model=List[Dict[str, Any]], status_code=status.HTTP_200_OK)
-async def add_images(datainstance_id: str, payload: List[ImageCreate], storage: Supabase = Depends(get_storage)):
+async def add_images(datainstance_id: str, payload: List[ImageCreate], storage: AsyncSupabase = Depends(get_storage)):
     """Attach one or more Images to an existing DataInstance."""
     urls = [str(img.image_url) for img in payload]
-    results = storage.bulk_add_images(datainstance_id, urls)
+    results = await storage.bulk_add_images(datainstance_id, urls)
     return results
 
 
 @router.get("/pets/{pet_id}/search", response_model=Dict[str, List[Dict[str, Any]]])
 async def search_pet_content(
     pet_id: str, 
-    q: str = Query(..., description="Search query"), 
+    response: Response,
+    q: str = Query(..., description="Web-style search query (quoted phrases, OR, -exclusions)"), 
     limit: int = Query(20, ge=1, le=100), 
-    storage: Supabase = Depends(get_storage)
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
+    storage: AsyncSupabase = Depends(get_storage)
 ):
-    """Full-text search across a pet's DataInstances and Knowledge documents."""
-    return storage.search_pet_content(pet_id=pet_id, search_query=q, limit=limit)
+    """Ranked full-text search across a pet's DataInstances and Knowledge documents, with snippets."""
+    after = _parse_search_cursor(cursor)
+    try:
+        results = await storage.search_pet_content(pet_id=pet_id, search_query=q, limit=limit, after=after)
+    except Exception as exc:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc))
+    _set_next_search_cursor(response, results, limit)
+    return results
 
 
 @router.get("/users/{wallet_address}/search", response_model=Dict[str, List[Dict[str, Any]]])
 async def search_user_content(
     wallet_address: str, 
-    q: str = Query(..., description="Search query"), 
+    response: Response,
+    q: str = Query(..., description="Web-style search query (quoted phrases, OR, -exclusions)"), 
     limit: int = Query(20, ge=1, le=100), 
-    storage: Supabase = Depends(get_storage)
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
+    storage: AsyncSupabase = Depends(get_storage)
 ):
-    """Full-text search across all DataInstances and Knowledge documents for a user's pets."""
-    return storage.search_user_content(wallet_address=wallet_address, search_query=q, limit=limit)
+    """Ranked full-text search across all DataInstances and Knowledge documents for a user's pets, with snippets."""
+    after = _parse_search_cursor(cursor)
+    try:
+        results = await storage.search_user_content(wallet_address=wallet_address, search_query=q, limit=limit, after=after)
+    except Exception as exc:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc))
+    _set_next_search_cursor(response, results, limit)
+    return results
 
 
 @router.get("/users/{wallet_address}/statistics", response_model=Dict[str, Any])
-async def user_statistics(wallet_address: str, storage: Supabase = Depends(get_storage)):
+async def user_statistics(wallet_address: str, storage: AsyncSupabase = Depends(get_storage)):
     """Aggregate statistics for the specified user (number of pets, instances, etc.)."""
-    return storage.get_user_statistics(wallet_address)
+    return await storage.get_user_statistics(wallet_address)
+
+
+@router.get("/semantic/cache", response_model=Dict[str, Any])
+async def embedding_cache_stats(storage: AsyncSupabase = Depends(get_storage)):
+    """Return hit/miss counters for the query/content embedding cache."""
+    return storage.get_embedding_cache_stats()
+
+
+@router.get("/semantic/shards", response_model=Dict[str, Any])
+async def vector_shard_stats(storage: AsyncSupabase = Depends(get_storage)):
+    """Return size and hit/miss counters for the in-memory per-pet / per-wallet vector shards."""
+    return storage.get_vector_shard_stats()
+
+
+@router.get("/semantic/snapshot", response_model=Dict[str, Any])
+async def embedding_snapshot_stats(storage: AsyncSupabase = Depends(get_storage)):
+    """Return the size and watermark of the memory-mapped knowledge embedding snapshot."""
+    return storage.get_embedding_snapshot_stats()
+
+
+def _knowledge_filter(
+    category: Optional[DataCategory] = Query(None, description="Only knowledge attached to data instances of this category"),
+    tags: Optional[List[str]] = Query(None, description="Only knowledge attached to data instances carrying all of these tags"),
+    content_type: Optional[str] = Query(None, description="Only knowledge attached to data instances of this content type"),
+    created_after: Optional[datetime] = Query(None, description="Only knowledge created at or after this time"),
+) -> Optional[KnowledgeFilter]:
+    filters = KnowledgeFilter(
+        category=category.value if category else None,
+        tags=tags,
+        content_type=content_type,
+        created_after=created_after
+    )
+    return None if filters.is_empty() else filters
 
 
 @router.get("/semantic/search", response_model=List[Dict[str, Any]])
@@ -268,14 +469,20 @@ async def semantic_search_global(
     q: str = Query(..., description="Semantic search query"),
     limit: int = Query(20, ge=1, le=100),
     similarity_threshold: float = Query(0.7, ge=0.0, le=1.0, description="Minimum similarity score (0-1)"),
-    storage: Supabase = Depends(get_storage)
+    nprobe: Optional[int] = Query(
+        None, ge=0, description="Search the in-process snapshot, probing this many IVF lists (0 = exact scan)"
+    ),
+    filters: Optional[KnowledgeFilter] = Depends(_knowledge_filter),
+    storage: AsyncSupabase = Depends(get_storage)
 ):
     """Perform semantic search across all knowledge using OpenAI embeddings."""
     try:
-        return storage.semantic_search_knowledge(
+        return await storage.semantic_search_knowledge(
             query=q, 
             limit=limit, 
-            similarity_threshold=similarity_threshold
+            similarity_threshold=similarity_threshold,
+            nprobe=nprobe,
+            filters=filters
         )
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
@@ -289,15 +496,17 @@ async def semantic_search_pet(
     q: str = Query(..., description="Semantic search query"),
     limit: int = Query(20, ge=1, le=100),
     similarity_threshold: float = Query(0.7, ge=0.0, le=1.0, description="Minimum similarity score (0-1)"),
-    storage: Supabase = Depends(get_storage)
+    filters: Optional[KnowledgeFilter] = Depends(_knowledge_filter),
+    storage: AsyncSupabase = Depends(get_storage)
 ):
     """Perform semantic search across a specific pet's knowledge using OpenAI embeddings."""
     try:
-        return storage.semantic_search_pet_knowledge(
+        return await storage.semantic_search_pet_knowledge(
             pet_id=pet_id,
             query=q, 
             limit=limit, 
-            similarity_threshold=similarity_threshold
+            similarity_threshold=similarity_threshold,
+            filters=filters
         )
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
@@ -311,17 +520,70 @@ async def semantic_search_user(
     q: str = Query(..., description="Semantic search query"),
     limit: int = Query(20, ge=1, le=100),
     similarity_threshold: float = Query(0.7, ge=0.0, le=1.0, description="Minimum similarity score (0-1)"),
-    storage: Supabase = Depends(get_storage)
+    filters: Optional[KnowledgeFilter] = Depends(_knowledge_filter),
+    storage: AsyncSupabase = Depends(get_storage)
 ):
     """Perform semantic search across all knowledge for a user's pets using OpenAI embeddings."""
     try:
-        return storage.semantic_search_user_knowledge(
+        return await storage.semantic_search_user_knowledge(
             wallet_address=wallet_address,
             query=q, 
             limit=limit, 
-            similarity_threshold=similarity_threshold
+            similarity_threshold=similarity_threshold,
+            filters=filters
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as exc:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc))
+
+@router.get("/pets/{pet_id}/hybrid/search", response_model=List[Dict[str, Any]])
+async def hybrid_search_pet(
+    pet_id: str,
+    q: str = Query(..., description="Search query"),
+    limit: int = Query(20, ge=1, le=100),
+    similarity_threshold: float = Query(0.5, ge=0.0, le=1.0, description="Minimum similarity score (0-1) for the vector retriever"),
+    lexical_weight: float = Query(1.0, ge=0.0, description="Weight of the full-text ranking in the fusion"),
+    semantic_weight: float = Query(1.0, ge=0.0, description="Weight of the vector ranking in the fusion"),
+    storage: AsyncSupabase = Depends(get_storage)
+):
+    """Search a pet's knowledge with full-text and vector retrieval at once, fused into one ranking."""
+    try:
+        return await storage.hybrid_search_pet_knowledge(
+            pet_id=pet_id,
+            query=q,
+            limit=limit,
+            similarity_threshold=similarity_threshold,
+            lexical_weight=lexical_weight,
+            semantic_weight=semantic_weight
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as exc:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc))
+
+
+@router.get("/users/{wallet_address}/hybrid/search", response_model=List[Dict[str, Any]])
+async def hybrid_search_user(
+    wallet_address: str,
+    q: str = Query(..., description="Search query"),
+    limit: int = Query(20, ge=1, le=100),
+    similarity_threshold: float = Query(0.5, ge=0.0, le=1.0, description="Minimum similarity score (0-1) for the vector retriever"),
+    lexical_weight: float = Query(1.0, ge=0.0, description="Weight of the full-text ranking in the fusion"),
+    semantic_weight: float = Query(1.0, ge=0.0, description="Weight of the vector ranking in the fusion"),
+    storage: AsyncSupabase = Depends(get_storage)
+):
+    """Search all knowledge of a user's pets with full-text and vector retrieval at once, fused into one ranking."""
+    try:
+        return await storage.hybrid_search_user_knowledge(
+            wallet_address=wallet_address,
+            query=q,
+            limit=limit,
+            similarity_threshold=similarity_threshold,
+            lexical_weight=lexical_weight,
+            semantic_weight=semantic_weight
         )
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as exc:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc))
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(exc))
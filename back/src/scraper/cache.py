@@ -0,0 +1,272 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import hashlib
+import json
+import posixpath
+import sqlite3
+import threading
+import time
+
+from src.config import settings
+
+# Query parameters that only identify where a click came from
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid", "igshid",
+    "mc_cid", "mc_eid", "_hsenc", "_hsmi", "ref_src", "ref_url", "spm",
+}
+TRACKING_PREFIXES = ("utm_",)
+# Share-sheet parameters that only mean something to these hosts
+HOST_TRACKING_PARAMS = {
+    "x.com": {"s", "t"},
+    "twitter.com": {"s", "t"},
+    "youtube.com": {"si", "feature"},
+    "youtu.be": {"si"},
+}
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+FRESH = "fresh"
+STALE = "stale"
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Canonical form of *url* used as the scrape cache key.
+
+    Lowercases the scheme and host, drops default ports, the fragment and
+    tracking parameters, sorts the remaining query, and normalizes the path
+    (dot segments, duplicate and trailing slashes).
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower().rstrip(".")
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+
+    path = posixpath.normpath(parts.path) if parts.path else "/"
+    if path.startswith("//"):
+        path = "/" + path.lstrip("/")
+    if path == ".":
+        path = "/"
+
+    bare_host = host[4:] if host.startswith("www.") else host
+    host_params = HOST_TRACKING_PARAMS.get(bare_host, set())
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS
+        and key.lower() not in host_params
+        and not key.lower().startswith(TRACKING_PREFIXES)
+    )
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+class ScrapeCache:
+    """
+    Two-tier cache of scrape results keyed by (canonical URL, instruction).
+
+    The first tier is an in-memory LRU; the optional second tier is a SQLite
+    file that survives restarts and is trimmed to ``max_disk_bytes`` of
+    payload by least-recent use. Values must be JSON-serializable.
+
+    An entry is fresh for ``ttl`` seconds and may then be served stale for up
+    to ``stale_ttl`` more seconds, while :meth:`revalidate` refreshes it in
+    the background (once per key at a time).
+    """
+
+    def __init__(
+        self,
+        ttl: float = 6 * 3600,
+        stale_ttl: float = 7 * 24 * 3600,
+        max_entries: int = 1024,
+        path: Optional[str] = None,
+        max_disk_bytes: int = 512 * 1024 * 1024
+    ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._revalidating: Set[str] = set()
+        self._revalidator = ThreadPoolExecutor(max_workers=2, thread_name_prefix="scrape-revalidate")
+
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.fallback_hits = 0
+        self.revalidations = 0
+        self.revalidation_errors = 0
+
+        if path:
+            Path(path).expanduser().parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(Path(path).expanduser()), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS scrapes ("
+                "key TEXT PRIMARY KEY, url TEXT NOT NULL, payload TEXT NOT NULL, size INTEGER NOT NULL, "
+                "fetched_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_scrapes_last_used ON scrapes(last_used)")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(url: str, instruction: Optional[str] = None) -> str:
+        """Hash of the canonical URL and the scrape instruction."""
+        return hashlib.sha256(f"{canonicalize_url(url)}\0{instruction or ''}".encode("utf-8")).hexdigest()
+
+    def get(self, url: str, instruction: Optional[str] = None) -> Tuple[Optional[str], Any]:
+        """
+        Return ``(state, value)`` for the cached scrape of *url*: state is
+        ``"fresh"``, ``"stale"`` (serve it, but revalidate) or None on a miss.
+        """
+        now = time.time()
+
+        with self._lock:
+            entry = self._lookup(self.make_key(url, instruction), now)
+            age = now - entry[0] if entry is not None else None
+            if age is not None and age < self.ttl:
+                self.fresh_hits += 1
+                return FRESH, entry[1]
+            if age is not None and age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                return STALE, entry[1]
+
+            self.misses += 1
+            return None, None
+
+    def fallback(self, url: str, instruction: Optional[str] = None) -> Any:
+        """
+        The cached scrape of *url* however old, or None. For when scraping is
+        failing or throttled and an outdated page beats an error.
+        """
+        with self._lock:
+            entry = self._lookup(self.make_key(url, instruction), time.time())
+            if entry is None:
+                return None
+            self.fallback_hits += 1
+            return entry[1]
+
+    def _lookup(self, key: str, now: float) -> Optional[Tuple[float, Any]]:
+        """``(fetched_at, value)`` from memory, else from disk (promoting it to memory)."""
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+        elif self._db is not None:
+            row = self._db.execute(
+                "SELECT fetched_at, payload FROM scrapes WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                entry = (row[0], json.loads(row[1]))
+                self._db.execute("UPDATE scrapes SET last_used = ? WHERE key = ?", (now, key))
+                self._db.commit()
+                self._remember(key, entry)
+        return entry
+
+    def set(self, url: str, value: Any, instruction: Optional[str] = None) -> None:
+        """Store a fresh scrape result in both tiers."""
+        key = self.make_key(url, instruction)
+        now = time.time()
+
+        with self._lock:
+            self._remember(key, (now, value))
+
+            if self._db is not None:
+                payload = json.dumps(value)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO scrapes (key, url, payload, size, fetched_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, canonicalize_url(url), payload, len(payload), now, now)
+                )
+                self._trim_disk()
+                self._db.commit()
+
+    def revalidate(self, url: str, instruction: Optional[str], fetch: Callable[[], Any]) -> bool:
+        """
+        Refresh a stale entry with ``fetch()`` on a background thread.
+
+        Returns False when a refresh of the same key is already running. A
+        failed refresh keeps serving the stale value.
+        """
+        key = self.make_key(url, instruction)
+        with self._lock:
+            if key in self._revalidating:
+                return False
+            self._revalidating.add(key)
+
+        def refresh() -> None:
+            try:
+                self.set(url, fetch(), instruction)
+                self.revalidations += 1
+            except Exception as e:
+                self.revalidation_errors += 1
+                print(f"Error revalidating scrape of {url}: {str(e)}")
+            finally:
+                with self._lock:
+                    self._revalidating.discard(key)
+
+        self._revalidator.submit(refresh)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current tier sizes."""
+        with self._lock:
+            lookups = self.fresh_hits + self.stale_hits + self.misses
+            disk_entries = disk_bytes = None
+            if self._db is not None:
+                disk_entries, disk_bytes = self._db.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM scrapes"
+                ).fetchone()
+            return {
+                "fresh_hits": self.fresh_hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_rate": (self.fresh_hits + self.stale_hits) / lookups if lookups else 0.0,
+                "fallback_hits": self.fallback_hits,
+                "revalidations": self.revalidations,
+                "revalidation_errors": self.revalidation_errors,
+                "revalidating": len(self._revalidating),
+                "ttl_seconds": self.ttl,
+                "stale_seconds": self.stale_ttl,
+                "memory_entries": len(self._memory),
+                "memory_capacity": self.max_entries,
+                "disk_entries": disk_entries,
+                "disk_bytes": disk_bytes,
+                "disk_capacity_bytes": self.max_disk_bytes if self._db is not None else None,
+            }
+
+    def _remember(self, key: str, entry: Tuple[float, Any]) -> None:
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _trim_disk(self) -> None:
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM scrapes").fetchone()[0]
+        overflow = total - self.max_disk_bytes
+        if overflow <= 0:
+            return
+
+        evicted = []
+        for key, size in self._db.execute("SELECT key, size FROM scrapes ORDER BY last_used ASC"):
+            evicted.append((key,))
+            overflow -= size
+            if overflow <= 0:
+                break
+        self._db.executemany("DELETE FROM scrapes WHERE key = ?", evicted)
+
+
+@lru_cache()
+def get_scrape_cache() -> ScrapeCache:
+    """The process-wide scrape cache shared by every :class:`NotteScraper`."""
+    return ScrapeCache(
+        ttl=settings.scrape_cache_ttl_seconds,
+        stale_ttl=settings.scrape_cache_stale_seconds,
+        max_entries=settings.scrape_cache_size,
+        path=settings.scrape_cache_path,
+        max_disk_bytes=settings.scrape_cache_disk_mb * 1024 * 1024
+    )
@@ -0,0 +1,302 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, Optional
+from urllib.parse import urlsplit
+import re
+import threading
+import time
+
+import requests
+from notte_core.errors.base import NotteTimeoutError
+
+from src.config import settings
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+# Per-domain buckets kept before the least recently used are dropped
+MAX_TRACKED_DOMAINS = 4096
+
+# Errors and response codes that mean the backend itself is unhealthy
+TRANSPORT_ERRORS = (
+    TimeoutError, ConnectionError, requests.Timeout, requests.ConnectionError, NotteTimeoutError,
+)
+BACKEND_FAILURE_STATUSES = {429} | set(range(500, 600))
+# The Notte SDK only reports the response code in its message
+STATUS_CODE_PATTERN = re.compile(r"status code (\d{3})")
+
+
+class ScraperUnavailable(RuntimeError):
+    """Raised instead of scraping while the circuit is open or when no slot frees up in time."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def scrape_domain(url: str) -> str:
+    """Rate-limit key of *url*: its lowercased host without ``www.``."""
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    for source in (error, getattr(error, "response", None)):
+        code = getattr(source, "status_code", None)
+        if isinstance(code, int):
+            return code
+    match = STATUS_CODE_PATTERN.search(getattr(error, "dev_message", None) or str(error))
+    return int(match.group(1)) if match else None
+
+
+def is_backend_failure(exc: BaseException) -> bool:
+    """
+    Whether *exc* means the scraping backend is unhealthy and should count
+    against the circuit breaker: timeouts, transport errors and 429/5xx
+    responses, anywhere in its cause chain. Errors caused by the request
+    itself (an invalid URL, other 4xx responses) do not count.
+    """
+    error: Optional[BaseException] = exc
+    caller_error = False
+    while error is not None:
+        if isinstance(error, TRANSPORT_ERRORS):
+            return True
+        status = _status_code(error)
+        if status is not None:
+            return status in BACKEND_FAILURE_STATUSES
+        caller_error = caller_error or isinstance(error, ValueError)
+        error = error.__cause__ or error.__context__
+    return not caller_error
+
+
+class TokenBucket:
+    """Allows ``rate`` acquisitions per second on average, in bursts of up to ``burst``."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.waits = 0
+        self.rejections = 0
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """
+        Take a token, possibly one that will only exist in the future; returns
+        how long to wait before using it, or None if that exceeds *max_wait*.
+        Not thread-safe on its own.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        if wait > max_wait:
+            self.rejections += 1
+            return None
+        self.tokens -= 1
+        if wait:
+            self.waits += 1
+        return wait
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures and rejects calls
+    for ``reset_seconds``; then lets a single probe through (half-open), which
+    closes the circuit on success or re-opens it on failure.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = BREAKER_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+        self.successes = 0
+        self.failures = 0
+        self.rejections = 0
+        self.trips = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == BREAKER_OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = BREAKER_HALF_OPEN
+            if self.state == BREAKER_CLOSED:
+                return True
+            if self.state == BREAKER_HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejections += 1
+            return False
+
+    def retry_after(self) -> Optional[float]:
+        if self.state != BREAKER_OPEN:
+            return None
+        return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.state = BREAKER_CLOSED
+            self._probing = False
+
+    def release(self) -> None:
+        """Give back an allowed call that never reached the backend (frees a half-open probe)."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.state == BREAKER_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != BREAKER_OPEN:
+                    self.trips += 1
+                self.state = BREAKER_OPEN
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_seconds": self.reset_seconds,
+            "retry_after_seconds": self.retry_after(),
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejections": self.rejections,
+            "trips": self.trips,
+        }
+
+
+class ScrapeGuard:
+    """
+    Process-wide limits around calls to the scraping backend.
+
+    Every scrape takes a token from its domain's bucket, then one of
+    ``max_concurrency`` slots, waiting at most ``max_wait`` seconds for
+    each, and is skipped outright while the circuit breaker is open. Backend
+    failures (see :func:`is_backend_failure`) and successes feed the breaker.
+    Waiting blocks the calling thread, so call it off the event loop.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        domain_rate: float = 1.0,
+        domain_burst: int = 5,
+        max_wait: float = 30.0,
+        failure_threshold: int = 5,
+        reset_seconds: float = 30.0,
+        is_failure: Callable[[BaseException], bool] = is_backend_failure
+    ):
+        self.max_concurrency = max_concurrency
+        self.domain_rate = domain_rate
+        self.domain_burst = domain_burst
+        self.max_wait = max_wait
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self.is_failure = is_failure
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.slot_rejections = 0
+
+    @contextmanager
+    def slot(self, url: str) -> Iterator[None]:
+        """
+        Hold a rate-limited, concurrency-limited slot for scraping *url*, or
+        raise :class:`ScraperUnavailable`. Exceptions raised inside count as
+        backend failures when ``is_failure`` says so; others leave the breaker
+        as it was.
+        """
+        if not self.breaker.allow():
+            raise ScraperUnavailable("Scraper circuit is open", self.breaker.retry_after())
+
+        started = time.monotonic()
+        try:
+            self._wait_for_token(scrape_domain(url))
+            remaining = max(0.0, self.max_wait - (time.monotonic() - started))
+            if not self._slots.acquire(timeout=remaining):
+                with self._lock:
+                    self.slot_rejections += 1
+                raise ScraperUnavailable(f"No scraper slot free within {self.max_wait:g}s")
+        except ScraperUnavailable:
+            # Nothing reached the backend, so this says nothing about its health
+            self.breaker.release()
+            raise
+
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        except Exception as e:
+            if self.is_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.release()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def _wait_for_token(self, domain: str) -> None:
+        with self._lock:
+            bucket = self._buckets.get(domain)
+            if bucket is None:
+                bucket = self._buckets[domain] = TokenBucket(self.domain_rate, self.domain_burst)
+                while len(self._buckets) > MAX_TRACKED_DOMAINS:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(domain)
+            wait = bucket.reserve(self.max_wait)
+        if wait is None:
+            raise ScraperUnavailable(f"Rate limit for {domain} exceeded", 1 / self.domain_rate)
+        if wait:
+            time.sleep(wait)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            throttled = sorted(
+                (
+                    {"domain": domain, "tokens": round(bucket.tokens, 2), "waits": bucket.waits, "rejections": bucket.rejections}
+                    for domain, bucket in self._buckets.items() if bucket.waits or bucket.rejections
+                ),
+                key=lambda row: row["waits"] + row["rejections"],
+                reverse=True
+            )
+            return {
+                "healthy": self.breaker.state == BREAKER_CLOSED,
+                "breaker": self.breaker.stats(),
+                "in_flight": self.in_flight,
+                "max_concurrency": self.max_concurrency,
+                "slot_rejections": self.slot_rejections,
+                "domain_rate_per_second": self.domain_rate,
+                "domain_burst": self.domain_burst,
+                "tracked_domains": len(self._buckets),
+                "throttled_domains": throttled[:20],
+            }
+
+
+@lru_cache()
+def get_scrape_guard() -> ScrapeGuard:
+    """The process-wide guard shared by every :class:`NotteScraper`."""
+    return ScrapeGuard(
+        max_concurrency=settings.scrape_max_concurrency,
+        domain_rate=settings.scrape_domain_rate_per_second,
+        domain_burst=settings.scrape_domain_burst,
+        max_wait=settings.scrape_max_wait_seconds,
+        failure_threshold=settings.scrape_breaker_failures,
+        reset_seconds=settings.scrape_breaker_reset_seconds
+    )
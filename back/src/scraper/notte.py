@@ -1,10 +1,18 @@
+from typing import Any, Dict, Optional
+
 from notte_sdk import NotteClient
+from notte_core.data.space import DataSpace
 from src.config import settings
+from src.scraper.cache import STALE, ScrapeCache, get_scrape_cache
+from src.scraper.guard import ScrapeGuard, get_scrape_guard
 from urllib.parse import urlparse, urlunparse
 
 class NotteScraper:
-    def __init__(self):
+    def __init__(self, cache: Optional[ScrapeCache] = None, guard: Optional[ScrapeGuard] = None):
         self.notte = NotteClient(api_key=settings.NOTTE_API_KEY)
+        # Shared by every scraper in the process unless passed in
+        self.cache = cache if cache is not None else get_scrape_cache()
+        self.guard = guard if guard is not None else get_scrape_guard()
 
     def _normalize_url(self, url: str) -> str:
         parsed = urlparse(url)
@@ -14,10 +22,70 @@ class NotteScraper:
         # return urlunparse(parsed)
         return url
 
-    def scrape(self, url: str, instruction: str):
+    def scrape(self, url: str, instruction: str, use_cache: bool = True):
+        """
+        Scrape *url*, serving the cached result for its canonical URL and instruction when there is one.
+
+        Calls to Notte are rate limited per domain, capped in number and
+        skipped while the circuit breaker is open (:class:`ScrapeGuard`). When
+        a scrape is rejected or fails, a cached copy of any age is served
+        instead of the error if there is one.
+        """
+        if use_cache:
+            cached = self.cached(url, instruction)
+            if cached is not None:
+                return cached
+
+        try:
+            response = self._fetch(url, instruction)
+        except Exception:
+            fallback = self.cache.fallback(url, instruction) if use_cache else None
+            result = self._decode(fallback) if fallback is not None else None
+            if result is None:
+                raise
+            return result
+        if use_cache:
+            try:
+                self.cache.set(url, self._encode(response), instruction)
+            except Exception as e:
+                print(f"Error caching scrape of {url}: {str(e)}")
+        return response
+
+    def cached(self, url: str, instruction: Optional[str] = None):
+        """
+        The cached scrape of *url*, or None. A stale result is still returned,
+        and refreshed in the background.
+        """
+        state, payload = self.cache.get(url, instruction)
+        if state is None:
+            return None
+        result = self._decode(payload)
+        if result is not None and state == STALE:
+            self.cache.revalidate(url, instruction, lambda: self._encode(self._fetch(url, instruction)))
+        return result
+
+    def _fetch(self, url: str, instruction: str):
         normalized = self._normalize_url(url)
-        response = self.notte.scrape(
-            url=normalized,
-            instruction=instruction,
-        )
-        return response
\ No newline at end of file
+        with self.guard.slot(normalized):
+            response = self.notte.scrape(
+                url=normalized,
+                instruction=instruction,
+            )
+        return response
+
+    @staticmethod
+    def _encode(result: Any) -> Dict[str, Any]:
+        """JSON form of a scrape result for the cache."""
+        if isinstance(result, DataSpace):
+            return {"dataspace": result.model_dump(mode="json")}
+        return {"raw": result}
+
+    @staticmethod
+    def _decode(payload: Dict[str, Any]) -> Any:
+        try:
+            if "dataspace" in payload:
+                return DataSpace.model_validate(payload["dataspace"])
+            return payload["raw"]
+        except Exception as e:
+            print(f"Error decoding cached scrape result: {str(e)}")
+            return None
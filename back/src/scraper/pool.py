@@ -0,0 +1,109 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import time
+
+from src.scraper.notte import NotteScraper
+
+SCRAPE_OK = "ok"
+SCRAPE_FAILED = "failed"
+SCRAPE_TIMEOUT = "timeout"
+
+
+@dataclass
+class ScrapeOutcome:
+    """Result of one scrape submitted to a :class:`ScrapePool`."""
+    index: int
+    url: str
+    status: str  # SCRAPE_OK, SCRAPE_FAILED or SCRAPE_TIMEOUT
+    result: Any = None
+    error: Optional[str] = None
+
+
+class ScrapePool:
+    """
+    Bounded pool of scraper threads shared by every request.
+
+    :meth:`scrape_many` submits a batch of URLs at once and yields outcomes in
+    groups as they complete, so callers can process the fast pages while the
+    slow ones are still loading. A scrape that runs (or waits for a worker)
+    longer than ``timeout`` seconds is reported as timed out; its thread cannot
+    be interrupted, so it finishes in the background and its result is dropped.
+    """
+
+    def __init__(self, scraper: NotteScraper, max_workers: int = 8, timeout: float = 45.0):
+        self.scraper = scraper
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scrape")
+
+    def scrape_many(
+        self,
+        jobs: Sequence[Tuple[str, Optional[str]]],
+        timeout: Optional[float] = None
+    ) -> Iterator[List[ScrapeOutcome]]:
+        """
+        Start scraping every ``(url, instruction)`` in *jobs* and return an
+        iterator over groups of :class:`ScrapeOutcome`, in completion order.
+
+        Work is submitted before this returns, so scrapes are already running
+        while the caller does something else.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        submitted = time.monotonic()
+        started: Dict[int, float] = {}
+
+        def run(index: int, url: str, instruction: Optional[str]) -> Any:
+            started[index] = time.monotonic()
+            return self.scraper.scrape(url=url, instruction=instruction)
+
+        pending: Dict[Future, int] = {
+            self._executor.submit(run, index, url, instruction): index
+            for index, (url, instruction) in enumerate(jobs)
+        }
+        return self._collect(jobs, pending, started, submitted, timeout)
+
+    def _collect(
+        self,
+        jobs: Sequence[Tuple[str, Optional[str]]],
+        pending: Dict[Future, int],
+        started: Dict[int, float],
+        submitted: float,
+        timeout: float
+    ) -> Iterator[List[ScrapeOutcome]]:
+        # Each job's deadline runs from when a worker picked it up, or from submission while queued
+        def deadline(index: int) -> float:
+            return started.get(index, submitted) + timeout
+
+        try:
+            while pending:
+                next_deadline = min(deadline(index) for index in pending.values())
+                done, _ = wait(
+                    pending, timeout=max(0.0, next_deadline - time.monotonic()), return_when=FIRST_COMPLETED
+                )
+
+                group = []
+                for future in done:
+                    index = pending.pop(future)
+                    try:
+                        group.append(ScrapeOutcome(index, jobs[index][0], SCRAPE_OK, result=future.result()))
+                    except Exception as e:
+                        group.append(ScrapeOutcome(index, jobs[index][0], SCRAPE_FAILED, error=str(e)))
+
+                now = time.monotonic()
+                for future, index in list(pending.items()):
+                    if now >= deadline(index):
+                        future.cancel()
+                        del pending[future]
+                        group.append(ScrapeOutcome(
+                            index, jobs[index][0], SCRAPE_TIMEOUT, error=f"Scrape timed out after {timeout:g}s"
+                        ))
+
+                if group:
+                    yield group
+        finally:
+            # Abandoned early (e.g. a streaming client went away): drop scrapes not yet started
+            for future in pending:
+                future.cancel()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
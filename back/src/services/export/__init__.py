@@ -0,0 +1,5 @@
+from .parquet import ParquetExporter
+
+__all__ = [
+    "ParquetExporter",
+]
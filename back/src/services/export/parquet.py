@@ -0,0 +1,356 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+import json
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.services.storage.similarity import parse_embedding
+from src.services.storage.supabase import Supabase
+
+EMBEDDING_DIM = 1536
+
+# Game session tables written by routes/ai.py, keyed by the game_type stored in the export
+GAME_SESSION_TABLES = {
+    "language_flashcards": "flashcard_sessions",
+    "sentiment_labeling": "sentiment_sessions",
+    "knowledge_trivia": "trivia_sessions",
+    "image_quality": "image_quality_sessions",
+}
+
+INSTANCE_PARTITIONS = ["pet_id", "category", "date"]
+SESSION_PARTITIONS = ["game_type", "date"]
+
+DATAINSTANCE_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("pet_id", pa.string()),
+    ("category", pa.string()),
+    ("date", pa.string()),
+    ("content", pa.string()),
+    ("content_type", pa.string()),
+    ("content_hash", pa.string()),
+    ("tags", pa.list_(pa.string())),
+    ("metadata", pa.string()),
+    ("created_at", pa.timestamp("us", tz="UTC")),
+])
+
+KNOWLEDGE_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("datainstance_id", pa.string()),
+    ("pet_id", pa.string()),
+    ("category", pa.string()),
+    ("date", pa.string()),
+    ("url", pa.string()),
+    ("title", pa.string()),
+    ("content", pa.string()),
+    ("content_hash", pa.string()),
+    ("metadata", pa.string()),
+    ("created_at", pa.timestamp("us", tz="UTC")),
+    ("embeddings", pa.list_(pa.float32(), EMBEDDING_DIM)),
+])
+
+IMAGE_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("datainstance_id", pa.string()),
+    ("pet_id", pa.string()),
+    ("category", pa.string()),
+    ("date", pa.string()),
+    ("image_url", pa.string()),
+    ("alt_text", pa.string()),
+    ("metadata", pa.string()),
+    ("created_at", pa.timestamp("us", tz="UTC")),
+])
+
+GAME_SESSION_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("wallet_address", pa.string()),
+    ("game_type", pa.string()),
+    ("date", pa.string()),
+    ("score", pa.int64()),
+    ("correct_answers", pa.int64()),
+    ("duration_seconds", pa.int64()),
+    ("completed_at", pa.timestamp("us", tz="UTC")),
+    ("session", pa.string()),
+])
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _to_json(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, default=str)
+
+
+def _to_int(value: Any) -> Optional[int]:
+    return int(value) if value is not None else None
+
+
+class PartitionedParquetWriter:
+    """
+    Stream rows into a hive-partitioned Parquet dataset.
+
+    Rows are buffered across calls to :meth:`write` and written once
+    ``row_group_size`` of them are pending, so row groups stay large however
+    small the pages fed in, and at most that many rows are held in memory
+    however large the dataset is. At most ``max_open_files`` Parquet writers
+    stay open; when another partition needs one, the least recently used
+    writer is closed (after writing its pending rows) and a later write to its
+    partition starts a new ``part-N`` file. :meth:`close` writes the rest.
+    """
+
+    def __init__(
+        self,
+        base_dir: Path,
+        schema: pa.Schema,
+        partition_cols: List[str],
+        row_group_size: int = 10_000,
+        compression: str = "zstd",
+        max_open_files: int = 64
+    ):
+        self.base_dir = base_dir
+        self.partition_cols = partition_cols
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.max_open_files = max_open_files
+        self.file_schema = pa.schema([field for field in schema if field.name not in partition_cols])
+        self._buffers: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+        self._buffered = 0
+        self._writers: "OrderedDict[Tuple[str, ...], Tuple[pq.ParquetWriter, Path]]" = OrderedDict()
+        self._file_counts: Dict[Tuple[str, ...], int] = {}
+        self._files: List[str] = []
+        self.rows_written = 0
+        self.peak_buffered_rows = 0
+
+    def write(self, rows: Iterable[Dict[str, Any]]) -> None:
+        for row in rows:
+            key = tuple(str(row.get(col) or "unknown") for col in self.partition_cols)
+            self._buffers.setdefault(key, []).append(row)
+            self._buffered += 1
+            self.peak_buffered_rows = max(self.peak_buffered_rows, self._buffered)
+            if self._buffered >= self.row_group_size:
+                self._flush()
+
+    def close(self) -> List[str]:
+        """Flush any buffered rows, close every writer and return the files written."""
+        self._flush()
+        while self._writers:
+            self._close_oldest()
+        return list(self._files)
+
+    def _partition_path(self, key: Tuple[str, ...]) -> Path:
+        parts = [f"{col}={value}" for col, value in zip(self.partition_cols, key)]
+        index = self._file_counts.get(key, 0)
+        self._file_counts[key] = index + 1
+        return self.base_dir.joinpath(*parts, f"part-{index}.parquet")
+
+    def _flush(self) -> None:
+        while self._buffers:
+            key = next(iter(self._buffers))
+            # Opening the writer may evict another partition, which writes that one's rows
+            writer = self._writer(key)
+            self._write_rows(writer, self._buffers.pop(key))
+
+    def _write_rows(self, writer: pq.ParquetWriter, rows: List[Dict[str, Any]]) -> None:
+        writer.write_table(pa.Table.from_pylist(rows, schema=self.file_schema))
+        self.rows_written += len(rows)
+        self._buffered -= len(rows)
+
+    def _writer(self, key: Tuple[str, ...]) -> pq.ParquetWriter:
+        if key in self._writers:
+            self._writers.move_to_end(key)
+            return self._writers[key][0]
+        while len(self._writers) >= self.max_open_files:
+            self._close_oldest()
+        path = self._partition_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        writer = pq.ParquetWriter(str(path), self.file_schema, compression=self.compression)
+        self._writers[key] = (writer, path)
+        return writer
+
+    def _close_oldest(self) -> None:
+        key, (writer, path) = self._writers.popitem(last=False)
+        rows = self._buffers.pop(key, None)
+        if rows:
+            self._write_rows(writer, rows)
+        writer.close()
+        self._files.append(str(path))
+
+
+class ParquetExporter:
+    """
+    Export pet and user datasets to columnar Parquet for training pipelines.
+
+    Writes ``datainstances``, ``knowledge`` (embeddings as a fixed-size float32
+    list), ``images`` and, for users, ``game_sessions`` under *out_dir*, each
+    partitioned by ``pet_id/category/date`` (sessions by ``game_type/date``).
+    """
+
+    def __init__(self, storage: Supabase, row_group_size: int = 10_000):
+        self.storage = storage
+        self.row_group_size = row_group_size
+
+    def export_pet(self, pet_id: str, out_dir: str) -> Optional[Dict[str, Any]]:
+        """Export one pet; returns a manifest, or None if the pet does not exist."""
+        if not self.storage.get_pet(pet_id):
+            return None
+        writers = self._instance_writers(Path(out_dir))
+        self._write_pet(pet_id, writers)
+        return self._manifest(out_dir, {"pet_id": pet_id}, writers)
+
+    def export_user(self, wallet_address: str, out_dir: str) -> Dict[str, Any]:
+        """Export every pet owned by a wallet plus the user's game sessions."""
+        base = Path(out_dir)
+        writers = self._instance_writers(base)
+        pets = self.storage.get_user_pets(wallet_address)
+        for pet in pets:
+            self._write_pet(pet["id"], writers)
+
+        sessions = PartitionedParquetWriter(
+            base / "game_sessions", GAME_SESSION_SCHEMA, SESSION_PARTITIONS, self.row_group_size
+        )
+        for game_type, table in GAME_SESSION_TABLES.items():
+            try:
+                rows = self.storage.get_user_game_sessions(wallet_address, table)
+            except Exception as e:
+                print(f"Skipping {table} in export: {str(e)}")
+                continue
+            sessions.write(self._session_row(game_type, row) for row in rows)
+        writers["game_sessions"] = sessions
+
+        return self._manifest(
+            out_dir, {"wallet_address": wallet_address, "pet_count": len(pets)}, writers
+        )
+
+    def _instance_writers(self, base: Path) -> Dict[str, PartitionedParquetWriter]:
+        return {
+            "datainstances": PartitionedParquetWriter(
+                base / "datainstances", DATAINSTANCE_SCHEMA, INSTANCE_PARTITIONS, self.row_group_size
+            ),
+            "knowledge": PartitionedParquetWriter(
+                base / "knowledge", KNOWLEDGE_SCHEMA, INSTANCE_PARTITIONS, self.row_group_size
+            ),
+            "images": PartitionedParquetWriter(
+                base / "images", IMAGE_SCHEMA, INSTANCE_PARTITIONS, self.row_group_size
+            ),
+        }
+
+    def _write_pet(self, pet_id: str, writers: Dict[str, PartitionedParquetWriter]) -> None:
+        for page in self.storage.iter_pet_export_pages(pet_id, include_embeddings=True):
+            instance_rows, knowledge_rows, image_rows = [], [], []
+            for instance in page:
+                created_at = _parse_timestamp(instance.get("created_at"))
+                partition = {
+                    "pet_id": instance["pet_id"],
+                    "category": instance.get("category") or "general",
+                    "date": created_at.date().isoformat() if created_at else None,
+                }
+                instance_rows.append({
+                    **partition,
+                    "id": instance["id"],
+                    "content": instance.get("content"),
+                    "content_type": instance.get("content_type"),
+                    "content_hash": instance.get("content_hash"),
+                    "tags": instance.get("tags") or [],
+                    "metadata": _to_json(instance.get("metadata")),
+                    "created_at": created_at,
+                })
+                for knowledge in instance["knowledge"]:
+                    embedding = parse_embedding(knowledge.get("embeddings"))
+                    if embedding is not None and len(embedding) != EMBEDDING_DIM:
+                        embedding = None
+                    knowledge_rows.append({
+                        **partition,
+                        "id": knowledge["id"],
+                        "datainstance_id": instance["id"],
+                        "url": knowledge.get("url"),
+                        "title": knowledge.get("title"),
+                        "content": knowledge.get("content"),
+                        "content_hash": knowledge.get("content_hash"),
+                        "metadata": _to_json(knowledge.get("metadata")),
+                        "created_at": _parse_timestamp(knowledge.get("created_at")),
+                        "embeddings": embedding,
+                    })
+                for image in instance["images"]:
+                    image_rows.append({
+                        **partition,
+                        "id": image["id"],
+                        "datainstance_id": instance["id"],
+                        "image_url": image.get("image_url"),
+                        "alt_text": image.get("alt_text"),
+                        "metadata": _to_json(image.get("metadata")),
+                        "created_at": _parse_timestamp(image.get("created_at")),
+                    })
+            writers["datainstances"].write(instance_rows)
+            writers["knowledge"].write(knowledge_rows)
+            writers["images"].write(image_rows)
+
+    def _session_row(self, game_type: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        completed_at = _parse_timestamp(row.get("completed_at") or row.get("created_at"))
+        return {
+            "id": str(row.get("id")),
+            "wallet_address": row.get("wallet_address"),
+            "game_type": game_type,
+            "date": completed_at.date().isoformat() if completed_at else None,
+            "score": _to_int(row.get("total_score", row.get("total_points"))),
+            "correct_answers": _to_int(row.get("correct_answers")),
+            "duration_seconds": _to_int(row.get("duration_seconds")),
+            "completed_at": completed_at,
+            "session": _to_json(row),
+        }
+
+    def _manifest(
+        self,
+        out_dir: str,
+        scope: Dict[str, Any],
+        writers: Dict[str, PartitionedParquetWriter]
+    ) -> Dict[str, Any]:
+        datasets = {}
+        for name, writer in writers.items():
+            files = writer.close()
+            datasets[name] = {"rows": writer.rows_written, "files": files}
+        return {
+            **scope,
+            "path": str(Path(out_dir).resolve()),
+            "format": "parquet",
+            "partitioning": "hive",
+            "datasets": datasets,
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description="Export CapyData datasets to Parquet.")
+    parser.add_argument("scope", choices=["pet", "user"], help="Export a single pet or every pet of a wallet")
+    parser.add_argument("id", help="Pet ID or wallet address")
+    parser.add_argument("--out", required=True, help="Output directory for the Parquet datasets")
+    parser.add_argument("--row-group-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    storage = Supabase(
+        url=os.environ["SUPABASE_URL"],
+        key=os.environ["SUPABASE_KEY"]
+    )
+    exporter = ParquetExporter(storage, row_group_size=args.row_group_size)
+
+    if args.scope == "pet":
+        manifest = exporter.export_pet(args.id, args.out)
+        if manifest is None:
+            raise SystemExit(f"Pet {args.id} not found")
+    else:
+        manifest = exporter.export_user(args.id, args.out)
+
+    print(json.dumps(manifest, indent=2))
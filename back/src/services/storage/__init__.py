@@ -1,5 +1,7 @@
 from .supabase import Supabase
+from .async_supabase import AsyncSupabase
 
 __all__ = [
     "Supabase",
-] 
\ No newline at end of file
+    "AsyncSupabase",
+]
\ No newline at end of file
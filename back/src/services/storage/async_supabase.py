@@ -0,0 +1,378 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Dict, Any, Optional, Callable, TypeVar, AsyncIterator, Awaitable
+import asyncio
+
+import asyncpg
+from supabase import AsyncClient, acreate_client
+
+from .fusion import reciprocal_rank_fusion
+from .ingestion import IngestionQueue
+from .pagination import Keyset, RankKeyset
+from .postgres import PostgresReader
+from .schemas import DataInstance, Knowledge, Image, KnowledgeFilter
+from .supabase import Supabase
+from src.config import settings
+
+T = TypeVar("T")
+
+
+class AsyncSupabase:
+    """
+    Non-blocking facade over :class:`Supabase` for use from async route handlers.
+
+    ``client`` is the async supabase client, so ad-hoc table queries can be
+    awaited directly. The storage methods, which mix PostgREST calls with
+    embedding, scraping and numpy work, run on a bounded thread pool so they
+    never block the event loop. When a :class:`PostgresReader` is configured,
+    the hot reads go straight to Postgres over asyncpg instead.
+    """
+
+    def __init__(
+        self,
+        storage: Supabase,
+        client: AsyncClient,
+        max_workers: int = 32,
+        reader: Optional[PostgresReader] = None,
+        jobs: Optional[IngestionQueue] = None
+    ):
+        self.storage = storage
+        self.client = client
+        self.reader = reader
+        self.jobs = jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storage")
+
+    @classmethod
+    async def create(cls, url: str, key: str, openai_api_key: str = None) -> "AsyncSupabase":
+        """Build the storage helpers for a project, including the asyncpg pool if configured."""
+        client = await acreate_client(url, key)
+        
+        reader = None
+        if settings.storage_read_backend == "asyncpg":
+            if not settings.database_url:
+                raise RuntimeError("DATABASE_URL must be set when STORAGE_READ_BACKEND=asyncpg.")
+            reader = await PostgresReader.create(
+                settings.database_url,
+                min_size=settings.database_pool_min_size,
+                max_size=settings.database_pool_max_size,
+                statement_cache_size=settings.database_statement_cache_size
+            )
+        
+        storage = Supabase(url, key, openai_api_key)
+        jobs = IngestionQueue(
+            storage,
+            workers=settings.ingestion_workers,
+            max_attempts=settings.ingestion_max_attempts,
+            retry_base_seconds=settings.ingestion_retry_base_seconds,
+            retry_max_seconds=settings.ingestion_retry_max_seconds,
+            poll_seconds=settings.ingestion_poll_seconds,
+            lease_seconds=settings.ingestion_lease_seconds
+        )
+        jobs.start()
+        
+        return cls(
+            storage,
+            client,
+            max_workers=settings.storage_max_workers,
+            reader=reader,
+            jobs=jobs
+        )
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run a blocking callable on the storage thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def close(self) -> None:
+        """Release the worker, ingestion and scraper threads, the async client's connections and the asyncpg pool, if any."""
+        if self.jobs is not None:
+            self.jobs.stop()
+        self._executor.shutdown(wait=False)
+        self.storage.scrape_pool.shutdown()
+        await self.client.postgrest.aclose()
+        if self.reader is not None:
+            await self.reader.close()
+
+    # Pets and users ------------------------------------------------------
+
+    async def get_pet(self, pet_id: str) -> Optional[Dict[str, Any]]:
+        if self.reader is not None:
+            return await self.reader.get_pet(pet_id)
+        return await self.run(self.storage.get_pet, pet_id)
+
+    async def get_user_pets(self, wallet_address: str) -> List[Dict[str, Any]]:
+        if self.reader is not None:
+            return await self.reader.get_user_pets(wallet_address)
+        return await self.run(self.storage.get_user_pets, wallet_address)
+
+    async def get_user_statistics(self, wallet_address: str) -> Dict[str, Any]:
+        return await self.run(self.storage.get_user_statistics, wallet_address)
+
+    # DataInstances -------------------------------------------------------
+
+    async def create_datainstance(self, datainstance: DataInstance) -> Dict[str, Any]:
+        return await self.run(self.storage.create_datainstance, datainstance)
+
+    async def create_complete_datainstance(
+        self,
+        pet_id: str,
+        content: str,
+        content_type: str,
+        knowledge_list: List[Dict[str, Any]] = None,
+        image_urls: List[str] = None,
+        metadata: Dict[str, Any] = None,
+        category: str = "general",
+        tags: List[str] = None
+    ) -> Dict[str, Any]:
+        return await self.run(
+            self.storage.create_complete_datainstance,
+            pet_id=pet_id,
+            content=content,
+            content_type=content_type,
+            knowledge_list=knowledge_list,
+            image_urls=image_urls,
+            metadata=metadata,
+            category=category,
+            tags=tags
+        )
+
+    async def get_pet_instances(
+        self,
+        pet_id: str,
+        limit: int = 100,
+        offset: int = 0,
+        after: Optional[Keyset] = None
+    ) -> List[Dict[str, Any]]:
+        if self.reader is not None:
+            return await self.reader.get_pet_instances(pet_id, limit=limit, offset=offset, after=after)
+        return await self.run(self.storage.get_pet_instances, pet_id, limit=limit, offset=offset, after=after)
+
+    async def get_datainstance_with_content(self, datainstance_id: str) -> Optional[Dict[str, Any]]:
+        if self.reader is not None:
+            return await self.reader.get_datainstance_with_content(datainstance_id)
+        return await self.run(self.storage.get_datainstance_with_content, datainstance_id)
+
+    async def export_pet_data(self, pet_id: str) -> Optional[Dict[str, Any]]:
+        return await self.run(self.storage.export_pet_data, pet_id)
+
+    async def iter_pet_export(self, pet_id: str, page_size: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield a pet's complete DataInstances one by one, fetching each page off the event loop."""
+        pages = self.storage.iter_pet_export_pages(pet_id, page_size)
+        while True:
+            page = await self.run(next, pages, None)
+            if page is None:
+                return
+            for instance in page:
+                yield instance
+
+    # Knowledge and images ------------------------------------------------
+
+    async def get_pet_knowledge(
+        self,
+        pet_id: str,
+        limit: int = 100,
+        after: Optional[Keyset] = None
+    ) -> List[Dict[str, Any]]:
+        return await self.run(self.storage.get_pet_knowledge, pet_id, limit=limit, after=after)
+
+    async def get_datainstance_knowledge(self, datainstance_id: str) -> List[Dict[str, Any]]:
+        return await self.run(self.storage.get_datainstance_knowledge, datainstance_id)
+
+    async def get_datainstance_images(self, datainstance_id: str) -> List[Dict[str, Any]]:
+        return await self.run(self.storage.get_datainstance_images, datainstance_id)
+
+    async def add_knowledge_to_instance(self, datainstance_id: str, knowledge: Knowledge) -> Dict[str, Any]:
+        return await self.run(self.storage.add_knowledge_to_instance, datainstance_id, knowledge)
+
+    async def bulk_add_knowledge(self, datainstance_id: str, knowledge_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return await self.run(self.storage.bulk_add_knowledge, datainstance_id, knowledge_list)
+
+    async def add_knowledge_from_urls(
+        self,
+        datainstance_id: str,
+        urls: List[str],
+        instruction: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        return await self.run(self.storage.add_knowledge_from_urls, datainstance_id, urls, instruction)
+
+    async def enqueue_knowledge_ingestion(
+        self,
+        datainstance_id: str,
+        pet_id: str,
+        knowledge_list: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Queue *knowledge_list* to be scraped, embedded and attached in the background."""
+        return await self.run(self.jobs.enqueue, datainstance_id, pet_id, knowledge_list)
+
+    async def get_ingestion_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.run(self.jobs.get, job_id)
+
+    async def add_image_to_instance(self, datainstance_id: str, image: Image) -> Dict[str, Any]:
+        return await self.run(self.storage.add_image_to_instance, datainstance_id, image)
+
+    async def bulk_add_images(self, datainstance_id: str, image_urls: List[str]) -> List[Dict[str, Any]]:
+        return await self.run(self.storage.bulk_add_images, datainstance_id, image_urls)
+
+    # Search --------------------------------------------------------------
+
+    async def search_pet_content(
+        self,
+        pet_id: str,
+        search_query: str,
+        limit: int = 20,
+        after: Optional[Dict[str, RankKeyset]] = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        return await self.run(self.storage.search_pet_content, pet_id, search_query, limit=limit, after=after)
+
+    async def search_user_content(
+        self,
+        wallet_address: str,
+        search_query: str,
+        limit: int = 20,
+        after: Optional[Dict[str, RankKeyset]] = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        return await self.run(self.storage.search_user_content, wallet_address, search_query, limit=limit, after=after)
+
+    async def semantic_search_knowledge(
+        self,
+        query: str,
+        limit: int = 20,
+        similarity_threshold: float = 0.7,
+        nprobe: Optional[int] = None,
+        filters: Optional[KnowledgeFilter] = None
+    ) -> List[Dict[str, Any]]:
+        # Filtered searches go through match_filtered_knowledge rather than the reader
+        if self._use_reader(filters) and (nprobe is None or self.storage.embedding_snapshot is None):
+            return await self._match_knowledge(query, limit, similarity_threshold)
+        return await self.run(
+            self.storage.semantic_search_knowledge, query,
+            limit=limit, similarity_threshold=similarity_threshold, nprobe=nprobe, filters=filters
+        )
+
+    async def semantic_search_pet_knowledge(
+        self,
+        pet_id: str,
+        query: str,
+        limit: int = 20,
+        similarity_threshold: float = 0.7,
+        filters: Optional[KnowledgeFilter] = None
+    ) -> List[Dict[str, Any]]:
+        if self._use_reader(filters):
+            return await self._match_knowledge(query, limit, similarity_threshold, pet_id=pet_id)
+        return await self.run(
+            self.storage.semantic_search_pet_knowledge, pet_id, query,
+            limit=limit, similarity_threshold=similarity_threshold, filters=filters
+        )
+
+    async def semantic_search_user_knowledge(
+        self,
+        wallet_address: str,
+        query: str,
+        limit: int = 20,
+        similarity_threshold: float = 0.7,
+        filters: Optional[KnowledgeFilter] = None
+    ) -> List[Dict[str, Any]]:
+        if self._use_reader(filters):
+            return await self._match_knowledge(query, limit, similarity_threshold, wallet_address=wallet_address)
+        return await self.run(
+            self.storage.semantic_search_user_knowledge, wallet_address, query,
+            limit=limit, similarity_threshold=similarity_threshold, filters=filters
+        )
+
+    async def hybrid_search_pet_knowledge(
+        self,
+        pet_id: str,
+        query: str,
+        limit: int = 20,
+        similarity_threshold: float = 0.5,
+        lexical_weight: float = 1.0,
+        semantic_weight: float = 1.0
+    ) -> List[Dict[str, Any]]:
+        return await self._hybrid_search(
+            self.run(self.storage.full_text_search_pet_knowledge, pet_id, query, self._hybrid_candidates(limit)),
+            self.semantic_search_pet_knowledge(pet_id, query, self._hybrid_candidates(limit), similarity_threshold),
+            limit, lexical_weight, semantic_weight
+        )
+
+    async def hybrid_search_user_knowledge(
+        self,
+        wallet_address: str,
+        query: str,
+        limit: int = 20,
+        similarity_threshold: float = 0.5,
+        lexical_weight: float = 1.0,
+        semantic_weight: float = 1.0
+    ) -> List[Dict[str, Any]]:
+        return await self._hybrid_search(
+            self.run(self.storage.full_text_search_user_knowledge, wallet_address, query, self._hybrid_candidates(limit)),
+            self.semantic_search_user_knowledge(wallet_address, query, self._hybrid_candidates(limit), similarity_threshold),
+            limit, lexical_weight, semantic_weight
+        )
+
+    def _hybrid_candidates(self, limit: int) -> int:
+        return max(limit, settings.hybrid_search_candidates)
+
+    async def _hybrid_search(
+        self,
+        lexical: Awaitable[List[Dict[str, Any]]],
+        semantic: Awaitable[List[Dict[str, Any]]],
+        limit: int,
+        lexical_weight: float,
+        semantic_weight: float
+    ) -> List[Dict[str, Any]]:
+        """
+        Run full-text and vector retrieval concurrently and fuse them with RRF.
+        
+        If one retriever fails the other's ranking is still returned; the error
+        is only raised when both fail.
+        """
+        lexical_hits, semantic_hits = await asyncio.gather(lexical, semantic, return_exceptions=True)
+        
+        rankings = {}
+        for source, hits in (("lexical", lexical_hits), ("semantic", semantic_hits)):
+            if isinstance(hits, Exception):
+                print(f"Error in {source} retrieval for hybrid search: {str(hits)}")
+                continue
+            rankings[source] = hits
+        
+        if not rankings:
+            raise lexical_hits
+        
+        return reciprocal_rank_fusion(
+            rankings,
+            limit=limit,
+            k=settings.hybrid_rrf_k,
+            weights={"lexical": lexical_weight, "semantic": semantic_weight}
+        )
+
+    def _use_reader(self, filters: Optional[KnowledgeFilter]) -> bool:
+        return self.reader is not None and (filters is None or filters.is_empty())
+
+    async def _match_knowledge(
+        self,
+        query: str,
+        limit: int,
+        similarity_threshold: float,
+        **scope: Any
+    ) -> List[Dict[str, Any]]:
+        """Embed the query (cached) and rank knowledge in Postgres over asyncpg."""
+        query_embedding = await self.run(self.storage.embed_query, query)
+        if not query_embedding:
+            return []
+        if self.storage.chunks_enabled:
+            try:
+                return await self.reader.match_knowledge(
+                    query_embedding, limit, similarity_threshold, chunks=True, **scope
+                )
+            except asyncpg.UndefinedTableError as e:
+                print(f"Error searching knowledge chunks, falling back to whole documents: {str(e)}")
+        return await self.reader.match_knowledge(query_embedding, limit, similarity_threshold, **scope)
+
+    def get_embedding_cache_stats(self) -> Dict[str, Any]:
+        return self.storage.get_embedding_cache_stats()
+    
+    def get_vector_shard_stats(self) -> Dict[str, Any]:
+        return self.storage.get_vector_shard_stats()
+    
+    def get_embedding_snapshot_stats(self) -> Dict[str, Any]:
+        return self.storage.get_embedding_snapshot_stats()
@@ -0,0 +1,100 @@
+from typing import List, Dict, Any
+import re
+
+# Same rough estimate as Supabase._embedding_batches: ~4 characters per token
+CHARS_PER_TOKEN = 4
+
+_WORD = re.compile(r"\S+")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def chunk_text(text: str, max_tokens: int = 400, overlap_tokens: int = 50) -> List[Dict[str, Any]]:
+    """
+    Split *text* into overlapping passages of at most ~*max_tokens* tokens.
+
+    Chunks end on word boundaries and, where one falls inside the window, on a
+    paragraph or sentence break. Each chunk starts ~*overlap_tokens* before the
+    previous one ended, so a passage cut at a boundary is still whole in one of
+    them. Returns dicts with ``chunk_index``, ``content``, ``char_start``,
+    ``char_end`` and ``token_count``.
+    """
+    max_chars = max(1, max_tokens) * CHARS_PER_TOKEN
+    overlap_chars = max(0, min(overlap_tokens, max_tokens // 2)) * CHARS_PER_TOKEN
+
+    # Word spans, with any run longer than a whole chunk (e.g. minified data) cut to size
+    words = [
+        (offset, min(offset + max_chars, m.end()))
+        for m in _WORD.finditer(text)
+        for offset in range(m.start(), m.end(), max_chars)
+    ]
+    if not words:
+        return []
+
+    chunks = []
+    first = 0
+    while first < len(words):
+        start = words[first][0]
+
+        # Take words until the window is full (always at least one word)
+        last = first
+        while last + 1 < len(words) and words[last + 1][1] - start <= max_chars:
+            last += 1
+
+        # Prefer to end on a paragraph or sentence break in the second half of the window
+        if last + 1 < len(words):
+            last = _last_break(text, words, first, last)
+
+        end = words[last][1]
+        content = text[start:end]
+        chunks.append({
+            "chunk_index": len(chunks),
+            "content": content,
+            "char_start": start,
+            "char_end": end,
+            "token_count": estimate_tokens(content),
+        })
+
+        if last + 1 >= len(words):
+            break
+
+        # Step back over the overlap, but always move forward
+        next_first = last + 1
+        while next_first - 1 > first and end - words[next_first - 1][0] <= overlap_chars:
+            next_first -= 1
+        first = next_first
+
+    return chunks
+
+
+def _last_break(text: str, words: List[tuple], first: int, last: int) -> int:
+    """Index of the last word in words[first..last] that ends a paragraph or sentence."""
+    midpoint = words[first][0] + (words[last][1] - words[first][0]) // 2
+    for index in range(last, first, -1):
+        word_end = words[index][1]
+        if word_end < midpoint:
+            break
+        following = text[word_end:words[index + 1][0]]
+        if "\n\n" in following or text[word_end - 1] in ".!?":
+            return index
+    return last
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    from src.services.storage.supabase import Supabase
+
+    parser = argparse.ArgumentParser(description="Chunk and embed knowledge rows that have no passages yet.")
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    storage = Supabase(
+        url=os.environ["SUPABASE_URL"],
+        key=os.environ["SUPABASE_KEY"],
+        openai_api_key=os.environ.get("OPENAI_API_KEY")
+    )
+    print(f"Chunked {storage.backfill_knowledge_chunks(batch_size=args.batch_size)} knowledge items")
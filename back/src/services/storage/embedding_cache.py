@@ -0,0 +1,136 @@
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+import hashlib
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of embedding vectors keyed by (model, normalized text hash).
+
+    The first tier is an in-memory LRU holding float32 vectors. The optional
+    second tier is a SQLite file that survives restarts and is trimmed to
+    ``max_disk_entries`` by least-recent use.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        path: Optional[str] = None,
+        max_disk_entries: int = 100_000
+    ):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._disk_entries = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if path:
+            Path(path).expanduser().parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(Path(path).expanduser()), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+            self._db.commit()
+            # Counted once here and tracked on insert/trim, so writes never scan the table
+            self._disk_entries = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """Hash of the model name and whitespace-normalized text."""
+        normalized = " ".join(text.split())
+        return hashlib.sha256(f"{model}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """Return the cached embedding for *text*, or None on a miss."""
+        key = self.make_key(model, text)
+
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return vector.tolist()
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT vector FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    vector = np.frombuffer(row[0], dtype=np.float32)
+                    self._db.execute(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?", (time.time(), key)
+                    )
+                    self._db.commit()
+                    self._remember(key, vector)
+                    self.disk_hits += 1
+                    return vector.tolist()
+
+            self.misses += 1
+            return None
+
+    def set(self, model: str, text: str, embedding: List[float]) -> None:
+        """Store *embedding* in both tiers."""
+        key = self.make_key(model, text)
+        vector = np.asarray(embedding, dtype=np.float32)
+
+        with self._lock:
+            self._remember(key, vector)
+
+            if self._db is not None:
+                exists = self._db.execute(
+                    "SELECT 1 FROM embeddings WHERE key = ?", (key,)
+                ).fetchone() is not None
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, model, vector, last_used) VALUES (?, ?, ?, ?)",
+                    (key, model, vector.tobytes(), time.time())
+                )
+                if not exists:
+                    self._disk_entries += 1
+                    self._trim_disk()
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current tier sizes."""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_capacity": self.max_entries,
+                "disk_entries": self._disk_entries if self._db is not None else None,
+                "disk_capacity": self.max_disk_entries if self._db is not None else None,
+            }
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _trim_disk(self) -> None:
+        overflow = self._disk_entries - self.max_disk_entries
+        if overflow > 0:
+            deleted = self._db.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            ).rowcount
+            self._disk_entries -= deleted
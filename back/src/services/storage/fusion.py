@@ -0,0 +1,36 @@
+from typing import List, Dict, Any, Optional
+
+
+def reciprocal_rank_fusion(
+    rankings: Dict[str, List[Dict[str, Any]]],
+    limit: int = 20,
+    k: int = 60,
+    weights: Optional[Dict[str, float]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Merge several best-first result lists into one deduplicated ranking.
+
+    Each row scores ``sum(weight / (k + position))`` over the lists it appears
+    in (positions are 1-based), so rows found by several retrievers rise to the
+    top without having to calibrate their raw scores against each other.
+    Returned rows merge the fields from every list they came from and carry
+    ``rrf_score`` plus ``ranks``, the row's position in each source list.
+    """
+    weights = weights or {}
+    fused: Dict[str, Dict[str, Any]] = {}
+
+    for source, rows in rankings.items():
+        weight = weights.get(source, 1.0)
+        for position, row in enumerate(rows, start=1):
+            row_id = str(row["id"])
+            entry = fused.get(row_id)
+            if entry is None:
+                entry = fused[row_id] = {**row, "rrf_score": 0.0, "ranks": {}}
+            else:
+                for key, value in row.items():
+                    entry.setdefault(key, value)
+            entry["rrf_score"] += weight / (k + position)
+            entry["ranks"][source] = position
+
+    ranked = sorted(fused.values(), key=lambda entry: entry["rrf_score"], reverse=True)
+    return ranked[:limit]
@@ -0,0 +1,279 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional
+import random
+import threading
+import time
+import uuid
+
+from .schemas import Knowledge
+from .supabase import KNOWLEDGE_STORED, Supabase
+
+JOBS_TABLE = "ingestion_jobs"
+
+# Job states
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_PARTIAL = "partial"
+JOB_FAILED = "failed"
+
+# Item states ("stored" once attached)
+ITEM_PENDING = "pending"
+ITEM_RETRYING = "retrying"
+ITEM_FAILED = "failed"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class IngestionQueue:
+    """
+    Durable queue of knowledge ingestion jobs, worked by an in-process thread pool.
+
+    Jobs live in the ``ingestion_jobs`` table (migrations/ingestion_jobs.sql),
+    so any process can pick them up and they survive restarts. A poller thread
+    claims due jobs with a conditional update, up to the number of idle
+    workers; :meth:`enqueue` wakes it so new jobs start immediately.
+
+    A claim takes a lease (``lease_id``, ``locked_at``) that the poller renews
+    while the job runs; a job whose lease expired (its process died) is
+    reclaimed by another worker. Results are only recorded while the lease is
+    still held, so a worker that lost its job cannot overwrite the new run.
+
+    Each run attaches the job's outstanding items through the storage
+    pipeline. Items whose scrape failed or whose embedding is missing are
+    retried with exponential backoff (with jitter) until ``max_attempts``;
+    the job then ends ``succeeded``, ``partial`` or ``failed``.
+    """
+
+    def __init__(
+        self,
+        storage: Supabase,
+        workers: int = 4,
+        max_attempts: int = 4,
+        retry_base_seconds: float = 5.0,
+        retry_max_seconds: float = 300.0,
+        poll_seconds: float = 5.0,
+        lease_seconds: float = 600.0
+    ):
+        self.storage = storage
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self._active = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._poller: Optional[threading.Thread] = None
+        # job id -> lease id of the jobs running here, renewed every third of the lease
+        self._leases: Dict[str, str] = {}
+        self._renewed_at = time.monotonic()
+
+    @property
+    def client(self) -> Any:
+        return self.storage.client
+
+    def start(self) -> None:
+        """Start polling for due jobs, including ones left over from a previous run."""
+        if self._poller is not None:
+            return
+        self._poller = threading.Thread(target=self._poll_loop, name="ingest-poller", daemon=True)
+        self._poller.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def enqueue(self, datainstance_id: str, pet_id: str, knowledge_list: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Record a job attaching *knowledge_list* to a DataInstance and wake the workers."""
+        # Entries with neither URL nor content are skipped, as in bulk_add_knowledge
+        items = [
+            {"input": k, "status": ITEM_PENDING, "error": None, "knowledge_id": None}
+            for k in knowledge_list
+            if k.get("url") or (k.get("content") or "").strip()
+        ]
+        job = self.client.table(JOBS_TABLE).insert({
+            "datainstance_id": datainstance_id,
+            "pet_id": pet_id,
+            "status": JOB_QUEUED,
+            "items": items,
+            "total": len(items),
+            "max_attempts": self.max_attempts,
+            "run_after": _now().isoformat()
+        }).execute().data[0]
+
+        self._wake.set()
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        result = self.client.table(JOBS_TABLE).select("*").eq("id", job_id).execute()
+        return result.data[0] if result.data else None
+
+    def _poll_loop(self) -> None:
+        renew_seconds = self.lease_seconds / 3
+        while not self._stop.is_set():
+            self._wake.clear()
+            if time.monotonic() - self._renewed_at >= renew_seconds:
+                self._renew_leases()
+            try:
+                for job in self._claim_due_jobs():
+                    self._executor.submit(self._run, job)
+            except Exception as e:
+                print(f"Error claiming ingestion jobs: {str(e)}")
+            self._wake.wait(min(self.poll_seconds, renew_seconds))
+
+    def _renew_leases(self) -> None:
+        """Push back ``locked_at`` of the jobs running here so they aren't reclaimed."""
+        self._renewed_at = time.monotonic()
+        with self._lock:
+            leases = list(self._leases.items())
+        for job_id, lease_id in leases:
+            try:
+                rows = self.client.table(JOBS_TABLE).update({
+                    "locked_at": _now().isoformat()
+                }).eq("id", job_id).eq("lease_id", lease_id).execute().data
+                if not rows:
+                    print(f"Ingestion job {job_id} lost its lease; its results will be discarded")
+            except Exception as e:
+                print(f"Error renewing lease of ingestion job {job_id}: {str(e)}")
+
+    def _claim_due_jobs(self) -> List[Dict[str, Any]]:
+        """Claim up to one job per idle worker: due queued jobs first, then expired leases."""
+        with self._lock:
+            idle = self.workers - self._active
+        if idle <= 0:
+            return []
+
+        now = _now()
+        stale = (now - timedelta(seconds=self.lease_seconds)).isoformat()
+        candidates = self.client.table(JOBS_TABLE).select("id, status, locked_at").eq(
+            "status", JOB_QUEUED
+        ).lte(
+            "run_after", now.isoformat()
+        ).order("run_after").limit(idle).execute().data
+        if len(candidates) < idle:
+            candidates += self.client.table(JOBS_TABLE).select("id, status, locked_at").eq(
+                "status", JOB_RUNNING
+            ).lt(
+                "locked_at", stale
+            ).order("locked_at").limit(idle - len(candidates)).execute().data
+
+        claimed = []
+        for candidate in candidates:
+            # Only one worker (in any process) wins the conditional update
+            query = self.client.table(JOBS_TABLE).update({
+                "status": JOB_RUNNING,
+                "lease_id": str(uuid.uuid4()),
+                "locked_at": now.isoformat(),
+                "updated_at": now.isoformat()
+            }).eq("id", candidate["id"]).eq("status", candidate["status"])
+            if candidate["status"] == JOB_RUNNING:
+                query = query.lt("locked_at", stale)
+            rows = query.execute().data
+            if rows:
+                claimed.append(rows[0])
+
+        with self._lock:
+            self._active += len(claimed)
+            self._leases.update((job["id"], job["lease_id"]) for job in claimed)
+        return claimed
+
+    def _run(self, job: Dict[str, Any]) -> None:
+        try:
+            self._process(job)
+        except Exception as e:
+            print(f"Error running ingestion job {job['id']}: {str(e)}")
+            try:
+                self._finish_attempt(job, job["items"], str(e))
+            except Exception as record_error:
+                print(f"Error recording ingestion job {job['id']}: {str(record_error)}")
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._leases.pop(job["id"], None)
+            self._wake.set()
+
+    def _process(self, job: Dict[str, Any]) -> None:
+        """Attach the job's outstanding items and record the outcome of each."""
+        items = job["items"]
+        outstanding = [i for i, item in enumerate(items) if item["status"] in (ITEM_PENDING, ITEM_RETRYING)]
+        knowledge_items = [
+            Knowledge(
+                url=items[i]["input"].get("url"),
+                content=items[i]["input"].get("content", ""),
+                title=items[i]["input"].get("title", ""),
+                metadata=dict(items[i]["input"].get("metadata") or {})
+            )
+            for i in outstanding
+        ]
+
+        error = None
+        try:
+            results = self.storage.add_knowledge_items(job["datainstance_id"], knowledge_items)
+        except Exception as e:
+            error = str(e)
+            results = [{"status": ITEM_RETRYING, "error": error}] * len(outstanding)
+
+        for i, result in zip(outstanding, results):
+            item = items[i]
+            if result["status"] == KNOWLEDGE_STORED:
+                item["knowledge_id"] = result["id"]
+                # Stored without a vector: the embeddings call failed, so embed it again next attempt
+                if self.storage.openai_enabled and not result.get("embeddings"):
+                    item["status"], item["error"] = ITEM_RETRYING, "Embedding failed"
+                else:
+                    item["status"], item["error"] = KNOWLEDGE_STORED, None
+            else:
+                item["status"], item["error"] = ITEM_RETRYING, result.get("error")
+
+        self._finish_attempt(job, items, error)
+
+    def _finish_attempt(self, job: Dict[str, Any], items: List[Dict[str, Any]], error: Optional[str]) -> None:
+        """Requeue the job with backoff while items can be retried, otherwise record its final state."""
+        attempts = job["attempts"] + 1
+        retrying = [item for item in items if item["status"] in (ITEM_PENDING, ITEM_RETRYING)]
+        now = _now()
+        item_error = next((item["error"] for item in retrying if item["error"]), None)
+        update: Dict[str, Any] = {
+            "lease_id": None,
+            "attempts": attempts,
+            "last_error": error or item_error,
+            "updated_at": now.isoformat()
+        }
+
+        if retrying and attempts < job["max_attempts"]:
+            delay = min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (attempts - 1))
+            update.update(
+                status=JOB_QUEUED,
+                run_after=(now + timedelta(seconds=delay * random.uniform(0.5, 1.0))).isoformat()
+            )
+        else:
+            for item in retrying:
+                # An item stored without its vector is kept; it just won't be found by semantic search
+                item["status"] = KNOWLEDGE_STORED if item["knowledge_id"] else ITEM_FAILED
+            stored = sum(1 for item in items if item["status"] == KNOWLEDGE_STORED)
+            if stored == len(items):
+                status = JOB_SUCCEEDED
+            else:
+                status = JOB_PARTIAL if stored else JOB_FAILED
+            update.update(status=status, finished_at=now.isoformat())
+
+        update.update(
+            items=items,
+            completed=sum(1 for item in items if item["status"] == KNOWLEDGE_STORED),
+            failed=sum(1 for item in items if item["status"] == ITEM_FAILED)
+        )
+        # Only while this claim still holds the lease: if it expired, another worker owns the job now
+        rows = self.client.table(JOBS_TABLE).update(update).eq(
+            "id", job["id"]
+        ).eq("lease_id", job["lease_id"]).execute().data
+        if not rows:
+            print(f"Ingestion job {job['id']} lost its lease; discarding this attempt's results")
@@ -0,0 +1,89 @@
+from typing import Optional, Sequence
+
+import numpy as np
+
+from .similarity import normalize_rows, normalize_vector
+
+_ASSIGN_BLOCK_ROWS = 65_536
+
+
+def train_centroids(
+    vectors: np.ndarray,
+    n_lists: int,
+    iterations: int = 20,
+    sample_size: Optional[int] = None,
+    seed: int = 0
+) -> np.ndarray:
+    """
+    Spherical k-means on (a sample of) normalized *vectors*.
+
+    Returns ``(n_lists, dim)`` unit-length centroids. The sample defaults to
+    256 vectors per list, which is plenty to place the coarse quantizer.
+    """
+    count = vectors.shape[0]
+    n_lists = max(1, min(n_lists, count))
+    sample_size = sample_size or n_lists * 256
+
+    rng = np.random.default_rng(seed)
+    if count > sample_size:
+        rows = np.sort(rng.choice(count, sample_size, replace=False))
+        sample = np.asarray(vectors[rows], dtype=np.float32)
+    else:
+        sample = np.asarray(vectors, dtype=np.float32)
+
+    centroids = sample[rng.choice(sample.shape[0], n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=n_lists)
+
+        # Re-seed empty lists with random sample points so every list stays in use
+        empty = np.flatnonzero(counts == 0)
+        if empty.size:
+            sums[empty] = sample[rng.choice(sample.shape[0], empty.size, replace=False)]
+        centroids = normalize_rows(sums)
+    return np.ascontiguousarray(centroids, dtype=np.float32)
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid (by dot product) of every row, computed in blocks."""
+    assignments = np.empty(vectors.shape[0], dtype=np.int32)
+    for start in range(0, vectors.shape[0], _ASSIGN_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + _ASSIGN_BLOCK_ROWS], dtype=np.float32)
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+class IVFIndex:
+    """
+    Inverted-file index: a k-means coarse quantizer plus, for each centroid,
+    the rows assigned to it.
+
+    A search scores the query against the centroids and only visits the rows
+    of the ``nprobe`` closest lists, so its cost scales with
+    ``nprobe / n_lists`` of the corpus instead of all of it.
+    """
+
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray):
+        self.centroids = centroids
+        self.assignments = assignments
+        # Rows grouped by list, each group in row order
+        self.order = np.argsort(assignments, kind="stable").astype(np.int64)
+        self.offsets = np.searchsorted(assignments[self.order], np.arange(len(centroids) + 1))
+
+    @property
+    def n_lists(self) -> int:
+        return self.centroids.shape[0]
+
+    def probe(self, query_embedding: Sequence[float], nprobe: int) -> np.ndarray:
+        """Sorted row numbers in the *nprobe* lists closest to the query."""
+        query = normalize_vector(query_embedding)
+        nprobe = max(1, min(nprobe, self.n_lists))
+        closest = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        rows = np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in closest])
+        rows.sort()
+        return rows
+
+    def list_sizes(self) -> np.ndarray:
+        return np.diff(self.offsets)
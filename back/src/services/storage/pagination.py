@@ -0,0 +1,96 @@
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+import base64
+import json
+import math
+import uuid
+
+Keyset = Tuple[str, str]
+RankKeyset = Tuple[float, str]
+
+
+def _encode(payload: Any) -> str:
+    data = json.dumps(payload, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode(cursor: str) -> Any:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _parse_id(value: Any) -> str:
+    try:
+        return str(uuid.UUID(value))
+    except (TypeError, ValueError, AttributeError):
+        raise ValueError("Invalid cursor")
+
+
+def _parse_timestamp(value: Any) -> str:
+    try:
+        return datetime.fromisoformat(value).isoformat()
+    except (TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """Opaque cursor pointing just past *row* in (created_at, id) order."""
+    return _encode([row["created_at"], str(row["id"])])
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Keyset]:
+    """
+    Decode a cursor produced by :func:`encode_cursor`; raises ValueError if
+    malformed. The values are re-serialized from a parsed timestamp and UUID,
+    since they end up inside PostgREST filter strings.
+    """
+    if not cursor:
+        return None
+    payload = _decode(cursor)
+    if not isinstance(payload, list) or len(payload) != 2:
+        raise ValueError("Invalid cursor")
+    return _parse_timestamp(payload[0]), _parse_id(payload[1])
+
+
+def next_cursor(rows: List[Dict[str, Any]], limit: int) -> Optional[str]:
+    """Cursor for the page after *rows*, or None when this was the last page."""
+    if len(rows) < limit or not rows:
+        return None
+    return encode_cursor(rows[-1])
+
+
+def next_search_cursor(results: Dict[str, List[Dict[str, Any]]], limit: int) -> Optional[str]:
+    """
+    Cursor for the next page of a grouped, ranked search result.
+
+    Each result group pages independently on (rank, id); groups that returned
+    a short page are finished and left out of the cursor.
+    """
+    positions = {
+        group: [rows[-1]["rank"], str(rows[-1]["id"])]
+        for group, rows in results.items()
+        if rows and len(rows) >= limit
+    }
+    return _encode(positions) if positions else None
+
+
+def decode_search_cursor(cursor: Optional[str]) -> Optional[Dict[str, RankKeyset]]:
+    """Decode a cursor produced by :func:`next_search_cursor`; raises ValueError if malformed."""
+    if not cursor:
+        return None
+    payload = _decode(cursor)
+    if not isinstance(payload, dict):
+        raise ValueError("Invalid cursor")
+    positions = {}
+    for group, position in payload.items():
+        if (
+            not isinstance(position, list) or len(position) != 2
+            or not isinstance(position[0], (int, float)) or isinstance(position[0], bool)
+            or not math.isfinite(position[0])
+        ):
+            raise ValueError("Invalid cursor")
+        positions[group] = (float(position[0]), _parse_id(position[1]))
+    return positions
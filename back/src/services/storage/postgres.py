@@ -0,0 +1,295 @@
+from datetime import date, datetime
+from decimal import Decimal
+from typing import List, Dict, Any, Optional, Tuple
+from uuid import UUID
+import json
+
+import asyncpg
+
+
+PET_SQL = "SELECT * FROM pets WHERE id = $1"
+
+USER_PETS_SQL = "SELECT * FROM pets WHERE owner_wallet = $1 ORDER BY created_at DESC"
+
+PET_INSTANCES_SQL = """
+SELECT * FROM datainstances
+WHERE pet_id = $1
+ORDER BY created_at DESC, id DESC
+LIMIT $2 OFFSET $3
+"""
+
+PET_INSTANCES_AFTER_SQL = """
+SELECT * FROM datainstances
+WHERE pet_id = $1
+AND (created_at, id) < ($3::text::timestamptz, $4::text::uuid)
+ORDER BY created_at DESC, id DESC
+LIMIT $2
+"""
+
+DATAINSTANCE_WITH_CONTENT_SQL = """
+SELECT
+  d.*,
+  COALESCE((
+    SELECT json_agg(json_build_object(
+      'id', k.id, 'url', k.url, 'title', k.title, 'content', k.content,
+      'metadata', k.metadata, 'created_at', k.created_at
+    ))
+    FROM datainstance_knowledge dk
+    JOIN knowledge k ON k.id = dk.knowledge_id
+    WHERE dk.datainstance_id = d.id
+  ), '[]'::json) AS knowledge,
+  COALESCE((
+    SELECT json_agg(json_build_object(
+      'id', i.id, 'image_url', i.image_url, 'alt_text', i.alt_text,
+      'metadata', i.metadata, 'created_at', i.created_at
+    ))
+    FROM datainstance_images di
+    JOIN images i ON i.id = di.image_id
+    WHERE di.datainstance_id = d.id
+  ), '[]'::json) AS images
+FROM datainstances d
+WHERE d.id = $1
+"""
+
+# Same ranking as the match_*_knowledge RPCs in migrations/scoped_match_knowledge.sql
+MATCH_KNOWLEDGE_SQL = """
+SELECT
+  k.id, k.url, k.content, k.title, k.content_hash, k.metadata, k.created_at,
+  1 - (k.embeddings <=> $1::text::vector) AS similarity
+FROM knowledge k
+WHERE k.embeddings IS NOT NULL
+AND 1 - (k.embeddings <=> $1::text::vector) >= $2
+ORDER BY k.embeddings <=> $1::text::vector
+LIMIT $3
+"""
+
+# Scoped searches score the scope's knowledge exactly ("+ 0" keeps the planner off the
+# ivfflat index, which would be filtered after probing and under-return)
+SCOPED_MATCH_KNOWLEDGE_SQL = """
+WITH candidates AS MATERIALIZED ({scope})
+SELECT
+  k.id, k.url, k.content, k.title, k.content_hash, k.metadata, k.created_at,
+  1 - (k.embeddings <=> $1::text::vector) AS similarity
+FROM candidates
+JOIN knowledge k ON k.id = candidates.knowledge_id
+WHERE k.embeddings IS NOT NULL
+AND 1 - (k.embeddings <=> $1::text::vector) >= $2
+ORDER BY (k.embeddings <=> $1::text::vector) + 0
+LIMIT $3
+"""
+
+# Same ranking as the match_*_knowledge_chunks RPCs in migrations/knowledge_chunks.sql:
+# knowledge without passages is ranked by its document embedding
+MATCH_KNOWLEDGE_CHUNKS_SQL = """
+WITH candidates AS (
+  SELECT
+    c.id, c.knowledge_id, c.chunk_index, c.content,
+    1 - (c.embeddings <=> $1::text::vector) AS similarity
+  FROM knowledge_chunks c
+  WHERE c.embeddings IS NOT NULL
+  ORDER BY c.embeddings <=> $1::text::vector
+  LIMIT $3 * 5
+),
+best AS (
+  SELECT DISTINCT ON (knowledge_id) *
+  FROM candidates
+  WHERE similarity >= $2
+  ORDER BY knowledge_id, similarity DESC
+),
+documents AS (
+  SELECT k.id, 1 - (k.embeddings <=> $1::text::vector) AS similarity
+  FROM knowledge k
+  WHERE k.embeddings IS NOT NULL
+  ORDER BY k.embeddings <=> $1::text::vector
+  LIMIT $3 * 5
+)
+SELECT
+  k.id, k.url, k.title, best.content, k.content_hash, k.metadata, k.created_at,
+  best.id AS chunk_id, best.chunk_index, best.similarity
+FROM best
+JOIN knowledge k ON k.id = best.knowledge_id
+UNION ALL
+SELECT
+  k.id, k.url, k.title, k.content, k.content_hash, k.metadata, k.created_at,
+  NULL::uuid AS chunk_id, NULL::int AS chunk_index, documents.similarity
+FROM documents
+JOIN knowledge k ON k.id = documents.id
+WHERE documents.similarity >= $2
+AND NOT EXISTS (
+  SELECT 1 FROM knowledge_chunks c WHERE c.knowledge_id = documents.id AND c.embeddings IS NOT NULL
+)
+ORDER BY similarity DESC
+LIMIT $3
+"""
+
+# Scoped: every passage of the scope's knowledge is scored exactly
+SCOPED_MATCH_KNOWLEDGE_CHUNKS_SQL = """
+WITH candidates AS MATERIALIZED ({scope}),
+best AS (
+  SELECT DISTINCT ON (c.knowledge_id)
+    c.id, c.knowledge_id, c.chunk_index, c.content,
+    1 - (c.embeddings <=> $1::text::vector) AS similarity
+  FROM candidates
+  JOIN knowledge_chunks c ON c.knowledge_id = candidates.knowledge_id
+  WHERE c.embeddings IS NOT NULL
+  ORDER BY c.knowledge_id, c.embeddings <=> $1::text::vector
+),
+ranked AS (
+  SELECT
+    k.id, k.url, k.title, best.content, k.content_hash, k.metadata, k.created_at,
+    best.id AS chunk_id, best.chunk_index, best.similarity
+  FROM best
+  JOIN knowledge k ON k.id = best.knowledge_id
+  UNION ALL
+  SELECT
+    k.id, k.url, k.title, k.content, k.content_hash, k.metadata, k.created_at,
+    NULL::uuid AS chunk_id, NULL::int AS chunk_index,
+    1 - (k.embeddings <=> $1::text::vector) AS similarity
+  FROM candidates
+  JOIN knowledge k ON k.id = candidates.knowledge_id
+  WHERE k.embeddings IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM best WHERE best.knowledge_id = k.id)
+)
+SELECT * FROM ranked
+WHERE similarity >= $2
+ORDER BY similarity DESC
+LIMIT $3
+"""
+
+# Knowledge ids of a pet, or of every pet of a wallet
+PET_SCOPE = """
+SELECT DISTINCT dk.knowledge_id FROM datainstance_knowledge dk
+JOIN datainstances d ON d.id = dk.datainstance_id
+WHERE d.pet_id = $4
+"""
+
+USER_SCOPE = """
+SELECT DISTINCT dk.knowledge_id FROM datainstance_knowledge dk
+JOIN datainstances d ON d.id = dk.datainstance_id
+JOIN pets p ON p.id = d.pet_id
+WHERE p.owner_wallet = $4
+"""
+
+
+def _to_json_value(value: Any) -> Any:
+    """Convert asyncpg values to the JSON-friendly types PostgREST would return."""
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, list):
+        return [_to_json_value(v) for v in value]
+    return value
+
+
+def _record_to_dict(record: asyncpg.Record) -> Dict[str, Any]:
+    return {key: _to_json_value(value) for key, value in record.items()}
+
+
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    """Decode json/jsonb columns to Python objects, as PostgREST does."""
+    for type_name in ("json", "jsonb"):
+        await conn.set_type_codec(
+            type_name,
+            encoder=json.dumps,
+            decoder=json.loads,
+            schema="pg_catalog"
+        )
+
+
+class PostgresReader:
+    """
+    Direct asyncpg connection-pool implementation of the hot storage reads.
+
+    Each method returns the same shape as its :class:`Supabase` counterpart,
+    but skips the PostgREST HTTP/JSON hop and joins in SQL. Statements are
+    prepared and cached per connection by asyncpg, so the pool must point at a
+    session-mode connection (direct or session pooler) unless
+    ``statement_cache_size`` is 0.
+    """
+
+    def __init__(self, pool: asyncpg.Pool):
+        self.pool = pool
+
+    @classmethod
+    async def create(
+        cls,
+        dsn: str,
+        min_size: int = 1,
+        max_size: int = 10,
+        statement_cache_size: int = 100
+    ) -> "PostgresReader":
+        pool = await asyncpg.create_pool(
+            dsn,
+            min_size=min_size,
+            max_size=max_size,
+            statement_cache_size=statement_cache_size,
+            init=_init_connection
+        )
+        return cls(pool)
+
+    async def close(self) -> None:
+        await self.pool.close()
+
+    async def _fetch(self, sql: str, *args: Any) -> List[Dict[str, Any]]:
+        async with self.pool.acquire() as conn:
+            records = await conn.fetch(sql, *args)
+        return [_record_to_dict(record) for record in records]
+
+    async def get_pet(self, pet_id: str) -> Optional[Dict[str, Any]]:
+        rows = await self._fetch(PET_SQL, pet_id)
+        return rows[0] if rows else None
+
+    async def get_user_pets(self, wallet_address: str) -> List[Dict[str, Any]]:
+        return await self._fetch(USER_PETS_SQL, wallet_address)
+
+    async def get_pet_instances(
+        self,
+        pet_id: str,
+        limit: int = 100,
+        offset: int = 0,
+        after: Optional[Tuple[str, str]] = None
+    ) -> List[Dict[str, Any]]:
+        if after is not None:
+            created_at, instance_id = after
+            return await self._fetch(PET_INSTANCES_AFTER_SQL, pet_id, limit, created_at, instance_id)
+        return await self._fetch(PET_INSTANCES_SQL, pet_id, limit, offset)
+
+    async def get_datainstance_with_content(self, datainstance_id: str) -> Optional[Dict[str, Any]]:
+        rows = await self._fetch(DATAINSTANCE_WITH_CONTENT_SQL, datainstance_id)
+        return rows[0] if rows else None
+
+    async def match_knowledge(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        similarity_threshold: float,
+        pet_id: Optional[str] = None,
+        wallet_address: Optional[str] = None,
+        chunks: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Top-k knowledge by cosine similarity, optionally scoped to a pet or a wallet.
+
+        With *chunks*, passages are ranked instead and each item is returned
+        with its best passage as ``content`` (items without passages are
+        ranked by their document embedding).
+        """
+        args: List[Any] = [json.dumps(query_embedding), similarity_threshold, limit]
+        scope = ""
+        if pet_id is not None:
+            scope = PET_SCOPE
+            args.append(pet_id)
+        elif wallet_address is not None:
+            scope = USER_SCOPE
+            args.append(wallet_address)
+
+        if chunks:
+            sql = SCOPED_MATCH_KNOWLEDGE_CHUNKS_SQL.format(scope=scope) if scope else MATCH_KNOWLEDGE_CHUNKS_SQL
+        elif scope:
+            sql = SCOPED_MATCH_KNOWLEDGE_SQL.format(scope=scope)
+        else:
+            sql = MATCH_KNOWLEDGE_SQL
+        return await self._fetch(sql, *args)
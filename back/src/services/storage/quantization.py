@@ -0,0 +1,89 @@
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from .similarity import normalize_vector
+
+
+def fit_pca(vectors: np.ndarray, dim: int, sample_size: int = 20_000, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fit a PCA projection to *dim* components on a sample of *vectors*.
+
+    Returns ``(mean, components)`` with components shaped ``(dim, original_dim)``.
+    """
+    count = vectors.shape[0]
+    if count > sample_size:
+        rows = np.sort(np.random.default_rng(seed).choice(count, sample_size, replace=False))
+        sample = np.asarray(vectors[rows], dtype=np.float32)
+    else:
+        sample = np.asarray(vectors, dtype=np.float32)
+
+    mean = sample.mean(axis=0)
+    _, _, vt = np.linalg.svd(sample - mean, full_matrices=False)
+    return mean.astype(np.float32), np.ascontiguousarray(vt[:dim], dtype=np.float32)
+
+
+def quantize(
+    vectors: np.ndarray,
+    mean: Optional[np.ndarray] = None,
+    components: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Int8 scalar quantization with one float32 scale per vector.
+
+    With a PCA projection the centered, projected vector is quantized instead,
+    so the codes are ``components.shape[0]`` wide. Returns ``(codes, scales)``.
+    """
+    values = np.asarray(vectors, dtype=np.float32)
+    if components is not None:
+        values = (values - mean) @ components.T
+
+    scales = np.abs(values).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(values / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class QuantizedVectors:
+    """
+    Int8 codes and per-vector scales used as a cheap first-pass scorer.
+
+    Scores approximate the dot product with the original (normalized) vectors:
+    ``mean . q + scale * (codes . (components q))`` with PCA, or
+    ``scale * (codes . q)`` without. Callers re-rank the best candidates with
+    the full-precision vectors.
+    """
+
+    def __init__(
+        self,
+        codes: np.ndarray,
+        scales: np.ndarray,
+        mean: Optional[np.ndarray] = None,
+        components: Optional[np.ndarray] = None
+    ):
+        self.codes = codes
+        self.scales = scales
+        self.mean = mean
+        self.components = components
+
+    def __len__(self) -> int:
+        return self.codes.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes
+
+    def scores(self, query_embedding: Sequence[float], rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Approximate similarity of every row, or only of *rows*, to the query."""
+        codes, scales = self.codes, self.scales
+        if rows is not None:
+            codes, scales = codes[rows], scales[rows]
+
+        query = normalize_vector(query_embedding)
+        offset = 0.0
+        if self.components is not None:
+            offset = float(self.mean @ query)
+            query = self.components @ query
+        # einsum casts the int8 codes in small buffers instead of materializing a float copy
+        scores = np.einsum("ij,j->i", codes, query.astype(np.float32))
+        return offset + scales * scores
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 
 
@@ -52,3 +52,29 @@ class Image:
             self.created_at = datetime.now()
         if self.metadata is None:
             self.metadata = {}
+
+
+@dataclass
+class KnowledgeFilter:
+    """
+    Restricts semantic search to knowledge attached to matching data instances.
+    
+    ``category``, ``tags`` (all of them) and ``content_type`` match the
+    data instance; ``created_after`` matches the knowledge row itself.
+    """
+    category: Optional[str] = None
+    tags: Optional[List[str]] = None
+    content_type: Optional[str] = None
+    created_after: Optional[datetime] = None
+    
+    def is_empty(self) -> bool:
+        return not (self.category or self.tags or self.content_type or self.created_after)
+    
+    def rpc_params(self) -> Dict[str, Any]:
+        """Arguments of the match_filtered_knowledge RPCs."""
+        return {
+            "filter_category": self.category,
+            "filter_tags": self.tags or None,
+            "filter_content_type": self.content_type,
+            "filter_created_after": self.created_after.isoformat() if self.created_after else None,
+        }
@@ -0,0 +1,131 @@
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+import json
+
+import numpy as np
+
+
+def parse_embedding(value: Any) -> Optional[List[float]]:
+    """Return an embedding as a list of floats, handling the pgvector string form."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            return None
+    if not isinstance(value, (list, tuple)) or not value:
+        return None
+    return value
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row in place so cosine similarity becomes a dot product."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def normalize_vector(vector: Sequence[float]) -> np.ndarray:
+    """Return *vector* as a unit-length float32 array."""
+    vec = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    if norm == 0:
+        return vec
+    return vec / norm
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the *k* highest scores, best first, using a partial sort."""
+    if k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.size:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.size)
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class EmbeddingMatrix:
+    """Contiguous float32 matrix of pre-normalized embeddings plus the rows they belong to."""
+
+    def __init__(self, vectors: np.ndarray, items: List[Dict[str, Any]]):
+        self.vectors = vectors
+        self.items = items
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    @classmethod
+    def from_items(
+        cls,
+        items: List[Dict[str, Any]],
+        field: str = "embeddings"
+    ) -> "EmbeddingMatrix":
+        """Build a matrix from row dicts, skipping rows whose embedding is missing or malformed."""
+        kept: List[Dict[str, Any]] = []
+        vectors: List[List[float]] = []
+        dim: Optional[int] = None
+
+        for item in items:
+            embedding = parse_embedding(item.get(field))
+            if embedding is None:
+                continue
+            if dim is None:
+                dim = len(embedding)
+            elif len(embedding) != dim:
+                print(f"Skipping item {item.get('id')} with embedding dimension {len(embedding)} != {dim}")
+                continue
+            kept.append(item)
+            vectors.append(embedding)
+
+        if not vectors:
+            return cls(np.empty((0, 0), dtype=np.float32), [])
+
+        matrix = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32))
+        return cls(normalize_rows(matrix), kept)
+
+    def scores(self, query_embedding: Sequence[float]) -> np.ndarray:
+        """Cosine similarity of every row against the query in one matrix-vector product."""
+        if not len(self):
+            return np.empty(0, dtype=np.float32)
+        return self.vectors @ normalize_vector(query_embedding)
+
+    def search(
+        self,
+        query_embedding: Sequence[float],
+        limit: int = 20,
+        similarity_threshold: float = 0.0
+    ) -> List[Tuple[int, float]]:
+        """Return ``(row_index, similarity)`` pairs for the best *limit* rows above the threshold."""
+        scores = self.scores(query_embedding)
+        if scores.size == 0:
+            return []
+
+        above = np.flatnonzero(scores >= similarity_threshold)
+        if above.size == 0:
+            return []
+
+        order = top_k_indices(scores[above], limit)
+        return [(int(above[i]), float(scores[above[i]])) for i in order]
+
+
+def rank_by_similarity(
+    items: List[Dict[str, Any]],
+    query_embedding: Sequence[float],
+    limit: int = 20,
+    similarity_threshold: float = 0.0,
+    field: str = "embeddings"
+) -> List[Dict[str, Any]]:
+    """
+    Score knowledge rows against a query embedding and return the top matches.
+
+    Each returned row is the original dict with a ``similarity`` key added.
+    """
+    matrix = EmbeddingMatrix.from_items(items, field=field)
+    results = []
+    for index, similarity in matrix.search(query_embedding, limit, similarity_threshold):
+        item = matrix.items[index]
+        item["similarity"] = similarity
+        results.append(item)
+    return results
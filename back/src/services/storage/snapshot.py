@@ -0,0 +1,518 @@
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterable, Sequence, Set, Tuple
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from .ivf import IVFIndex, assign_lists, train_centroids
+from .pagination import Keyset
+from .quantization import QuantizedVectors, fit_pca, quantize
+from .similarity import EmbeddingMatrix, normalize_vector, top_k_indices
+
+VECTORS_FILE = "embeddings.f32"
+CODES_FILE = "codes.i8"
+SCALES_FILE = "scales.f32"
+PCA_FILE = "pca.npz"
+IVF_CENTROIDS_FILE = "ivf_centroids.npy"
+IVF_ASSIGNMENTS_FILE = "ivf_assignments.i32"
+INDEX_FILE = "index.json"
+SNAPSHOT_VERSION = 1
+
+
+def _read_index(directory: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(directory / INDEX_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_index(directory: Path, index: Dict[str, Any]) -> None:
+    """Replace the sidecar atomically so readers never see a half-written index."""
+    tmp = directory / f"{INDEX_FILE}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"))
+    os.replace(tmp, directory / INDEX_FILE)
+
+
+def _append_pages(
+    f,
+    index: Dict[str, Any],
+    pages: Iterable[List[Dict[str, Any]]]
+) -> int:
+    """Append normalized vectors of each page to *f*, recording ids and the watermark in *index*."""
+    written = 0
+    for page in pages:
+        if not page:
+            continue
+        matrix = EmbeddingMatrix.from_items(page)
+        if len(matrix):
+            if index["dim"] is None:
+                index["dim"] = int(matrix.vectors.shape[1])
+            if matrix.vectors.shape[1] == index["dim"]:
+                f.write(matrix.vectors.tobytes())
+                index["ids"].extend(str(item["id"]) for item in matrix.items)
+                written += len(matrix)
+            else:
+                print(f"Skipping {len(matrix)} snapshot rows with embedding dimension {matrix.vectors.shape[1]} != {index['dim']}")
+        last = page[-1]
+        index["watermark"] = [last["created_at"], str(last["id"])]
+    index["count"] = len(index["ids"])
+    return written
+
+
+def _quantize_rows(
+    directory: Path,
+    index: Dict[str, Any],
+    start: int,
+    mean: Optional[np.ndarray],
+    components: Optional[np.ndarray],
+    block_rows: int = 65_536
+) -> None:
+    """Append int8 codes and scales for vector rows ``start..count`` of the snapshot in *directory*."""
+    count, dim = index["count"], index["dim"]
+    if count <= start or not dim:
+        return
+    vectors = np.memmap(directory / VECTORS_FILE, dtype=np.float32, mode="r", shape=(count, dim))
+    with open(directory / CODES_FILE, "ab") as codes_f, open(directory / SCALES_FILE, "ab") as scales_f:
+        for offset in range(start, count, block_rows):
+            codes, scales = quantize(vectors[offset:offset + block_rows], mean, components)
+            codes_f.write(codes.tobytes())
+            scales_f.write(scales.tobytes())
+
+
+def _assign_rows(directory: Path, index: Dict[str, Any], start: int, centroids: np.ndarray) -> None:
+    """Append the IVF list of vector rows ``start..count`` of the snapshot in *directory*."""
+    count, dim = index["count"], index["dim"]
+    if count <= start or not dim:
+        return
+    vectors = np.memmap(directory / VECTORS_FILE, dtype=np.float32, mode="r", shape=(count, dim))
+    with open(directory / IVF_ASSIGNMENTS_FILE, "ab") as f:
+        f.write(assign_lists(vectors[start:], centroids).tobytes())
+
+
+def default_ivf_lists(count: int) -> int:
+    """About sqrt(count) lists, the usual starting point for IVF."""
+    return max(1, int(np.sqrt(count)))
+
+
+def write_snapshot(
+    directory: str,
+    pages: Iterable[List[Dict[str, Any]]],
+    model: str,
+    quantized: bool = True,
+    pca_dim: int = 0,
+    ivf_lists: Optional[int] = 0
+) -> Dict[str, Any]:
+    """
+    Write a full snapshot of knowledge embeddings to *directory*.
+
+    *pages* yields rows with ``id``, ``created_at`` and ``embeddings`` in
+    ascending (created_at, id) order. Vectors are L2-normalized and streamed to
+    a raw float32 file next to an ``index.json`` sidecar holding the id of each
+    row, the dimension and the (created_at, id) watermark of the last row read.
+    The snapshot is built in a temporary directory and swapped in, so open
+    memory maps of the previous one stay valid.
+
+    With *quantized*, int8 codes and per-vector scales are written too, after
+    an optional PCA projection to *pca_dim* components fitted on the vectors.
+    With *ivf_lists* (0 picks ~sqrt(count), None skips it) a k-means coarse
+    quantizer is trained and every row is assigned to an inverted list.
+    """
+    target = Path(directory).expanduser()
+    target.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=".snapshot-", dir=str(target)))
+
+    index = {"version": SNAPSHOT_VERSION, "model": model, "dim": None, "count": 0, "watermark": None, "ids": []}
+    try:
+        with open(staging / VECTORS_FILE, "wb") as f:
+            _append_pages(f, index, pages)
+
+        files = [VECTORS_FILE]
+        if quantized and index["count"]:
+            mean = components = None
+            if 0 < pca_dim < index["dim"]:
+                vectors = np.memmap(staging / VECTORS_FILE, dtype=np.float32, mode="r", shape=(index["count"], index["dim"]))
+                mean, components = fit_pca(vectors, pca_dim)
+                np.savez(staging / PCA_FILE, mean=mean, components=components)
+                files.append(PCA_FILE)
+            _quantize_rows(staging, index, 0, mean, components)
+            files += [CODES_FILE, SCALES_FILE]
+            index["quantization"] = {
+                "dim": int(components.shape[0]) if components is not None else index["dim"],
+                "pca": components is not None,
+                "count": index["count"],
+            }
+
+        if ivf_lists is not None and index["count"]:
+            vectors = np.memmap(staging / VECTORS_FILE, dtype=np.float32, mode="r", shape=(index["count"], index["dim"]))
+            centroids = train_centroids(vectors, ivf_lists or default_ivf_lists(index["count"]))
+            np.save(staging / IVF_CENTROIDS_FILE, centroids)
+            _assign_rows(staging, index, 0, centroids)
+            files += [IVF_CENTROIDS_FILE, IVF_ASSIGNMENTS_FILE]
+            index["ivf"] = {"lists": int(centroids.shape[0]), "count": index["count"]}
+
+        for name in (VECTORS_FILE, CODES_FILE, SCALES_FILE, PCA_FILE, IVF_CENTROIDS_FILE, IVF_ASSIGNMENTS_FILE):
+            if name in files:
+                os.replace(staging / name, target / name)
+            elif name != VECTORS_FILE and (target / name).exists():
+                (target / name).unlink()
+        _write_index(target, index)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return index
+
+
+def append_snapshot(
+    directory: str,
+    pages: Iterable[List[Dict[str, Any]]],
+    model: str
+) -> Optional[Dict[str, Any]]:
+    """
+    Append rows newer than the snapshot's watermark to an existing snapshot.
+
+    The vectors file is append-only and readers map only the ``count`` rows
+    named by the sidecar, so appending is safe while it is open. New rows are
+    quantized with the snapshot's existing PCA projection and assigned to the
+    existing IVF lists, if any; retrain with a full write when the corpus has
+    drifted. Returns None when there is no compatible snapshot to extend.
+    """
+    target = Path(directory).expanduser()
+    index = _read_index(target)
+    if not index or index.get("version") != SNAPSHOT_VERSION or index.get("model") != model:
+        return None
+
+    start = index["count"]
+    with open(target / VECTORS_FILE, "r+b") as f:
+        # Drop any bytes past the indexed rows left by an interrupted append
+        f.truncate(start * (index["dim"] or 0) * 4)
+        f.seek(0, os.SEEK_END)
+        _append_pages(f, index, pages)
+
+    quantization = index.get("quantization")
+    if quantization and quantization["count"] == start:
+        mean = components = None
+        if quantization["pca"]:
+            with np.load(target / PCA_FILE) as pca:
+                mean, components = pca["mean"], pca["components"]
+        for name, width in ((CODES_FILE, quantization["dim"]), (SCALES_FILE, 4)):
+            with open(target / name, "r+b") as f:
+                f.truncate(start * width)
+        _quantize_rows(target, index, start, mean, components)
+        quantization["count"] = index["count"]
+
+    ivf = index.get("ivf")
+    if ivf and ivf["count"] == start:
+        with open(target / IVF_ASSIGNMENTS_FILE, "r+b") as f:
+            f.truncate(start * 4)
+        _assign_rows(target, index, start, np.load(target / IVF_CENTROIDS_FILE))
+        ivf["count"] = index["count"]
+    _write_index(target, index)
+    return index
+
+
+def snapshot_watermark(directory: str) -> Optional[Keyset]:
+    index = _read_index(Path(directory).expanduser())
+    if not index or not index.get("watermark"):
+        return None
+    return index["watermark"][0], index["watermark"][1]
+
+
+class EmbeddingSnapshot:
+    """
+    Read side of a snapshot: the vectors file opened with ``numpy.memmap``
+    plus an in-memory delta of rows written since the snapshot was taken.
+
+    Pages of the memory map are faulted in by the OS on first use, so a cold
+    process can search without reading the whole matrix into RAM. Rows in the
+    delta shadow snapshot rows with the same id.
+
+    When the snapshot carries int8 codes only those are held in memory: they
+    score every row, and just the best ``limit * rerank_factor`` candidates
+    are re-scored against the full-precision memory map. With an IVF index and
+    ``nprobe`` > 0, only the rows of the ``nprobe`` closest lists are scored.
+    """
+
+    def __init__(self, directory: Path, index: Dict[str, Any], quantized: bool = True):
+        self.directory = directory
+        self.model = index["model"]
+        self.dim = index["dim"]
+        self.ids: List[str] = index["ids"]
+        self.watermark: Optional[Keyset] = tuple(index["watermark"]) if index.get("watermark") else None
+
+        count = len(self.ids)
+        if count and self.dim:
+            self.vectors = np.memmap(
+                directory / VECTORS_FILE, dtype=np.float32, mode="r", shape=(count, self.dim)
+            )
+        else:
+            self.vectors = np.empty((0, self.dim or 0), dtype=np.float32)
+
+        # Later rows win when an id was re-embedded and appended twice
+        self.positions: Dict[str, int] = {row_id: i for i, row_id in enumerate(self.ids)}
+        self.live = None
+        if len(self.positions) < count:
+            self.live = np.zeros(count, dtype=bool)
+            self.live[list(self.positions.values())] = True
+
+        self.quantized: Optional[QuantizedVectors] = None
+        quantization = index.get("quantization")
+        if quantized and count and quantization and quantization["count"] == count:
+            self.quantized = self._load_quantized(directory, quantization, count)
+
+        self.ivf: Optional[IVFIndex] = None
+        ivf = index.get("ivf")
+        if count and ivf and ivf["count"] == count:
+            self.ivf = IVFIndex(
+                np.load(directory / IVF_CENTROIDS_FILE),
+                np.fromfile(directory / IVF_ASSIGNMENTS_FILE, dtype=np.int32, count=count)
+            )
+
+        self.delta = EmbeddingMatrix(np.empty((0, self.dim or 0), dtype=np.float32), [])
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load_quantized(directory: Path, quantization: Dict[str, Any], count: int) -> QuantizedVectors:
+        codes = np.fromfile(directory / CODES_FILE, dtype=np.int8, count=count * quantization["dim"])
+        scales = np.fromfile(directory / SCALES_FILE, dtype=np.float32, count=count)
+        mean = components = None
+        if quantization["pca"]:
+            with np.load(directory / PCA_FILE) as pca:
+                mean, components = pca["mean"], pca["components"]
+        return QuantizedVectors(codes.reshape(count, quantization["dim"]), scales, mean, components)
+
+    @classmethod
+    def open(cls, directory: str, model: str, quantized: bool = True) -> Optional["EmbeddingSnapshot"]:
+        """Map the snapshot in *directory*, or return None if it is missing or built with another model."""
+        path = Path(directory).expanduser()
+        try:
+            index = _read_index(path)
+        except (OSError, ValueError) as e:
+            print(f"Error reading embedding snapshot index: {str(e)}")
+            return None
+        if not index or index.get("version") != SNAPSHOT_VERSION or index.get("model") != model:
+            return None
+        return cls(path, index, quantized=quantized)
+
+    def __len__(self) -> int:
+        return len(self.positions) + len(self.delta)
+
+    def apply(self, rows: List[Dict[str, Any]]) -> int:
+        """Add rows newer than the watermark to the in-memory delta; returns how many had vectors."""
+        if not rows:
+            return 0
+        update = EmbeddingMatrix.from_items(rows)
+        with self._lock:
+            if len(update) and (not self.dim or update.vectors.shape[1] == self.dim):
+                self.dim = self.dim or int(update.vectors.shape[1])
+                new_ids = {str(item["id"]) for item in update.items}
+                kept = [i for i, item in enumerate(self.delta.items) if str(item["id"]) not in new_ids]
+                vectors = np.vstack([self.delta.vectors[kept].reshape(len(kept), self.dim), update.vectors])
+                items = [self.delta.items[i] for i in kept] + [{"id": str(item["id"])} for item in update.items]
+                self.delta = EmbeddingMatrix(np.ascontiguousarray(vectors, dtype=np.float32), items)
+            last = rows[-1]
+            self.watermark = (last["created_at"], str(last["id"]))
+        return len(update)
+
+    def search(
+        self,
+        query_embedding: Sequence[float],
+        limit: int = 20,
+        similarity_threshold: float = 0.0,
+        rerank_factor: int = 10,
+        nprobe: int = 0,
+        candidate_ids: Optional[Set[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Best ``(id, similarity)`` pairs over the snapshot and its delta; *nprobe* 0 scores every row.
+
+        With *candidate_ids* (a filtered search) only those rows are scored,
+        exactly, so the result is the true top-k of the filtered set.
+        """
+        query = normalize_vector(query_embedding)
+        delta = self.delta
+        shadowed = {item["id"] for item in delta.items}
+
+        rows = None
+        if candidate_ids is not None:
+            rows = np.array(sorted(
+                self.positions[row_id] for row_id in candidate_ids
+                if row_id in self.positions and row_id not in shadowed
+            ), dtype=np.int64)
+            in_delta = [i for i, item in enumerate(delta.items) if item["id"] in candidate_ids]
+            delta = EmbeddingMatrix(delta.vectors[in_delta], [delta.items[i] for i in in_delta])
+
+        candidates: List[Tuple[str, float]] = []
+        if len(self.ids) and query.shape[0] == self.dim and (rows is None or rows.size):
+            # Over-fetch by the delta size so shadowed rows cannot push out real matches
+            matches = self._search_rows(
+                query, limit + len(shadowed), similarity_threshold, rerank_factor, nprobe, candidate_rows=rows
+            )
+            for row, similarity in matches:
+                if self.ids[row] not in shadowed:
+                    candidates.append((self.ids[row], similarity))
+
+        for index, similarity in delta.search(query, limit, similarity_threshold):
+            candidates.append((delta.items[index]["id"], similarity))
+
+        candidates.sort(key=lambda pair: pair[1], reverse=True)
+        return candidates[:limit]
+
+    def _search_rows(
+        self,
+        query: np.ndarray,
+        limit: int,
+        similarity_threshold: float,
+        rerank_factor: int = 10,
+        nprobe: int = 0,
+        exact: bool = False,
+        candidate_rows: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        """Top ``(row, similarity)`` pairs of the mapped rows (or sorted *candidate_rows*), ranked by full-precision scores."""
+        # Candidate rows, always in file order so the memory map is walked forwards
+        rows = candidate_rows
+        exact = exact or candidate_rows is not None
+        if nprobe > 0 and self.ivf is not None and not exact:
+            rows = self.ivf.probe(query, nprobe)
+
+        if self.quantized is not None and not exact:
+            approx = self.quantized.scores(query, rows)
+            best = top_k_indices(approx, limit * max(1, rerank_factor))
+            rows = np.sort(rows[best] if rows is not None else best)
+
+        if rows is None:
+            scores = np.asarray(self.vectors @ query)
+            rows = np.arange(scores.size)
+        else:
+            scores = np.asarray(self.vectors[rows] @ query)
+        if self.live is not None:
+            scores[~self.live[rows]] = -np.inf
+
+        above = np.flatnonzero(scores >= similarity_threshold)
+        return [(int(rows[above[i]]), float(scores[above[i]])) for i in top_k_indices(scores[above], limit)]
+
+    def measure_recall(
+        self,
+        queries: int = 100,
+        limit: int = 10,
+        rerank_factor: int = 10,
+        nprobe: int = 0,
+        seed: int = 0
+    ) -> Dict[str, Any]:
+        """
+        Compare the approximate path (int8 codes and/or IVF with *nprobe*)
+        against exact search on perturbed snapshot vectors.
+
+        Returns recall@limit of the approximate top rows against the exact
+        ones, mean latency of both paths and bytes held in memory per vector.
+        """
+        if not len(self.ids):
+            raise ValueError("Snapshot is empty")
+        if self.quantized is None and not (nprobe > 0 and self.ivf is not None):
+            raise ValueError("Snapshot has no quantized vectors or IVF index to compare")
+
+        rng = np.random.default_rng(seed)
+        rows = rng.choice(len(self.ids), size=min(queries, len(self.ids)), replace=False)
+        noise = rng.normal(scale=0.5 / np.sqrt(self.dim), size=(rows.size, self.dim)).astype(np.float32)
+        query_vectors = np.asarray(self.vectors[np.sort(rows)]) + noise
+
+        hits = 0
+        exact_seconds = approximate_seconds = 0.0
+        for query in query_vectors:
+            query = normalize_vector(query)
+
+            started = time.perf_counter()
+            exact = {row for row, _ in self._search_rows(query, limit, -1.0, exact=True)}
+            exact_seconds += time.perf_counter() - started
+
+            started = time.perf_counter()
+            approx = {row for row, _ in self._search_rows(query, limit, -1.0, rerank_factor, nprobe)}
+            approximate_seconds += time.perf_counter() - started
+
+            hits += len(exact & approx)
+
+        return {
+            "queries": int(rows.size),
+            "limit": limit,
+            "rerank_factor": rerank_factor if self.quantized is not None else None,
+            "nprobe": nprobe if self.ivf is not None else 0,
+            "ivf_lists": self.ivf.n_lists if self.ivf is not None else None,
+            "recall": hits / (rows.size * limit),
+            "exact_ms": 1000 * exact_seconds / rows.size,
+            "approximate_ms": 1000 * approximate_seconds / rows.size,
+            "bytes_per_vector_exact": self.dim * 4,
+            "bytes_per_vector_quantized": self.quantized.nbytes / len(self.quantized) if self.quantized is not None else None,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": str(self.directory),
+            "model": self.model,
+            "dim": self.dim,
+            "snapshot_rows": len(self.positions),
+            "delta_rows": len(self.delta),
+            "quantized": self.quantized is not None,
+            "quantized_dim": self.quantized.codes.shape[1] if self.quantized is not None else None,
+            "quantized_bytes": self.quantized.nbytes if self.quantized is not None else 0,
+            "ivf_lists": self.ivf.n_lists if self.ivf is not None else None,
+            "watermark": list(self.watermark) if self.watermark else None,
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from src.config import settings
+    from src.services.storage.supabase import EMBEDDING_MODEL, Supabase
+
+    parser = argparse.ArgumentParser(description="Write or extend the knowledge embedding snapshot.")
+    parser.add_argument("--dir", default=settings.embedding_snapshot_dir, help="Snapshot directory")
+    parser.add_argument("--incremental", action="store_true", help="Append rows newer than the current watermark")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--no-quantize", action="store_true", help="Skip the int8 codes")
+    parser.add_argument("--pca-dim", type=int, default=settings.embedding_snapshot_pca_dim,
+                        help="Project vectors to this many PCA components before quantizing (0 keeps all)")
+    parser.add_argument("--ivf-lists", type=int, default=settings.ivf_lists,
+                        help="IVF lists to train (0 picks ~sqrt(rows), -1 skips the index)")
+    parser.add_argument("--measure-recall", action="store_true",
+                        help="Only report recall/latency of the approximate path against exact search")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--rerank-factor", type=int, default=settings.quantized_rerank_factor)
+    parser.add_argument("--nprobe", type=int, default=settings.ivf_nprobe)
+    args = parser.parse_args()
+    if not args.dir:
+        parser.error("--dir or EMBEDDING_SNAPSHOT_DIR is required")
+
+    if args.measure_recall:
+        snapshot = EmbeddingSnapshot.open(args.dir, EMBEDDING_MODEL)
+        if snapshot is None:
+            parser.error(f"No {EMBEDDING_MODEL} snapshot in {args.dir}")
+        report = snapshot.measure_recall(limit=args.limit, rerank_factor=args.rerank_factor, nprobe=args.nprobe)
+        print(json.dumps(report, indent=2))
+        raise SystemExit(0)
+
+    storage = Supabase(
+        url=os.environ["SUPABASE_URL"],
+        key=os.environ["SUPABASE_KEY"],
+        openai_api_key=os.environ.get("OPENAI_API_KEY")
+    )
+
+    index = None
+    if args.incremental:
+        pages = storage.iter_knowledge_embeddings(after=snapshot_watermark(args.dir), page_size=args.page_size)
+        index = append_snapshot(args.dir, pages, EMBEDDING_MODEL)
+    if index is None:
+        index = write_snapshot(
+            args.dir,
+            storage.iter_knowledge_embeddings(page_size=args.page_size),
+            EMBEDDING_MODEL,
+            quantized=not args.no_quantize,
+            pca_dim=args.pca_dim,
+            ivf_lists=args.ivf_lists if args.ivf_lists >= 0 else None
+        )
+    print(f"Snapshot at {args.dir} holds {index['count']} vectors (watermark {index['watermark']})")
@@ -1,12 +1,25 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Iterator, Set
 from supabase import create_client
 import hashlib
+import threading
+import time
 from openai import OpenAI
-import numpy as np
-import json
 
-from .schemas import DataInstance, Knowledge, Image
+from .schemas import DataInstance, Knowledge, Image, KnowledgeFilter
+from .chunking import CHARS_PER_TOKEN, chunk_text
+from .embedding_cache import EmbeddingCache
+from .pagination import Keyset, RankKeyset
+from .similarity import parse_embedding, rank_by_similarity
+from .snapshot import EmbeddingSnapshot
+from .vector_shards import VectorShardCache
+from src.config import settings
 from src.scraper.notte import NotteScraper
+from src.scraper.pool import SCRAPE_FAILED, SCRAPE_OK, ScrapePool
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# Status of a knowledge item that was embedded and stored (scrape failures use the scrape status)
+KNOWLEDGE_STORED = "stored"
 
 class Supabase:
     def __init__(self, url: str, key: str, openai_api_key: str = None):
@@ -81,6 +94,13 @@ class Supabase:
         self.client = create_client(url, key)
         self.scraper = NotteScraper()
         
+        # URLs attached without content are scraped concurrently on a bounded, shared pool
+        self.scrape_pool = ScrapePool(
+            self.scraper,
+            max_workers=settings.scrape_max_workers,
+            timeout=settings.scrape_timeout_seconds
+        )
+        
         # Initialize OpenAI client with new 1.0.0+ API
         if openai_api_key:
             self.openai_client = OpenAI(api_key=openai_api_key)
@@ -88,28 +108,153 @@ class Supabase:
         else:
             self.openai_client = None
             self.openai_enabled = False
+        
+        # Rank semantic search in Postgres when the match_*_knowledge RPCs are deployed
+        self.vector_rpc_enabled = settings.semantic_search_rpc
+        
+        # Store and search per-passage embeddings in knowledge_chunks
+        self.chunks_enabled = settings.knowledge_chunks_enabled
+        
+        # knowledge.embedding_model (migrations/knowledge_embedding_model.sql); probed on first ingest
+        self._embedding_model_column: Optional[bool] = None
+        
+        # Repeat queries and re-attached content skip the embeddings API round trip
+        self.embedding_cache = EmbeddingCache(
+            max_entries=settings.embedding_cache_size,
+            path=settings.embedding_cache_path,
+            max_disk_entries=settings.embedding_cache_disk_entries
+        )
+        
+        # Per-pet / per-wallet vectors for in-process semantic search, kept in memory between queries
+        self.vector_shards = VectorShardCache(
+            max_bytes=settings.vector_shard_cache_mb * 1024 * 1024,
+            ttl=settings.vector_shard_ttl_seconds
+        )
+        
+        # Memory-mapped snapshot of all knowledge vectors (python -m src.services.storage.snapshot),
+        # brought up to date with a created_at delta query every EMBEDDING_SNAPSHOT_REFRESH_SECONDS
+        self.embedding_snapshot = None
+        if settings.embedding_snapshot_dir:
+            self.embedding_snapshot = EmbeddingSnapshot.open(
+                settings.embedding_snapshot_dir, EMBEDDING_MODEL, quantized=settings.embedding_snapshot_quantized
+            )
+        self._snapshot_refreshed_at = 0.0
+        self._snapshot_refresh_lock = threading.Lock()
     
     def _hash_content(self, content: str) -> str:
         """Generate hash of content for deduplication."""
         return hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
     
     def _generate_embedding(self, text: str) -> Optional[List[float]]:
-        """Generate embeddings using OpenAI's text-embedding-ada-002 model."""
+        """Generate embeddings using OpenAI's text-embedding-ada-002 model (cached)."""
         if not self.openai_enabled or not self.openai_client:
             return None
         
+        cached = self.embedding_cache.get(EMBEDDING_MODEL, text)
+        if cached is not None:
+            return cached
+        
         try:
             response = self.openai_client.embeddings.create(
                 input=text,
-                model="text-embedding-ada-002"
+                model=EMBEDDING_MODEL
             )
-            return response.data[0].embedding
+            embedding = response.data[0].embedding
+            self.embedding_cache.set(EMBEDDING_MODEL, text, embedding)
+            return embedding
         except Exception as e:
             print(f"Error generating embedding: {str(e)}")
             return None
     
+    def _generate_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Generate embeddings for many texts with as few API calls as possible.
+        
+        Cached texts are served locally; the rest are sent in batches bounded by
+        ``embedding_batch_size`` inputs and ``embedding_batch_tokens`` estimated
+        tokens. Results are returned in the same order as *texts*.
+        """
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        if not self.openai_enabled or not self.openai_client:
+            return embeddings
+        
+        pending = []
+        for index, text in enumerate(texts):
+            cached = self.embedding_cache.get(EMBEDDING_MODEL, text)
+            if cached is not None:
+                embeddings[index] = cached
+            else:
+                pending.append(index)
+        
+        for batch in self._embedding_batches(pending, texts):
+            batch_texts = [texts[i] for i in batch]
+            try:
+                response = self.openai_client.embeddings.create(
+                    input=batch_texts,
+                    model=EMBEDDING_MODEL
+                )
+            except Exception as e:
+                # One oversized or rejected input fails the whole request, so retry individually
+                print(f"Error generating batch of {len(batch)} embeddings, retrying one by one: {str(e)}")
+                for i in batch:
+                    embeddings[i] = self._generate_embedding(texts[i])
+                continue
+            
+            for item in response.data:
+                i = batch[item.index]
+                embeddings[i] = item.embedding
+                self.embedding_cache.set(EMBEDDING_MODEL, texts[i], item.embedding)
+        
+        return embeddings
+    
+    def _embedding_batches(self, indices: List[int], texts: List[str]) -> List[List[int]]:
+        """Group text indices into batches bounded by input count and estimated tokens."""
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+        
+        for index in indices:
+            # Roughly four characters per token for English text
+            tokens = len(texts[index]) // 4 + 1
+            if current and (
+                len(current) >= settings.embedding_batch_size
+                or current_tokens + tokens > settings.embedding_batch_tokens
+            ):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(index)
+            current_tokens += tokens
+        
+        if current:
+            batches.append(current)
+        return batches
+    
+    def embed_query(self, query: str) -> Optional[List[float]]:
+        """Embed a search query, raising if semantic search is unavailable."""
+        if not self.openai_enabled:
+            raise ValueError("OpenAI is not enabled. Cannot perform semantic search.")
+        
+        return self._generate_embedding(query)
+    
+    def get_vector_shard_stats(self) -> Dict[str, Any]:
+        return self.vector_shards.stats()
+    
+    def get_embedding_snapshot_stats(self) -> Dict[str, Any]:
+        if self.embedding_snapshot is None:
+            return {"enabled": bool(settings.embedding_snapshot_dir), "loaded": False}
+        return {"enabled": True, "loaded": True, **self.embedding_snapshot.stats()}
+    
+    def get_embedding_cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and sizes for the embedding cache."""
+        return {"model": EMBEDDING_MODEL, **self.embedding_cache.stats()}
+    
     def _prepare_text_for_embedding(self, content: str, title: str = "", url: str = "") -> str:
         """Prepare text for embedding by combining title, content, and optionally URL."""
+        # Long documents are embedded from their opening; their passages cover the rest
+        max_chars = settings.embedding_max_input_tokens * CHARS_PER_TOKEN
+        if content and len(content) > max_chars:
+            content = content[:max_chars]
+        
         parts = []
         if title:
             parts.append(f"Title: {title}")
@@ -124,35 +269,7 @@ class Supabase:
         """Scrape content from URL using NotteScraper."""
         try:
             result = self.scraper.scrape(url=url, instruction=instruction)
-            # Extract relevant content from scraper result
-            if isinstance(result, dict) and 'data' in result:
-                data = result['data']
-                content = ""
-                title = ""
-                
-                # Try to extract content and title from the scraped data
-                if isinstance(data, dict):
-                    # Look for common content fields
-                    content = (data.get('content') or 
-                             data.get('text') or 
-                             data.get('body') or 
-                             str(data))
-                    title = (data.get('title') or 
-                           data.get('heading') or 
-                           data.get('name') or 
-                           "")
-                else:
-                    content = str(data)
-                
-                return {
-                    "content": content,
-                    "title": title
-                }
-            else:
-                return {
-                    "content": str(result),
-                    "title": ""
-                }
+            return self._parse_scrape_result(result)
         except Exception as e:
             # If scraping fails, return error info
             return {
@@ -160,6 +277,37 @@ class Supabase:
                 "title": ""
             }
     
+    def _parse_scrape_result(self, result: Any) -> Dict[str, str]:
+        """Extract content and title from a NotteScraper result."""
+        if isinstance(result, dict) and 'data' in result:
+            data = result['data']
+            content = ""
+            title = ""
+            
+            # Try to extract content and title from the scraped data
+            if isinstance(data, dict):
+                # Look for common content fields
+                content = (data.get('content') or 
+                         data.get('text') or 
+                         data.get('body') or 
+                         str(data))
+                title = (data.get('title') or 
+                       data.get('heading') or 
+                       data.get('name') or 
+                       "")
+            else:
+                content = str(data)
+            
+            return {
+                "content": content,
+                "title": title
+            }
+        else:
+            return {
+                "content": str(result),
+                "title": ""
+            }
+    
     def get_pet(self, pet_id: str) -> Optional[Dict[str, Any]]:
         """Get a specific pet by ID."""
         result = self.client.table("pets").select("*").eq(
@@ -201,46 +349,54 @@ class Supabase:
         self, 
         pet_id: str,
         limit: int = 100,
-        offset: int = 0
+        offset: int = 0,
+        after: Optional[Keyset] = None
     ) -> List[Dict[str, Any]]:
-        """Get all DataInstances for a pet."""
+        """
+        Get DataInstances for a pet, newest first.
+        
+        Pass the (created_at, id) of the last row seen as *after* to page with a
+        keyset instead of *offset*, so deep pages cost the same as the first.
+        """
+        if after is not None:
+            return self._get_pet_instances_after(pet_id, limit, after)
+        
         result = self.client.table("datainstances").select("*").eq(
             "pet_id", pet_id
         ).order(
             "created_at", desc=True
+        ).order(
+            "id", desc=True
         ).range(
             offset, offset + limit - 1
         ).execute()
         
         return result.data
     
-    def get_pet_knowledge(self, pet_id: str, limit: int = 100) -> List[Dict[str, Any]]:
-        """Get all knowledge items associated with a specific pet."""
-        # First get all data instances for this pet
-        instances = self.get_pet_instances(pet_id, limit=1000)  # Get all instances
-        instance_ids = [inst["id"] for inst in instances]
+    def get_pet_knowledge(
+        self,
+        pet_id: str,
+        limit: int = 100,
+        after: Optional[Keyset] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the distinct knowledge items associated with a pet, newest first.
         
-        if not instance_ids:
-            return []
+        The pet scope is resolved server-side by the ``pet_knowledge`` RPC, so
+        each knowledge row comes back once, in one round trip, and pages are
+        keyed on (created_at, id).
+        """
+        query = self.client.rpc("pet_knowledge", {"target_pet_id": pet_id}).select(
+            "id, url, title, content, metadata, created_at, embeddings"
+        )
         
-        # Get all knowledge associated with these datainstances
-        knowledge_result = self.client.table("datainstance_knowledge").select(
-            "knowledge:knowledge_id(id, url, title, content, metadata, created_at, embeddings)"
-        ).in_("datainstance_id", instance_ids).order(
-            "knowledge(created_at)", desc=True
+        result = self._apply_keyset(query, after).order(
+            "created_at", desc=True
+        ).order(
+            "id", desc=True
         ).limit(limit).execute()
         
-        # Extract unique knowledge items (avoid duplicates)
-        seen_knowledge_ids = set()
-        unique_knowledge = []
-        
-        for item in knowledge_result.data:
-            knowledge = item["knowledge"]
-            if knowledge and knowledge["id"] not in seen_knowledge_ids:
-                seen_knowledge_ids.add(knowledge["id"])
-                unique_knowledge.append(knowledge)
-        
-        return unique_knowledge
+        return result.data
     
     def get_datainstance_with_content(self, datainstance_id: str) -> Dict[str, Any]:
         """Get a DataInstance with all its associated Knowledge and Images."""
@@ -290,71 +446,18 @@ class Supabase:
         knowledge: Knowledge
     ) -> Dict[str, Any]:
         """Add knowledge to a DataInstance (creates if not exists)."""
-        # Validate that we have either URL or content
-        if not knowledge.url and (not knowledge.content or knowledge.content.strip() == ""):
-            raise ValueError("Knowledge must have either a URL or content")
-        
-        # If content is not provided or empty, and we have a URL, scrape it
-        if knowledge.url and (not knowledge.content or knowledge.content.strip() == ""):
-            scraped = self._scrape_url_content(knowledge.url)
-            knowledge.content = scraped["content"]
-            # Use scraped title if no title was provided
-            if not knowledge.title:
-                knowledge.title = scraped["title"]
-        
-        # If we still don't have content, raise an error
-        if not knowledge.content or knowledge.content.strip() == "":
-            raise ValueError("Could not obtain content from URL or provided content")
-        
-        # Generate embeddings for the knowledge content
-        embedding_text = self._prepare_text_for_embedding(
-            content=knowledge.content,
-            title=knowledge.title or "",
-            url=str(knowledge.url) if knowledge.url else ""
-        )
-        embeddings = self._generate_embedding(embedding_text)
-        
-        knowledge_data = {
-            "url": str(knowledge.url) if knowledge.url else None,
-            "content": knowledge.content,
-            "title": knowledge.title,
-            "content_hash": self._hash_content(knowledge.content),
-            "metadata": knowledge.metadata,
-            "created_at": knowledge.created_at.isoformat()
-        }
-        
-        # Add embeddings if available
-        if embeddings:
-            knowledge_data["embeddings"] = embeddings
-        
-        # Upsert knowledge (insert or update if URL+content_hash combination already exists)
-        knowledge_result = self.client.table("knowledge").upsert(
-            knowledge_data,
-            on_conflict="url,content_hash"
-        ).execute()
-        
-        knowledge_id = knowledge_result.data[0]["id"]
-        
-        # Create relationship
-        relation_data = {
-            "datainstance_id": datainstance_id,
-            "knowledge_id": knowledge_id
-        }
-        
-        self.client.table("datainstance_knowledge").upsert(
-            relation_data,
-            on_conflict="datainstance_id,knowledge_id"
-        ).execute()
-        
-        return knowledge_result.data[0]
+        result = self._add_knowledge_batch(datainstance_id, [knowledge])[0]
+        if result["status"] != KNOWLEDGE_STORED:
+            raise ValueError(f"Could not obtain content from URL: {result['error']}")
+        return result
     
     def bulk_add_knowledge(
         self,
         datainstance_id: str,
         knowledge_list: List[Dict[str, str]]
     ) -> List[Dict[str, Any]]:
-        """Add multiple knowledge entities to a DataInstance."""
-        results = []
+        """Add multiple knowledge entities to a DataInstance, with a per-item status (see :meth:`_add_knowledge_batch`)."""
+        knowledge_items = []
         
         for k in knowledge_list:
             # Handle cases where URL and/or content might be provided
@@ -363,54 +466,452 @@ class Supabase:
             title = k.get("title", "")
             
             # Skip entries that have neither URL nor content
-            if not url and not content.strip():
+            if not url and not (content or "").strip():
                 continue
                 
-            knowledge = Knowledge(
+            knowledge_items.append(Knowledge(
                 url=url,
                 content=content,
                 title=title,
                 metadata=k.get("metadata", {})
-            )
-            result = self.add_knowledge_to_instance(datainstance_id, knowledge)
-            results.append(result)
+            ))
+        
+        return self._add_knowledge_batch(datainstance_id, knowledge_items)
+    
+    def add_knowledge_items(
+        self,
+        datainstance_id: str,
+        knowledge_items: List[Knowledge]
+    ) -> List[Dict[str, Any]]:
+        """Add Knowledge objects to a DataInstance, with a per-item status (see :meth:`_add_knowledge_batch`)."""
+        return self._add_knowledge_batch(datainstance_id, knowledge_items)
+    
+    def _add_knowledge_batch(
+        self,
+        datainstance_id: str,
+        knowledge_items: List[Knowledge]
+    ) -> List[Dict[str, Any]]:
+        """
+        Scrape, embed and store knowledge as overlapping stages.
+        
+        URLs without content are scraped concurrently on the shared scrape
+        pool. Items that already have content are embedded and stored right
+        away, and every group of scrapes that completes is embedded and stored
+        while the rest are still loading, so a multi-URL attach takes about as
+        long as its slowest page.
+        
+        Results follow the order of *knowledge_items*. Stored rows carry
+        ``status: "stored"``; a URL whose scrape failed, timed out or came back
+        empty is returned as ``{"url", "status", "error"}`` instead of failing
+        the whole batch.
+        """
+        to_scrape = []
+        for i, knowledge in enumerate(knowledge_items):
+            if not self._needs_scrape(knowledge):
+                continue
+            # Pages already in the scrape cache (even stale ones) don't wait for a scraper thread
+            cached = self.scraper.cached(str(knowledge.url), self._scrape_instruction(knowledge))
+            if cached is None or not self._use_scraped_page(knowledge, cached):
+                to_scrape.append(i)
+        
+        # Submit the scrapes first so they run while the rest is embedded
+        outcome_groups = self.scrape_pool.scrape_many([
+            (str(knowledge_items[i].url), self._scrape_instruction(knowledge_items[i]))
+            for i in to_scrape
+        ]) if to_scrape else iter(())
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(knowledge_items)
+        scraping = set(to_scrape)
+        ready = [i for i in range(len(knowledge_items)) if i not in scraping]
+        if ready:
+            self._store_knowledge_group(datainstance_id, knowledge_items, ready, results)
+        
+        for outcomes in outcome_groups:
+            scraped = []
+            for outcome in outcomes:
+                i = to_scrape[outcome.index]
+                if outcome.status == SCRAPE_OK:
+                    if self._use_scraped_page(knowledge_items[i], outcome.result):
+                        scraped.append(i)
+                        continue
+                    outcome.status, outcome.error = SCRAPE_FAILED, "Scraped page has no content"
+                
+                results[i] = {"url": outcome.url, "status": outcome.status, "error": outcome.error}
+            
+            if scraped:
+                self._store_knowledge_group(datainstance_id, knowledge_items, scraped, results)
         
         return results
     
-    def add_image_to_instance(
+    def _scrape_instruction(self, knowledge: Knowledge) -> Optional[str]:
+        return (knowledge.metadata or {}).get("instruction")
+    
+    def _use_scraped_page(self, knowledge: Knowledge, result: Any) -> bool:
+        """Fill *knowledge* from a scrape result; False when the page has no content."""
+        page = self._parse_scrape_result(result)
+        if not page["content"].strip():
+            return False
+        knowledge.content = page["content"]
+        # Use scraped title if no title was provided
+        if not knowledge.title:
+            knowledge.title = page["title"]
+        return True
+    
+    def _store_knowledge_group(
         self,
         datainstance_id: str,
-        image: Image
-    ) -> Dict[str, Any]:
-        """Add an image to a DataInstance (creates if not exists)."""
-        image_data = {
-            "image_url": image.image_url,
-            "alt_text": image.alt_text,
-            "url_hash": self._hash_content(image.image_url),
-            "metadata": image.metadata,
-            "created_at": image.created_at.isoformat()
-        }
+        knowledge_items: List[Knowledge],
+        positions: List[int],
+        results: List[Optional[Dict[str, Any]]]
+    ) -> None:
+        """Embed and store the items at *positions*, filling their slots in *results*."""
+        stored = self._embed_and_store_knowledge(datainstance_id, [knowledge_items[i] for i in positions])
+        for i, row in zip(positions, stored):
+            results[i] = {**row, "status": KNOWLEDGE_STORED}
+    
+    def _embed_and_store_knowledge(
+        self,
+        datainstance_id: str,
+        knowledge_items: List[Knowledge]
+    ) -> List[Dict[str, Any]]:
+        """
+        Embed items with content and their passages in batched API calls, then store them.
         
-        # Upsert image (insert or update if URL already exists)
-        image_result = self.client.table("images").upsert(
-            image_data,
-            on_conflict="image_url"
-        ).execute()
+        Content already stored under the same ``content_hash`` and embedding
+        model (e.g. a popular link attached by another pet) reuses the stored
+        document vector and passages instead of being embedded again.
+        """
+        hashes = [self._hash_content(knowledge.content) for knowledge in knowledge_items]
+        reusable = self._find_stored_embeddings(hashes) if self._has_embedding_model_column() else {}
+        
+        embeddings: List[Optional[List[float]]] = [
+            reusable[content_hash]["embeddings"] if content_hash in reusable else None
+            for content_hash in hashes
+        ]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        
+        # Generate embeddings for the knowledge content that has no stored vector
+        embedding_texts = [
+            self._prepare_text_for_embedding(
+                content=knowledge_items[i].content,
+                title=knowledge_items[i].title or "",
+                url=str(knowledge_items[i].url) if knowledge_items[i].url else ""
+            )
+            for i in missing
+        ]
+        
+        # Passages are embedded in the same batched pass as the documents
+        chunks: List[List[Dict[str, Any]]] = []
+        passages: List[tuple] = []
+        if self.chunks_enabled:
+            chunks = self._knowledge_chunks(knowledge_items, hashes, reusable)
+            passages = self._unembedded_passages(chunks)
+        passage_texts = [
+            self._prepare_text_for_embedding(content=chunks[i][j]["content"], title=knowledge_items[i].title or "")
+            for i, j in passages
+        ]
+        
+        generated = self._generate_embeddings(embedding_texts + passage_texts)
+        for i, embedding in zip(missing, generated):
+            embeddings[i] = embedding
+        for (i, j), embedding in zip(passages, generated[len(missing):]):
+            if embedding:
+                chunks[i][j]["embeddings"] = embedding
+        
+        stored = self._store_knowledge_rows(datainstance_id, knowledge_items, embeddings)
+        
+        if self.chunks_enabled:
+            self._store_knowledge_chunks(stored, chunks, embeddings)
+        
+        self._update_vector_shards(datainstance_id, stored)
+        
+        return stored
+    
+    def _has_embedding_model_column(self) -> bool:
+        """
+        Whether knowledge.embedding_model exists. Until the migration is applied
+        knowledge is stored without it and stored vectors are not reused; a
+        missing column is remembered, so apply the migration before deploying
+        or restart afterwards.
+        """
+        if self._embedding_model_column is None:
+            try:
+                self.client.table("knowledge").select("embedding_model").limit(1).execute()
+                self._embedding_model_column = True
+            except Exception as e:
+                print(f"Error probing knowledge.embedding_model, not reusing stored embeddings: {str(e)}")
+                # Only a missing column is remembered; other errors are probed again next time
+                if "embedding_model" in str(e):
+                    self._embedding_model_column = False
+                return False
+        return self._embedding_model_column
+    
+    def _find_stored_embeddings(self, content_hashes: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Map each content hash that already has a vector from EMBEDDING_MODEL to
+        that row's ``id`` and parsed ``embeddings``.
+        """
+        found: Dict[str, Dict[str, Any]] = {}
+        unique_hashes = list(dict.fromkeys(content_hashes))
+        
+        # Hashes are 16 hex characters, so batches of 100 keep the in_() filter well under URL limits
+        for start in range(0, len(unique_hashes), 100):
+            batch = unique_hashes[start:start + 100]
+            try:
+                result = self.client.table("knowledge").select(
+                    "id, content_hash, embeddings"
+                ).in_(
+                    "content_hash", batch
+                ).eq(
+                    "embedding_model", EMBEDDING_MODEL
+                ).not_.is_(
+                    "embeddings", "null"
+                ).execute()
+            except Exception as e:
+                print(f"Error looking up stored embeddings: {str(e)}")
+                return found
+            
+            for row in result.data:
+                embedding = parse_embedding(row.get("embeddings"))
+                if embedding and row["content_hash"] not in found:
+                    found[row["content_hash"]] = {"id": row["id"], "embeddings": embedding}
         
-        image_id = image_result.data[0]["id"]
+        return found
+    
+    def _knowledge_chunks(
+        self,
+        knowledge_items: List[Knowledge],
+        hashes: List[str],
+        reusable: Dict[str, Dict[str, Any]]
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Passages for each knowledge item: copied from the row that already holds
+        the same content when it has them, otherwise freshly split.
+        """
+        source_ids = [reusable[h]["id"] for h in hashes if h in reusable]
+        stored_chunks = self._find_stored_chunks(source_ids) if source_ids else {}
+        
+        chunks = []
+        for knowledge, content_hash in zip(knowledge_items, hashes):
+            source = reusable.get(content_hash)
+            item_chunks = stored_chunks.get(source["id"]) if source else None
+            if item_chunks:
+                chunks.append([dict(chunk) for chunk in item_chunks])
+            else:
+                chunks.append(self._split_knowledge([knowledge.content])[0])
+        return chunks
+    
+    def _find_stored_chunks(self, knowledge_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Stored passages (with their vectors) of *knowledge_ids*, in chunk order."""
+        try:
+            rows = self._select_all(
+                lambda: self.client.table("knowledge_chunks").select(
+                    "knowledge_id, chunk_index, content, char_start, char_end, token_count, embeddings"
+                ).in_(
+                    "knowledge_id", list(set(knowledge_ids))
+                ).order("knowledge_id").order("chunk_index")
+            )
+        except Exception as e:
+            print(f"Error looking up stored knowledge chunks: {str(e)}")
+            return {}
+        
+        chunks: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            embedding = parse_embedding(row.pop("embeddings", None))
+            if embedding:
+                row["embeddings"] = embedding
+            chunks.setdefault(row["knowledge_id"], []).append(row)
+        return chunks
+    
+    def _split_knowledge(self, contents: List[str]) -> List[List[Dict[str, Any]]]:
+        """Token-bounded, overlapping passages of each knowledge item's content."""
+        return [
+            chunk_text(content, settings.chunk_max_tokens, settings.chunk_overlap_tokens)
+            for content in contents
+        ]
+    
+    def _unembedded_passages(self, chunks: List[List[Dict[str, Any]]]) -> List[tuple]:
+        """
+        (item, chunk) positions of passages that still need an embedding.
         
-        # Create relationship
-        relation_data = {
-            "datainstance_id": datainstance_id,
-            "image_id": image_id
-        }
+        A document that fits in one chunk is left out: its only passage reuses
+        the document embedding.
+        """
+        return [
+            (i, j)
+            for i, item_chunks in enumerate(chunks) if len(item_chunks) > 1
+            for j, chunk in enumerate(item_chunks) if "embeddings" not in chunk
+        ]
+    
+    def _store_knowledge_chunks(
+        self,
+        stored: List[Dict[str, Any]],
+        chunks: List[List[Dict[str, Any]]],
+        document_embeddings: List[Optional[List[float]]]
+    ) -> None:
+        """Upsert the passages of stored knowledge rows into knowledge_chunks in one request."""
+        rows = []
+        for knowledge, item_chunks, document_embedding in zip(stored, chunks, document_embeddings):
+            # Passages read back from this very row are already stored
+            if item_chunks and all(chunk.get("knowledge_id") == knowledge["id"] for chunk in item_chunks):
+                continue
+            
+            for chunk in item_chunks:
+                row = {**chunk, "knowledge_id": knowledge["id"]}
+                if len(item_chunks) == 1 and document_embedding and "embeddings" not in row:
+                    row["embeddings"] = document_embedding
+                rows.append(row)
         
-        self.client.table("datainstance_images").upsert(
-            relation_data,
-            on_conflict="datainstance_id,image_id"
-        ).execute()
+        if not rows:
+            return
         
-        return image_result.data[0]
+        try:
+            self._bulk_upsert(
+                "knowledge_chunks", rows, on_conflict="knowledge_id,chunk_index",
+                key=lambda row: (row["knowledge_id"], row["chunk_index"])
+            )
+        except Exception as e:
+            # Passages are an index over the knowledge; the knowledge itself is already stored
+            print(f"Error storing knowledge chunks: {str(e)}")
+    
+    def backfill_knowledge_chunks(self, batch_size: int = 100) -> int:
+        """
+        Chunk and embed every knowledge row that has no passages yet.
+        
+        Stored document embeddings are reused for single-passage documents.
+        Returns the number of knowledge rows processed.
+        """
+        processed = 0
+        last_id = None
+        while True:
+            query = self.client.table("knowledge").select(
+                "id, title, content, embeddings, knowledge_chunks!left(id)"
+            ).is_("knowledge_chunks", "null")
+            if last_id:
+                query = query.gt("id", last_id)
+            rows = query.order("id").limit(batch_size).execute().data
+            if not rows:
+                return processed
+            
+            chunks = self._split_knowledge([row["content"] for row in rows])
+            passages = self._unembedded_passages(chunks)
+            generated = self._generate_embeddings([
+                self._prepare_text_for_embedding(content=chunks[i][j]["content"], title=rows[i].get("title") or "")
+                for i, j in passages
+            ])
+            for (i, j), embedding in zip(passages, generated):
+                if embedding:
+                    chunks[i][j]["embeddings"] = embedding
+            
+            self._store_knowledge_chunks(
+                rows, chunks, [parse_embedding(row.get("embeddings")) for row in rows]
+            )
+            
+            processed += len(rows)
+            last_id = rows[-1]["id"]
+    
+    def _needs_scrape(self, knowledge: Knowledge) -> bool:
+        """Validate *knowledge*; True when its content has to be scraped from its URL."""
+        # Validate that we have either URL or content
+        if not knowledge.url and (not knowledge.content or knowledge.content.strip() == ""):
+            raise ValueError("Knowledge must have either a URL or content")
+        
+        # If content is not provided or empty, and we have a URL, scrape it
+        return bool(knowledge.url) and (not knowledge.content or knowledge.content.strip() == "")
+    
+    def _store_knowledge_rows(
+        self,
+        datainstance_id: str,
+        knowledge_items: List[Knowledge],
+        embeddings: List[Optional[List[float]]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Upsert knowledge rows and link them to a DataInstance in two round trips.
+        
+        All knowledge rows go in one multi-row upsert and all relation rows in a
+        second one. Results are returned in the order of *knowledge_items*.
+        """
+        if not knowledge_items:
+            return []
+        
+        rows = []
+        for knowledge, embedding in zip(knowledge_items, embeddings):
+            knowledge_data = {
+                "url": str(knowledge.url) if knowledge.url else None,
+                "content": knowledge.content,
+                "title": knowledge.title,
+                "content_hash": self._hash_content(knowledge.content),
+                "metadata": knowledge.metadata,
+                "created_at": knowledge.created_at.isoformat()
+            }
+            
+            # Add embeddings if available, tagged with the model so they can be reused
+            if embedding:
+                knowledge_data["embeddings"] = embedding
+                if self._embedding_model_column:
+                    knowledge_data["embedding_model"] = EMBEDDING_MODEL
+            
+            rows.append(knowledge_data)
+        
+        # Upsert knowledge (insert or update if URL+content_hash combination already exists)
+        stored = self._bulk_upsert(
+            "knowledge", rows, on_conflict="url,content_hash",
+            key=lambda row: (row["url"], row["content_hash"])
+        )
+        
+        # Create relationships
+        relation_rows = [
+            {"datainstance_id": datainstance_id, "knowledge_id": row["id"]}
+            for row in stored
+        ]
+        self._bulk_upsert(
+            "datainstance_knowledge", relation_rows, on_conflict="datainstance_id,knowledge_id",
+            key=lambda row: row["knowledge_id"]
+        )
+        
+        return stored
+    
+    def _bulk_upsert(
+        self,
+        table: str,
+        rows: List[Dict[str, Any]],
+        on_conflict: str,
+        key: Callable[[Dict[str, Any]], Any]
+    ) -> List[Dict[str, Any]]:
+        """
+        Upsert many rows into *table* and return the stored row for each input row.
+        
+        Rows sharing a conflict *key* are sent once, since Postgres rejects an
+        upsert that touches the same row twice. Rows are grouped by column set so
+        that rows without an optional column (e.g. embeddings) never null it out
+        on an existing record; in the common case this is a single request.
+        """
+        unique: Dict[Any, Dict[str, Any]] = {}
+        for row in rows:
+            unique.setdefault(key(row), row)
+        
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        for row in unique.values():
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+        
+        stored: Dict[Any, Dict[str, Any]] = {}
+        for group in groups.values():
+            result = self.client.table(table).upsert(
+                group,
+                on_conflict=on_conflict
+            ).execute()
+            for row in result.data:
+                stored[key(row)] = row
+        
+        return [stored[key(row)] for row in rows]
+    
+    def add_image_to_instance(
+        self,
+        datainstance_id: str,
+        image: Image
+    ) -> Dict[str, Any]:
+        """Add an image to a DataInstance (creates if not exists)."""
+        return self._store_images(datainstance_id, [image])[0]
     
     def bulk_add_images(
         self,
@@ -418,96 +919,142 @@ class Supabase:
         image_urls: List[str]
     ) -> List[Dict[str, Any]]:
         """Add multiple images to a DataInstance."""
-        results = []
+        images = [Image(image_url=url) for url in image_urls]
+        return self._store_images(datainstance_id, images)
+    
+    def _store_images(
+        self,
+        datainstance_id: str,
+        images: List[Image]
+    ) -> List[Dict[str, Any]]:
+        """Upsert image rows and link them to a DataInstance in two round trips."""
+        if not images:
+            return []
         
-        for url in image_urls:
-            image = Image(
-                image_url=url
-            )
-            result = self.add_image_to_instance(datainstance_id, image)
-            results.append(result)
+        image_rows = [
+            {
+                "image_url": image.image_url,
+                "alt_text": image.alt_text,
+                "url_hash": self._hash_content(image.image_url),
+                "metadata": image.metadata,
+                "created_at": image.created_at.isoformat()
+            }
+            for image in images
+        ]
         
-        return results
+        # Upsert images (insert or update if URL already exists)
+        stored = self._bulk_upsert(
+            "images", image_rows, on_conflict="image_url",
+            key=lambda row: row["image_url"]
+        )
+        
+        # Create relationships
+        relation_rows = [
+            {"datainstance_id": datainstance_id, "image_id": row["id"]}
+            for row in stored
+        ]
+        self._bulk_upsert(
+            "datainstance_images", relation_rows, on_conflict="datainstance_id,image_id",
+            key=lambda row: row["image_id"]
+        )
+        
+        return stored
     
     def search_pet_content(
         self,
         pet_id: str,
         search_query: str,
-        limit: int = 20
+        limit: int = 20,
+        after: Optional[Dict[str, RankKeyset]] = None
     ) -> Dict[str, List[Dict[str, Any]]]:
         """
-        Search across a pet's content (DataInstances and Knowledge).
+        Full-text search across a pet's content (DataInstances and Knowledge).
         
-        Returns results grouped by type.
+        Returns ranked hits grouped by type, each with a ``rank`` and a
+        highlighted ``snippet``. *after* maps a group to the (rank, id) of its
+        last hit on the previous page; groups missing from it are finished.
         """
-        # Search in DataInstances for this pet
-        instances_result = self.client.table("datainstances").select("*").eq(
-            "pet_id", pet_id
-        ).ilike(
-            "content", f"%{search_query}%"
-        ).limit(limit).execute()
-        
-        # Get datainstance IDs to search related knowledge
-        instance_ids = [inst["id"] for inst in instances_result.data]
-        
-        knowledge_results = []
-        if instance_ids:
-            # Get knowledge associated with these datainstances
-            knowledge_relations = self.client.table("datainstance_knowledge").select(
-                "knowledge:knowledge_id(id, url, title, content, metadata, created_at)"
-            ).in_("datainstance_id", instance_ids).execute()
-            
-            # Also search knowledge content directly
-            knowledge_content = self.client.table("knowledge").select("*").ilike(
-                "content", f"%{search_query}%"
-            ).limit(limit).execute()
-            
-            knowledge_results = ([item["knowledge"] for item in knowledge_relations.data] + 
-                               knowledge_content.data)
-        
-        return {
-            "datainstances": instances_result.data,
-            "knowledge": knowledge_results
-        }
+        return self._full_text_search(
+            "search_pet_datainstances", "search_pet_knowledge",
+            search_query, limit, after,
+            target_pet_id=pet_id
+        )
     
     def search_user_content(
         self,
         wallet_address: str,
         search_query: str,
-        limit: int = 20
+        limit: int = 20,
+        after: Optional[Dict[str, RankKeyset]] = None
     ) -> Dict[str, List[Dict[str, Any]]]:
         """
-        Search across all user's pets content.
-        """
-        # Get user's pets first
-        pets = self.get_user_pets(wallet_address)
-        pet_ids = [pet["id"] for pet in pets]
-        
-        if not pet_ids:
-            return {"datainstances": [], "knowledge": []}
+        Full-text search across all user's pets content.
         
-        # Search in DataInstances for all user's pets
-        instances_result = self.client.table("datainstances").select("*").in_(
-            "pet_id", pet_ids
-        ).ilike(
-            "content", f"%{search_query}%"
-        ).limit(limit).execute()
-        
-        # Search in Knowledge (related to user's datainstances)
-        instance_ids = [inst["id"] for inst in instances_result.data]
-        knowledge_results = []
+        Same result shape and paging as :meth:`search_pet_content`.
+        """
+        return self._full_text_search(
+            "search_user_datainstances", "search_user_knowledge",
+            search_query, limit, after,
+            target_wallet_address=wallet_address
+        )
+    
+    def full_text_search_pet_knowledge(
+        self,
+        pet_id: str,
+        search_query: str,
+        limit: int = 20
+    ) -> List[Dict[str, Any]]:
+        """Ranked full-text hits over a pet's knowledge only."""
+        return self._full_text_search(
+            "search_pet_datainstances", "search_pet_knowledge",
+            search_query, limit, {"knowledge": None},
+            target_pet_id=pet_id
+        )["knowledge"]
+    
+    def full_text_search_user_knowledge(
+        self,
+        wallet_address: str,
+        search_query: str,
+        limit: int = 20
+    ) -> List[Dict[str, Any]]:
+        """Ranked full-text hits over the knowledge of a wallet's pets only."""
+        return self._full_text_search(
+            "search_user_datainstances", "search_user_knowledge",
+            search_query, limit, {"knowledge": None},
+            target_wallet_address=wallet_address
+        )["knowledge"]
+    
+    def _full_text_search(
+        self,
+        instances_function: str,
+        knowledge_function: str,
+        search_query: str,
+        limit: int,
+        after: Optional[Dict[str, Optional[RankKeyset]]],
+        **scope: Any
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Run the ranked full-text search RPCs (migrations/fulltext_search.sql).
         
-        if instance_ids:
-            knowledge_relations = self.client.table("datainstance_knowledge").select(
-                "knowledge:knowledge_id(id, url, title, content, metadata, created_at)"
-            ).in_("datainstance_id", instance_ids).execute()
+        With *after*, only the groups it names are searched, each starting past
+        its (rank, id) position, or from the top when that position is None.
+        """
+        results = {}
+        for group, function in (
+            ("datainstances", instances_function),
+            ("knowledge", knowledge_function)
+        ):
+            if after is not None and group not in after:
+                results[group] = []
+                continue
+            
+            params = {"search_query": search_query, "match_count": limit, **scope}
+            if after is not None and after[group] is not None:
+                params["after_rank"], params["after_id"] = after[group]
             
-            knowledge_results = [item["knowledge"] for item in knowledge_relations.data]
+            results[group] = self.client.rpc(function, params).execute().data or []
         
-        return {
-            "datainstances": instances_result.data,
-            "knowledge": knowledge_results
-        }
+        return results
         
     def get_user_statistics(self, wallet_address: str) -> Dict[str, Any]:
         """Get comprehensive statistics for a user."""
@@ -570,6 +1117,9 @@ class Supabase:
     def export_pet_data(self, pet_id: str) -> Dict[str, Any]:
         """
         Export complete pet data with all instances, knowledge, and images.
+        
+        Loads up to 1000 instances; use :meth:`iter_pet_export_pages` to stream
+        pets of any size.
         """
         pet = self.get_pet(pet_id)
         if not pet:
@@ -577,13 +1127,155 @@ class Supabase:
         
         instances = self.get_pet_instances(pet_id, limit=1000)
         
-        complete_instances = []
+        pet["instances"] = self._attach_instance_content(instances)
+        return pet
+    
+    def iter_pet_export_pages(
+        self,
+        pet_id: str,
+        page_size: Optional[int] = None,
+        include_embeddings: bool = False
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yield a pet's complete DataInstances page by page, newest first.
+        
+        Pages are read with keyset pagination on (created_at, id), so there is
+        no row cap and each page costs the same constant number of queries.
+        With *include_embeddings* the knowledge rows also carry
+        ``content_hash`` and ``embeddings``.
+        """
+        page_size = page_size or settings.export_batch_size
+        after = None
+        while True:
+            instances = self._get_pet_instances_after(pet_id, page_size, after)
+            if not instances:
+                return
+            
+            yield self._attach_instance_content(instances, include_embeddings)
+            
+            if len(instances) < page_size:
+                return
+            after = (instances[-1]["created_at"], instances[-1]["id"])
+    
+    def _get_pet_instances_after(
+        self,
+        pet_id: str,
+        limit: int,
+        after: Optional[Keyset] = None
+    ) -> List[Dict[str, Any]]:
+        """Get up to *limit* DataInstances older than the (created_at, id) keyset *after*."""
+        query = self.client.table("datainstances").select("*").eq("pet_id", pet_id)
+        
+        result = self._apply_keyset(query, after).order(
+            "created_at", desc=True
+        ).order(
+            "id", desc=True
+        ).limit(limit).execute()
+        
+        return result.data
+    
+    def _apply_keyset(self, query: Any, after: Optional[Keyset], desc: bool = True) -> Any:
+        """Restrict a query ordered by (created_at, id), descending unless *desc* is False, to rows after *after*."""
+        if not after:
+            return query
+        created_at, row_id = after
+        op = "lt" if desc else "gt"
+        return query.or_(
+            f'created_at.{op}."{created_at}",'
+            f'and(created_at.eq."{created_at}",id.{op}.{row_id})'
+        )
+    
+    def _attach_instance_content(
+        self,
+        instances: List[Dict[str, Any]],
+        include_embeddings: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Attach knowledge and images to many DataInstances with batched queries.
+        
+        Issues two ``in_``-filtered queries per ``EXPORT_BATCH_SIZE`` instances
+        instead of two queries per instance.
+        """
         for instance in instances:
-            complete = self.get_datainstance_with_content(instance["id"])
-            complete_instances.append(complete)
+            instance["knowledge"] = []
+            instance["images"] = []
         
-        pet["instances"] = complete_instances
-        return pet
+        by_id = {instance["id"]: instance for instance in instances}
+        instance_ids = list(by_id)
+        batch_size = settings.export_batch_size
+        
+        knowledge_columns = "id, url, title, content, metadata, created_at"
+        if include_embeddings:
+            knowledge_columns += ", content_hash, embeddings"
+        
+        for start in range(0, len(instance_ids), batch_size):
+            batch = instance_ids[start:start + batch_size]
+            
+            knowledge_rows = self._select_all(
+                lambda: self.client.table("datainstance_knowledge").select(
+                    f"datainstance_id, knowledge:knowledge_id({knowledge_columns})"
+                ).in_("datainstance_id", batch).order("datainstance_id").order("knowledge_id")
+            )
+            for row in knowledge_rows:
+                if row["knowledge"]:
+                    by_id[row["datainstance_id"]]["knowledge"].append(row["knowledge"])
+            
+            image_rows = self._select_all(
+                lambda: self.client.table("datainstance_images").select(
+                    "datainstance_id, images:image_id(id, image_url, alt_text, metadata, created_at)"
+                ).in_("datainstance_id", batch).order("datainstance_id").order("image_id")
+            )
+            for row in image_rows:
+                if row["images"]:
+                    by_id[row["datainstance_id"]]["images"].append(row["images"])
+        
+        return instances
+    
+    def _select_all(self, build_query: Callable[[], Any], page_size: int = 1000) -> List[Dict[str, Any]]:
+        """Run a PostgREST select page by page so results are not cut off at max-rows."""
+        rows: List[Dict[str, Any]] = []
+        start = 0
+        while True:
+            page = build_query().range(start, start + page_size - 1).execute().data
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+            start += page_size
+    
+    def iter_knowledge_embeddings(
+        self,
+        after: Optional[Keyset] = None,
+        page_size: int = 1000
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yield pages of ``id``, ``created_at`` and ``embeddings`` for knowledge
+        with a vector, oldest first, starting after the (created_at, id) keyset *after*.
+        """
+        while True:
+            query = self.client.table("knowledge").select("id, created_at, embeddings").not_.is_(
+                "embeddings", "null"
+            )
+            page = self._apply_keyset(query, after, desc=False).order(
+                "created_at"
+            ).order(
+                "id"
+            ).limit(page_size).execute().data
+            if not page:
+                return
+            
+            yield page
+            
+            if len(page) < page_size:
+                return
+            after = (page[-1]["created_at"], page[-1]["id"])
+    
+    def get_user_game_sessions(self, wallet_address: str, table: str) -> List[Dict[str, Any]]:
+        """Get every row of a game session table (e.g. ``trivia_sessions``) for a user."""
+        return self._select_all(
+            lambda: self.client.table(table).select("*").eq(
+                "wallet_address", wallet_address
+            ).order("completed_at").order("id")
+        )
     
     def add_knowledge_from_urls(
         self,
@@ -591,26 +1283,26 @@ class Supabase:
         urls: List[str],
         instruction: Optional[str] = None
     ) -> List[Dict[str, Any]]:
-        """Add knowledge to a DataInstance from a list of URLs (content will be scraped)."""
-        results = []
-        
-        for url in urls:
-            knowledge = Knowledge(
+        """Add knowledge to a DataInstance from a list of URLs (content will be scraped concurrently)."""
+        knowledge_items = [
+            Knowledge(
                 url=url,
                 content="",
                 title="",  
                 metadata={"scraped": True, "instruction": instruction} if instruction else {"scraped": True}
             )
-            result = self.add_knowledge_to_instance(datainstance_id, knowledge)
-            results.append(result)
+            for url in urls
+        ]
         
-        return results
+        return self._add_knowledge_batch(datainstance_id, knowledge_items)
 
     def semantic_search_knowledge(
         self,
         query: str,
         limit: int = 20,
-        similarity_threshold: float = 0.7
+        similarity_threshold: float = 0.7,
+        nprobe: Optional[int] = None,
+        filters: Optional[KnowledgeFilter] = None
     ) -> List[Dict[str, Any]]:
         """
         Perform semantic search across all knowledge using embeddings.
@@ -619,64 +1311,51 @@ class Supabase:
             query: Search query text
             limit: Maximum number of results to return
             similarity_threshold: Minimum similarity score (0-1)
+            nprobe: Search the in-process snapshot, probing this many IVF lists
+                (0 scans every row); None uses the RPC, then IVF_NPROBE
+            filters: Only score knowledge matching these filters
         
         Returns:
             List of knowledge items with similarity scores
         """
-        if not self.openai_enabled:
-            raise ValueError("OpenAI is not enabled. Cannot perform semantic search.")
-        
         # Generate embedding for the query
-        query_embedding = self._generate_embedding(query)
+        query_embedding = self.embed_query(query)
         if not query_embedding:
             return []
         
+        # An explicit nprobe selects the in-process index when a snapshot is loaded
+        if nprobe is None or self.embedding_snapshot is None:
+            matches = self._match_knowledge_rpc(
+                "match_all_knowledge", query_embedding, limit, similarity_threshold, filters
+            )
+            if matches is not None:
+                return matches
+        
+        candidate_ids = self._filter_knowledge_ids(filters)
+        
+        if self.embedding_snapshot is not None:
+            try:
+                return self._search_embedding_snapshot(
+                    query_embedding, limit, similarity_threshold,
+                    settings.ivf_nprobe if nprobe is None else nprobe,
+                    candidate_ids, filters
+                )
+            except Exception as e:
+                print(f"Error searching embedding snapshot, falling back: {str(e)}")
+        
         try:
-            # Get all knowledge items (filter out null embeddings in Python)
-            result = self.client.table("knowledge").select("*").execute()
-            
-            # Calculate similarities manually using numpy
-            import numpy as np
-            
-            filtered_results = []
-            query_vec = np.array(query_embedding)
-            
-            for item in result.data:
-                # Skip items without embeddings
-                if not item.get('embeddings') or item['embeddings'] is None:
-                    continue
-                    
-                try:
-                    # Handle different embedding formats (string vs list)
-                    embeddings = item['embeddings']
-                    if isinstance(embeddings, str):
-                        # If it's a string, try to parse it as JSON
-                        import json
-                        try:
-                            embeddings = json.loads(embeddings)
-                        except json.JSONDecodeError:
-                            print(f"Failed to parse embeddings as JSON for item {item.get('id')}")
-                            continue
-                    
-                    # Convert to numpy array
-                    item_vec = np.array(embeddings, dtype=np.float32)
-                    query_vec_float = np.array(query_vec, dtype=np.float32)
-                    
-                    # Calculate cosine similarity
-                    similarity = np.dot(query_vec_float, item_vec) / (np.linalg.norm(query_vec_float) * np.linalg.norm(item_vec))
-                    
-                    if similarity >= similarity_threshold:
-                        item['similarity'] = float(similarity)
-                        filtered_results.append(item)
-                except Exception as e:
-                    print(f"Error calculating similarity for item {item.get('id')}: {e}")
-                    continue
-            
-            # Sort by similarity descending
-            filtered_results.sort(key=lambda x: x['similarity'], reverse=True)
-            
-            return filtered_results[:limit]
-            
+            # Fallback: get all knowledge items, or only the filtered ones (null embeddings are skipped when scoring)
+            if candidate_ids is None:
+                knowledge = self.client.table("knowledge").select("*").execute().data
+            else:
+                knowledge = self._get_knowledge_by_ids(list(candidate_ids), "*")
+        
+            return self._rank_filtered(
+                lambda count: rank_by_similarity(knowledge, query_embedding, count, similarity_threshold),
+                lambda row: str(row["id"]),
+                limit, filters, candidate_ids
+            )
+        
         except Exception as e:
             print(f"Error in semantic search: {str(e)}")
             return []
@@ -686,83 +1365,29 @@ class Supabase:
         pet_id: str,
         query: str,
         limit: int = 20,
-        similarity_threshold: float = 0.7
+        similarity_threshold: float = 0.7,
+        filters: Optional[KnowledgeFilter] = None
     ) -> List[Dict[str, Any]]:
         """
         Perform semantic search across a specific pet's knowledge.
         """
-        if not self.openai_enabled:
-            raise ValueError("OpenAI is not enabled. Cannot perform semantic search.")
-        
-        query_embedding = self._generate_embedding(query)
+        query_embedding = self.embed_query(query)
         if not query_embedding:
             return []
         
-        # Get all datainstance IDs for this pet
-        instances = self.get_pet_instances(pet_id, limit=1000)
-        instance_ids = [inst["id"] for inst in instances]
-        
-        if not instance_ids:
-            return []
+        matches = self._match_knowledge_rpc(
+            "match_pet_knowledge", query_embedding, limit, similarity_threshold, filters,
+            target_pet_id=pet_id
+        )
+        if matches is not None:
+            return matches
         
         try:
-            # First get knowledge IDs associated with this pet's instances
-            knowledge_relations = self.client.table("datainstance_knowledge").select(
-                "knowledge_id"
-            ).in_("datainstance_id", instance_ids).execute()
-            
-            knowledge_ids = [rel["knowledge_id"] for rel in knowledge_relations.data]
-            
-            if not knowledge_ids:
-                return []
-            
-            # Now search within those knowledge items using vector similarity
-            result = self.client.table("knowledge").select(
-                "*"
-            ).in_(
-                "id", knowledge_ids
-            ).execute()
-            
-            import numpy as np
-            
-            filtered_results = []
-            query_vec = np.array(query_embedding)
-            
-            for item in result.data:
-                # Skip items without embeddings
-                if not item.get('embeddings') or item['embeddings'] is None:
-                    continue
-                    
-                try:
-                    # Handle different embedding formats (string vs list)
-                    embeddings = item['embeddings']
-                    if isinstance(embeddings, str):
-                        # If it's a string, try to parse it as JSON
-                        try:
-                            embeddings = json.loads(embeddings)
-                        except json.JSONDecodeError:
-                            print(f"Failed to parse embeddings as JSON for item {item.get('id')}")
-                            continue
-                    
-                    # Convert to numpy array
-                    item_vec = np.array(embeddings, dtype=np.float32)
-                    query_vec_float = np.array(query_vec, dtype=np.float32)
-                    
-                    # Calculate cosine similarity
-                    similarity = np.dot(query_vec_float, item_vec) / (np.linalg.norm(query_vec_float) * np.linalg.norm(item_vec))
-                    
-                    if similarity >= similarity_threshold:
-                        item['similarity'] = float(similarity)
-                        filtered_results.append(item)
-                except Exception as e:
-                    print(f"Error calculating similarity for item {item.get('id')}: {e}")
-                    continue
-            
-            # Sort by similarity descending
-            filtered_results.sort(key=lambda x: x['similarity'], reverse=True)
-            
-            return filtered_results[:limit]
-            
+            # Fallback: score the pet's knowledge in-process
+            return self._semantic_search_scoped(
+                ("pet", pet_id), "pet_knowledge", query_embedding, limit, similarity_threshold, filters,
+                target_pet_id=pet_id
+            )
         except Exception as e:
             print(f"Error in pet semantic search: {str(e)}")
             return []
@@ -772,96 +1397,303 @@ class Supabase:
         wallet_address: str,
         query: str,
         limit: int = 20,
-        similarity_threshold: float = 0.7
+        similarity_threshold: float = 0.7,
+        filters: Optional[KnowledgeFilter] = None
     ) -> List[Dict[str, Any]]:
         """
         Perform semantic search across all knowledge for a user's pets.
         """
-        if not self.openai_enabled:
-            raise ValueError("OpenAI is not enabled. Cannot perform semantic search.")
+        query_embedding = self.embed_query(query)
+        if not query_embedding:
+            return []
         
-        # Get all user's pets
-        pets = self.get_user_pets(wallet_address)
-        pet_ids = [pet["id"] for pet in pets]
+        matches = self._match_knowledge_rpc(
+            "match_user_knowledge", query_embedding, limit, similarity_threshold, filters,
+            target_wallet_address=wallet_address
+        )
+        if matches is not None:
+            return matches
         
-        if not pet_ids:
+        try:
+            # Fallback: score the knowledge of every pet of the wallet in-process
+            return self._semantic_search_scoped(
+                ("user", wallet_address), "user_knowledge", query_embedding, limit, similarity_threshold, filters,
+                target_wallet_address=wallet_address
+            )
+        except Exception as e:
+            print(f"Error in user semantic search: {str(e)}")
             return []
+    
+    def _match_knowledge_rpc(
+        self,
+        function: str,
+        query_embedding: List[float],
+        limit: int,
+        similarity_threshold: float,
+        filters: Optional[KnowledgeFilter] = None,
+        **scope: Any
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Rank knowledge in Postgres with one of the match_*_knowledge RPCs.
+        
+        With passages enabled the ``*_chunks`` variant runs first, returning the
+        best passage of each item as its ``content``; items without passages are
+        ranked by their document embedding. Filtered searches use
+        ``match_filtered_knowledge`` (migrations/filtered_match_knowledge.sql),
+        which scores only the knowledge matching the filters. Returns None when
+        the RPCs are disabled or fail so callers can fall back to in-process scoring.
+        """
+        if not self.vector_rpc_enabled:
+            return None
         
-        query_embedding = self._generate_embedding(query)
-        if not query_embedding:
+        params = {
+            "query_embedding": query_embedding,
+            "match_threshold": similarity_threshold,
+            "match_count": limit,
+            **scope
+        }
+        if filters and not filters.is_empty():
+            function = "match_filtered_knowledge"
+            params.update(filters.rpc_params())
+        
+        # Prefer the best-passage variant (migrations/knowledge_chunks.sql)
+        functions = [f"{function}_chunks", function] if self.chunks_enabled else [function]
+        for name in functions:
+            try:
+                result = self.client.rpc(name, params).execute()
+                return result.data or []
+            except Exception as e:
+                print(f"Error calling {name}, falling back: {str(e)}")
+        
+        return None
+    
+    def _semantic_search_scoped(
+        self,
+        shard_key: tuple,
+        function: str,
+        query_embedding: List[float],
+        limit: int,
+        similarity_threshold: float,
+        filters: Optional[KnowledgeFilter] = None,
+        **scope: Any
+    ) -> List[Dict[str, Any]]:
+        """
+        Rank the distinct knowledge returned by a scope RPC (``pet_knowledge``/``user_knowledge``).
+        
+        The scope's vectors are loaded once into an in-memory shard, so repeat
+        searches over the same pet or wallet are a single matrix-vector product.
+        With filters, only the shard rows of the matching knowledge are scored.
+        """
+        candidate_ids = self._filter_knowledge_ids(filters, **scope)
+        if candidate_ids is not None and not candidate_ids:
             return []
         
-        # Get all datainstance IDs for all user's pets
-        all_instance_ids = []
-        for pet_id in pet_ids:
-            instances = self.get_pet_instances(pet_id, limit=1000)
-            all_instance_ids.extend([inst["id"] for inst in instances])
+        shard = self.vector_shards.get(
+            shard_key,
+            lambda: self._select_all(lambda: self.client.rpc(function, scope).select("*").order("id"))
+        )
         
-        if not all_instance_ids:
-            return []
+        return self._rank_filtered(
+            lambda count: shard.search(query_embedding, count, similarity_threshold, candidate_ids),
+            lambda row: str(row["id"]),
+            limit, filters, candidate_ids, **scope
+        )
+    
+    def _filter_knowledge_ids(
+        self,
+        filters: Optional[KnowledgeFilter],
+        target_pet_id: Optional[str] = None,
+        target_wallet_address: Optional[str] = None
+    ) -> Optional[Set[str]]:
+        """
+        Ids of the knowledge in scope that match *filters*, or None when there
+        is nothing to filter on or the filters could not be resolved up front.
         
+        Resolved in Postgres by the ``knowledge_filter_ids`` RPC
+        (migrations/filtered_match_knowledge.sql). Filters matching more than
+        ``KNOWLEDGE_FILTER_MAX_IDS`` items, or a missing RPC, return None so the
+        caller ranks unfiltered and post-filters with :meth:`_rank_filtered`.
+        """
+        if not filters or filters.is_empty():
+            return None
+        
+        max_ids = settings.knowledge_filter_max_ids
+        params = {
+            "target_pet_id": target_pet_id,
+            "target_wallet_address": target_wallet_address,
+            **filters.rpc_params()
+        }
         try:
-            # Get knowledge IDs associated with user's instances
-            knowledge_relations = self.client.table("datainstance_knowledge").select(
+            rows = self.client.rpc("knowledge_filter_ids", params).select(
                 "knowledge_id"
-            ).in_("datainstance_id", all_instance_ids).execute()
-            
-            knowledge_ids = [rel["knowledge_id"] for rel in knowledge_relations.data]
-            
-            if not knowledge_ids:
-                return []
-            
-            # Search within those knowledge items
-            result = self.client.table("knowledge").select(
-                "*"
-            ).in_(
-                "id", knowledge_ids
-            ).execute()
-            
-            import numpy as np
-            
-            filtered_results = []
-            query_vec = np.array(query_embedding)
-            
-            for item in result.data:
-                # Skip items without embeddings
-                if not item.get('embeddings') or item['embeddings'] is None:
-                    continue
-                    
-                try:
-                    # Handle different embedding formats (string vs list)
-                    embeddings = item['embeddings']
-                    if isinstance(embeddings, str):
-                        # If it's a string, try to parse it as JSON
-                        try:
-                            embeddings = json.loads(embeddings)
-                        except json.JSONDecodeError:
-                            print(f"Failed to parse embeddings as JSON for item {item.get('id')}")
-                            continue
-                    
-                    # Convert to numpy array
-                    item_vec = np.array(embeddings, dtype=np.float32)
-                    query_vec_float = np.array(query_vec, dtype=np.float32)
-                    
-                    # Calculate cosine similarity
-                    similarity = np.dot(query_vec_float, item_vec) / (np.linalg.norm(query_vec_float) * np.linalg.norm(item_vec))
-                    
-                    if similarity >= similarity_threshold:
-                        item['similarity'] = float(similarity)
-                        filtered_results.append(item)
-                except Exception as e:
-                    print(f"Error calculating similarity for item {item.get('id')}: {e}")
-                    continue
-            
-            # Sort by similarity descending
-            filtered_results.sort(key=lambda x: x['similarity'], reverse=True)
+            ).limit(max_ids + 1).execute().data
+        except Exception as e:
+            print(f"Error calling knowledge_filter_ids, post-filtering instead: {str(e)}")
+            return None
+        
+        if len(rows) > max_ids:
+            return None
+        return {str(row["knowledge_id"]) for row in rows}
+    
+    def _rank_filtered(
+        self,
+        rank: Callable[[int], List[Any]],
+        row_id: Callable[[Any], str],
+        limit: int,
+        filters: Optional[KnowledgeFilter],
+        candidate_ids: Optional[Set[str]],
+        **scope: Any
+    ) -> List[Any]:
+        """
+        Best *limit* results of ``rank(count)``, a best-first ranking of up to
+        *count* results, that match *filters*.
+        
+        When the filters were resolved to *candidate_ids* (or there are none)
+        the ranking already only sees matching knowledge and runs once.
+        Otherwise it is over-fetched by ``KNOWLEDGE_FILTER_OVERFETCH`` and
+        post-filtered, growing the over-fetch until *limit* matches are found,
+        the ranking runs out, or ``KNOWLEDGE_FILTER_MAX_IDS`` results were checked.
+        """
+        if candidate_ids is not None or not filters or filters.is_empty():
+            return rank(limit)
+        
+        max_ids = settings.knowledge_filter_max_ids
+        count = limit * settings.knowledge_filter_overfetch
+        checked: Set[str] = set()
+        matching: Set[str] = set()
+        while True:
+            ranked = rank(count)
+            unchecked = [row_id(result) for result in ranked if row_id(result) not in checked]
+            matching |= self._matching_knowledge_ids(unchecked, filters, **scope)
+            checked.update(unchecked)
             
-            return filtered_results[:limit]
+            kept = [result for result in ranked if row_id(result) in matching]
+            if len(kept) >= limit or len(ranked) < count or count >= max_ids:
+                return kept[:limit]
+            count = min(count * 4, max_ids)
+    
+    def _matching_knowledge_ids(
+        self,
+        knowledge_ids: List[str],
+        filters: KnowledgeFilter,
+        target_pet_id: Optional[str] = None,
+        target_wallet_address: Optional[str] = None
+    ) -> Set[str]:
+        """
+        The subset of *knowledge_ids* attached to an instance in scope that matches *filters*.
+        
+        Checks the links of the given ids only, filtering on the embedded
+        datainstance (and knowledge row for ``created_after``), in batches that
+        keep the ``in_`` filter under URL limits.
+        """
+        instance_columns = "id"
+        if target_wallet_address:
+            instance_columns += ", pet:pet_id!inner(owner_wallet)"
+        columns = f"knowledge_id, datainstance:datainstance_id!inner({instance_columns})"
+        if filters.created_after:
+            columns += ", knowledge:knowledge_id!inner(created_at)"
+        
+        def build_query(batch: List[str]) -> Any:
+            query = self.client.table("datainstance_knowledge").select(columns).in_("knowledge_id", batch)
+            if target_pet_id:
+                query = query.eq("datainstance.pet_id", target_pet_id)
+            if target_wallet_address:
+                query = query.eq("datainstance.pet.owner_wallet", target_wallet_address)
+            if filters.category:
+                query = query.eq("datainstance.category", filters.category)
+            if filters.tags:
+                query = query.contains("datainstance.tags", filters.tags)
+            if filters.content_type:
+                query = query.eq("datainstance.content_type", filters.content_type)
+            if filters.created_after:
+                query = query.gte("knowledge.created_at", filters.created_after.isoformat())
+            return query.order("knowledge_id").order("datainstance_id")
+        
+        matching: Set[str] = set()
+        for start in range(0, len(knowledge_ids), 100):
+            batch = knowledge_ids[start:start + 100]
+            matching.update(
+                str(row["knowledge_id"]) for row in self._select_all(lambda: build_query(batch))
+            )
+        return matching
+    
+    def _get_knowledge_by_ids(self, knowledge_ids: List[str], columns: str) -> List[Dict[str, Any]]:
+        """Fetch knowledge rows by id, batching the ``in_`` filter to stay under URL limits."""
+        rows: List[Dict[str, Any]] = []
+        for start in range(0, len(knowledge_ids), 100):
+            batch = knowledge_ids[start:start + 100]
+            rows.extend(self.client.table("knowledge").select(columns).in_("id", batch).execute().data)
+        return rows
+    
+    def _search_embedding_snapshot(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        similarity_threshold: float,
+        nprobe: int = 0,
+        candidate_ids: Optional[Set[str]] = None,
+        filters: Optional[KnowledgeFilter] = None
+    ) -> List[Dict[str, Any]]:
+        """Rank all (or the *candidate_ids*) knowledge against the memory-mapped snapshot, then fetch only the matching rows."""
+        self._refresh_embedding_snapshot()
+        
+        matches = self._rank_filtered(
+            lambda count: self.embedding_snapshot.search(
+                query_embedding, count, similarity_threshold,
+                rerank_factor=settings.quantized_rerank_factor, nprobe=nprobe, candidate_ids=candidate_ids
+            ),
+            lambda match: match[0],
+            limit, filters, candidate_ids
+        )
+        if not matches:
+            return []
+        
+        knowledge = self._get_knowledge_by_ids(
+            [row_id for row_id, _ in matches],
+            "id, url, title, content, content_hash, metadata, created_at"
+        )
+        
+        rows = {str(row["id"]): row for row in knowledge}
+        return [
+            {**rows[row_id], "similarity": similarity}
+            for row_id, similarity in matches
+            if row_id in rows
+        ]
+    
+    def _refresh_embedding_snapshot(self) -> None:
+        """Pull knowledge created since the snapshot watermark, at most once per refresh interval."""
+        if time.monotonic() - self._snapshot_refreshed_at < settings.embedding_snapshot_refresh_seconds:
+            return
+        # Another thread is already refreshing; search what is there
+        if not self._snapshot_refresh_lock.acquire(blocking=False):
+            return
+        try:
+            for page in self.iter_knowledge_embeddings(after=self.embedding_snapshot.watermark):
+                self.embedding_snapshot.apply(page)
+            self._snapshot_refreshed_at = time.monotonic()
+        except Exception as e:
+            print(f"Error refreshing embedding snapshot: {str(e)}")
+        finally:
+            self._snapshot_refresh_lock.release()
+    
+    def _update_vector_shards(self, datainstance_id: str, knowledge: List[Dict[str, Any]]) -> None:
+        """Fold newly stored knowledge into the resident shards of the instance's pet and owner."""
+        # A load in flight must see this write too, or it would cache a shard missing it
+        if self.vector_shards.is_idle() or not knowledge:
+            return
+        
+        try:
+            instance = self.client.table("datainstances").select("pet_id").eq("id", datainstance_id).execute()
+            if not instance.data:
+                return
+            pet = self.get_pet(instance.data[0]["pet_id"])
+            if not pet:
+                return
             
+            self.vector_shards.add(("pet", pet["id"]), knowledge)
+            self.vector_shards.add(("user", pet["owner_wallet"]), knowledge)
         except Exception as e:
-            print(f"Error in user semantic search: {str(e)}")
-            return []
-
+            print(f"Error updating vector shards: {str(e)}")
 
 # Example usage for testing
 if __name__ == "__main__":
@@ -0,0 +1,199 @@
+from collections import OrderedDict
+from typing import List, Dict, Any, Callable, Hashable, Optional, Sequence, Set
+import threading
+import time
+
+import numpy as np
+
+from .similarity import EmbeddingMatrix
+
+# Rough per-row overhead of the dict kept next to each vector
+_ITEM_OVERHEAD_BYTES = 256
+
+
+def _item_bytes(item: Dict[str, Any]) -> int:
+    return _ITEM_OVERHEAD_BYTES + sum(len(value) for value in item.values() if isinstance(value, str))
+
+
+class VectorShard:
+    """
+    Normalized float32 embeddings of one scope (a pet, or a wallet's pets).
+
+    Rows are kept without their ``embeddings`` field, since the vector lives
+    in the matrix. Updates build new arrays and swap them in, so a search that
+    already holds the old ones is unaffected.
+    """
+
+    def __init__(self, items: List[Dict[str, Any]]):
+        matrix = EmbeddingMatrix.from_items(items)
+        self.vectors = matrix.vectors
+        self.items = [self._strip(item) for item in matrix.items]
+        self.positions = {str(item["id"]): i for i, item in enumerate(self.items)}
+        self.nbytes = self.vectors.nbytes + sum(_item_bytes(item) for item in self.items)
+        self.loaded_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    @staticmethod
+    def _strip(item: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in item.items() if key != "embeddings"}
+
+    def add(self, items: List[Dict[str, Any]]) -> int:
+        """Insert or replace rows by ``id``; returns how many vectors were written."""
+        update = EmbeddingMatrix.from_items(items)
+        if not len(update):
+            return 0
+        if len(self) and update.vectors.shape[1] != self.vectors.shape[1]:
+            print(f"Skipping shard update with embedding dimension {update.vectors.shape[1]} != {self.vectors.shape[1]}")
+            return 0
+
+        vectors = self.vectors.copy() if len(self) else np.empty((0, update.vectors.shape[1]), dtype=np.float32)
+        rows = list(self.items)
+        positions = dict(self.positions)
+        appended = []
+
+        for vector, item in zip(update.vectors, update.items):
+            item = self._strip(item)
+            row_id = str(item["id"])
+            if row_id in positions:
+                vectors[positions[row_id]] = vector
+                rows[positions[row_id]] = item
+            else:
+                positions[row_id] = len(rows)
+                rows.append(item)
+                appended.append(vector)
+
+        if appended:
+            vectors = np.ascontiguousarray(np.vstack([vectors, np.asarray(appended, dtype=np.float32)]))
+
+        self.vectors, self.items, self.positions = vectors, rows, positions
+        self.nbytes = self.vectors.nbytes + sum(_item_bytes(item) for item in self.items)
+        return len(update)
+
+    def search(
+        self,
+        query_embedding: Sequence[float],
+        limit: int = 20,
+        similarity_threshold: float = 0.0,
+        candidate_ids: Optional[Set[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Top rows as copies carrying a ``similarity`` key, optionally only among *candidate_ids*."""
+        vectors, items, positions = self.vectors, self.items, self.positions
+        if candidate_ids is not None:
+            rows = sorted(positions[row_id] for row_id in candidate_ids if row_id in positions)
+            vectors, items = vectors[rows], [items[row] for row in rows]
+        matches = EmbeddingMatrix(vectors, items).search(query_embedding, limit, similarity_threshold)
+        return [{**items[index], "similarity": similarity} for index, similarity in matches]
+
+
+class VectorShardCache:
+    """
+    LRU of :class:`VectorShard` keyed by scope, bounded by a memory budget.
+
+    Shards are built lazily by the caller-supplied loader on first search and
+    evicted least-recently-used first once their combined size exceeds
+    ``max_bytes``. A shard larger than the whole budget is returned but not kept,
+    and so is one whose load overlapped a write, since it may have missed it.
+
+    :meth:`add` only sees writes made through this process, so a shard is
+    reloaded once it is ``ttl`` seconds old; that bounds how long writes,
+    updates and deletes from other workers stay invisible.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, ttl: float = 300.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._shards: "OrderedDict[Hashable, VectorShard]" = OrderedDict()
+        self._bytes = 0
+        self._writes = 0
+        self._loading = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.updates = 0
+
+    def __len__(self) -> int:
+        return len(self._shards)
+
+    def get(self, key: Hashable, loader: Callable[[], List[Dict[str, Any]]]) -> VectorShard:
+        """Return the shard for *key*, building it from ``loader()`` on a miss."""
+        with self._lock:
+            shard = self._shards.get(key)
+            if shard is not None and time.monotonic() - shard.loaded_at >= self.ttl:
+                del self._shards[key]
+                self._bytes -= shard.nbytes
+                self.expirations += 1
+                shard = None
+            if shard is not None:
+                self._shards.move_to_end(key)
+                self.hits += 1
+                return shard
+            self.misses += 1
+            writes = self._writes
+            self._loading += 1
+
+        # Load outside the lock so other scopes keep serving while this one builds
+        try:
+            shard = VectorShard(loader())
+        except BaseException:
+            with self._lock:
+                self._loading -= 1
+            raise
+
+        with self._lock:
+            self._loading -= 1
+            if key not in self._shards and writes == self._writes:
+                self._store(key, shard)
+        return shard
+
+    def is_idle(self) -> bool:
+        """True when no shard is resident or loading, so writes need not be reported to :meth:`add`."""
+        with self._lock:
+            return not self._shards and not self._loading
+
+    def add(self, key: Hashable, items: List[Dict[str, Any]]) -> None:
+        """Fold newly written rows into the shard for *key* if it is resident."""
+        with self._lock:
+            self._writes += 1
+            shard = self._shards.get(key)
+            if shard is None:
+                return
+            self._bytes -= shard.nbytes
+            self.updates += shard.add(items)
+            self._bytes += shard.nbytes
+            self._evict()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current memory use."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "incremental_updates": self.updates,
+                "shards": len(self._shards),
+                "vectors": sum(len(shard) for shard in self._shards.values()),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+            }
+
+    def _store(self, key: Hashable, shard: VectorShard) -> None:
+        if shard.nbytes > self.max_bytes:
+            return
+        self._shards[key] = shard
+        self._bytes += shard.nbytes
+        self._evict()
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._shards:
+            _, shard = self._shards.popitem(last=False)
+            self._bytes -= shard.nbytes
+            self.evictions += 1
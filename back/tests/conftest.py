@@ -0,0 +1,4 @@
+import os
+
+# Keep imports of src offline: litellm would otherwise fetch its model cost map
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
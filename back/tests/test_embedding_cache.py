@@ -0,0 +1,30 @@
+from src.services.storage.embedding_cache import EmbeddingCache
+
+
+def test_disk_tier_is_trimmed_by_least_recent_use(tmp_path):
+    path = str(tmp_path / "embeddings.db")
+    cache = EmbeddingCache(max_entries=0, path=path, max_disk_entries=3)
+
+    for text in ("a", "b", "c"):
+        cache.set("model", text, [1.0, 2.0])
+    cache.set("model", "a", [1.0, 2.0])  # replacing an entry does not grow the table
+    assert cache.stats()["disk_entries"] == 3
+
+    assert cache.get("model", "b") == [1.0, 2.0]  # "c" is now the least recently used
+    cache.set("model", "d", [3.0, 4.0])
+    assert cache.stats()["disk_entries"] == 3
+    assert cache.get("model", "c") is None
+    assert cache.get("model", "d") == [3.0, 4.0]
+
+
+def test_disk_entries_are_counted_on_reopen(tmp_path):
+    path = str(tmp_path / "embeddings.db")
+    cache = EmbeddingCache(path=path, max_disk_entries=2)
+    for text in ("a", "b"):
+        cache.set("model", text, [1.0])
+
+    reopened = EmbeddingCache(max_entries=0, path=path, max_disk_entries=2)
+    assert reopened.stats()["disk_entries"] == 2
+    reopened.set("model", "c", [1.0])
+    assert reopened.stats()["disk_entries"] == 2
+    assert reopened.get("model", "a") is None
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+from src.services.storage.schemas import Knowledge
+from src.services.storage.supabase import Supabase
+
+
+class KnowledgeTable:
+    """Fails selects of ``embedding_model`` like PostgREST does before the migration."""
+
+    def __init__(self, has_column, error="column knowledge.embedding_model does not exist"):
+        self.has_column = has_column
+        self.error = error
+        self.probes = 0
+
+    def table(self, name):
+        return self
+
+    def select(self, columns):
+        self.columns = columns
+        return self
+
+    def limit(self, count):
+        return self
+
+    def execute(self):
+        self.probes += 1
+        if "embedding_model" in self.columns and not self.has_column:
+            raise RuntimeError(self.error)
+        return type("Response", (), {"data": []})()
+
+
+class ColumnStorage(Supabase):
+    def __init__(self, client):
+        self.client = client
+        self._embedding_model_column = None
+        self.upserts = []
+
+    def _bulk_upsert(self, table, rows, on_conflict, key):
+        self.upserts.append((table, rows))
+        return [{**row, "id": str(n)} for n, row in enumerate(rows)]
+
+
+def store(storage):
+    knowledge = Knowledge(content="hello", created_at=datetime(2024, 1, 1))
+    storage._store_knowledge_rows("instance", [knowledge], [[0.1, 0.2]])
+    return storage.upserts[0][1][0]
+
+
+def test_missing_column_is_not_written():
+    storage = ColumnStorage(KnowledgeTable(has_column=False))
+
+    assert not storage._has_embedding_model_column()
+    assert not storage._has_embedding_model_column()
+    assert storage.client.probes == 1
+    row = store(storage)
+    assert row["embeddings"] == [0.1, 0.2]
+    assert "embedding_model" not in row
+
+
+def test_present_column_is_written():
+    storage = ColumnStorage(KnowledgeTable(has_column=True))
+
+    assert storage._has_embedding_model_column()
+    assert store(storage)["embedding_model"]
+
+
+def test_transient_errors_are_probed_again():
+    storage = ColumnStorage(KnowledgeTable(has_column=False, error="connection reset"))
+
+    assert not storage._has_embedding_model_column()
+    storage.client.has_column = True
+    assert storage._has_embedding_model_column()
@@ -0,0 +1,105 @@
+from src.config import settings
+from src.services.storage.schemas import KnowledgeFilter
+from src.services.storage.supabase import Supabase
+
+
+class FakeStorage(Supabase):
+    """Only the post-filtering helpers; link lookups come from *matching*."""
+
+    def __init__(self, matching, rpc_error=False, rpc_rows=()):
+        self.matching = set(matching)
+        self.checked = []
+        self.rpc_error = rpc_error
+        self.rpc_rows = list(rpc_rows)
+
+    def _matching_knowledge_ids(self, knowledge_ids, filters, **scope):
+        self.checked.append(list(knowledge_ids))
+        return {knowledge_id for knowledge_id in knowledge_ids if knowledge_id in self.matching}
+
+
+def ranking(size):
+    ids = [f"k{n}" for n in range(size)]
+    calls = []
+
+    def rank(count):
+        calls.append(count)
+        return [{"id": knowledge_id} for knowledge_id in ids[:count]]
+
+    return rank, calls
+
+
+def test_broad_filters_are_post_filtered_with_over_fetch(monkeypatch):
+    monkeypatch.setattr(settings, "knowledge_filter_overfetch", 4)
+    storage = FakeStorage(matching={"k1", "k3", "k5", "k7"})
+    rank, calls = ranking(100)
+
+    results = storage._rank_filtered(rank, lambda row: row["id"], 2, KnowledgeFilter(category="notes"), None)
+
+    assert [row["id"] for row in results] == ["k1", "k3"]
+    assert calls == [8]
+
+
+def test_over_fetch_grows_until_enough_matches(monkeypatch):
+    monkeypatch.setattr(settings, "knowledge_filter_overfetch", 2)
+    monkeypatch.setattr(settings, "knowledge_filter_max_ids", 1000)
+    storage = FakeStorage(matching={"k10", "k30"})
+    rank, calls = ranking(100)
+
+    results = storage._rank_filtered(rank, lambda row: row["id"], 2, KnowledgeFilter(tags=["a"]), None)
+
+    assert [row["id"] for row in results] == ["k10", "k30"]
+    assert calls == [4, 16, 64]
+    # Each id is only checked once across rounds
+    assert sum(len(batch) for batch in storage.checked) == 64
+
+
+def test_resolved_candidates_rank_once():
+    storage = FakeStorage(matching=set())
+    rank, calls = ranking(10)
+
+    results = storage._rank_filtered(rank, lambda row: row["id"], 3, KnowledgeFilter(category="x"), {"k0"})
+
+    assert len(results) == 3
+    assert calls == [3]
+    assert storage.checked == []
+
+
+class FailingRpc:
+    def rpc(self, *args, **kwargs):
+        raise RuntimeError("function knowledge_filter_ids does not exist")
+
+
+def test_missing_rpc_falls_back_to_post_filtering():
+    storage = FakeStorage(matching=set())
+    storage.client = FailingRpc()
+    assert storage._filter_knowledge_ids(KnowledgeFilter(category="notes")) is None
+
+
+class RowsRpc:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def rpc(self, *args, **kwargs):
+        return self
+
+    def select(self, *args):
+        return self
+
+    def limit(self, count):
+        self.rows = self.rows[:count]
+        return self
+
+    def execute(self):
+        return type("Response", (), {"data": self.rows})()
+
+
+def test_filters_over_the_cap_are_not_rejected(monkeypatch):
+    monkeypatch.setattr(settings, "knowledge_filter_max_ids", 3)
+    storage = FakeStorage(matching=set())
+    filters = KnowledgeFilter(category="notes")
+
+    storage.client = RowsRpc([{"knowledge_id": f"k{n}"} for n in range(3)])
+    assert storage._filter_knowledge_ids(filters) == {"k0", "k1", "k2"}
+
+    storage.client = RowsRpc([{"knowledge_id": f"k{n}"} for n in range(10)])
+    assert storage._filter_knowledge_ids(filters) is None
@@ -0,0 +1,39 @@
+from src.services.storage.fusion import reciprocal_rank_fusion
+
+
+def ids(rows):
+    return [row["id"] for row in rows]
+
+
+def test_rows_found_by_both_retrievers_rank_first():
+    rankings = {
+        "vector": [{"id": "a", "similarity": 0.9}, {"id": "b", "similarity": 0.8}, {"id": "c", "similarity": 0.7}],
+        "keyword": [{"id": "c", "rank": 2.0}, {"id": "d", "rank": 1.5}, {"id": "a", "rank": 1.0}],
+    }
+    fused = reciprocal_rank_fusion(rankings, k=60)
+
+    # a and c (1/61 + 1/63, first-seen order on the tie) beat b and d (1/62 each)
+    assert ids(fused)[:2] == ["a", "c"]
+    assert set(ids(fused)[2:]) == {"b", "d"}
+    assert fused[0]["ranks"] == {"vector": 1, "keyword": 3}
+    assert fused[0]["rrf_score"] == 1 / 61 + 1 / 63
+
+
+def test_fields_are_merged_and_limit_applies():
+    rankings = {
+        "vector": [{"id": 1, "similarity": 0.9}],
+        "keyword": [{"id": 1, "rank": 0.3}, {"id": 2, "rank": 0.2}],
+    }
+    fused = reciprocal_rank_fusion(rankings, limit=1)
+    assert len(fused) == 1
+    assert fused[0]["similarity"] == 0.9
+    assert fused[0]["rank"] == 0.3
+
+
+def test_weights_change_the_order():
+    rankings = {
+        "vector": [{"id": "a"}, {"id": "b"}],
+        "keyword": [{"id": "b"}, {"id": "a"}],
+    }
+    assert ids(reciprocal_rank_fusion(rankings, weights={"keyword": 2.0})) == ["b", "a"]
+    assert ids(reciprocal_rank_fusion(rankings, weights={"vector": 2.0})) == ["a", "b"]
@@ -0,0 +1,43 @@
+import numpy as np
+
+from src.services.storage.ivf import IVFIndex, assign_lists, train_centroids
+from src.services.storage.similarity import normalize_rows, top_k_indices
+
+
+def clustered_vectors(clusters=16, per_cluster=200, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    points = np.repeat(centers, per_cluster, axis=0) + 0.3 * rng.standard_normal((clusters * per_cluster, dim))
+    return normalize_rows(points.astype(np.float32))
+
+
+def build_index(vectors, n_lists):
+    centroids = train_centroids(vectors, n_lists)
+    return IVFIndex(centroids, assign_lists(vectors, centroids))
+
+
+def recall_at(index, vectors, queries, nprobe, k=10):
+    found = 0
+    for query in queries:
+        exact = set(top_k_indices(vectors @ query, k).tolist())
+        rows = index.probe(query, nprobe)
+        approx = set(rows[top_k_indices(vectors[rows] @ query, k)].tolist())
+        found += len(exact & approx)
+    return found / (k * len(queries))
+
+
+def test_every_row_is_in_exactly_one_list():
+    vectors = clustered_vectors()
+    index = build_index(vectors, 16)
+    assert index.list_sizes().sum() == len(vectors)
+    assert np.array_equal(index.probe(vectors[0], index.n_lists), np.arange(len(vectors)))
+
+
+def test_recall_against_brute_force():
+    vectors = clustered_vectors()
+    index = build_index(vectors, 16)
+    queries = vectors[np.random.default_rng(1).choice(len(vectors), 50, replace=False)]
+
+    assert recall_at(index, vectors, queries, nprobe=16) == 1.0
+    assert recall_at(index, vectors, queries, nprobe=4) >= 0.95
+    assert len(index.probe(queries[0], 4)) < len(vectors) / 2
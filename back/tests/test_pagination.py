@@ -0,0 +1,80 @@
+import base64
+import json
+
+import pytest
+
+from src.services.storage.pagination import (
+    decode_cursor,
+    decode_search_cursor,
+    encode_cursor,
+    next_cursor,
+    next_search_cursor,
+)
+
+ROW_ID = "6f1c1b0e-2f4a-4c1e-9a53-0d7c6b1f0a42"
+
+
+def raw_cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    row = {"created_at": "2024-05-01T12:34:56.789012+00:00", "id": ROW_ID}
+    assert decode_cursor(encode_cursor(row)) == (row["created_at"], ROW_ID)
+
+
+def test_next_cursor_only_after_full_page():
+    rows = [{"created_at": "2024-05-01T00:00:00+00:00", "id": ROW_ID}] * 2
+    assert next_cursor(rows, limit=3) is None
+    assert decode_cursor(next_cursor(rows, limit=2)) == ("2024-05-01T00:00:00+00:00", ROW_ID)
+
+
+def test_search_cursor_round_trip():
+    results = {
+        "datainstances": [{"rank": 0.5, "id": ROW_ID}],
+        "knowledge": [],
+    }
+    assert decode_search_cursor(next_search_cursor(results, limit=1)) == {"datainstances": (0.5, ROW_ID)}
+
+
+def test_empty_cursor_is_none():
+    assert decode_cursor(None) is None
+    assert decode_cursor("") is None
+    assert decode_search_cursor(None) is None
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64 !!",
+    raw_cursor({"created_at": "2024-05-01T00:00:00+00:00"}),
+    raw_cursor(["2024-05-01T00:00:00+00:00"]),
+    # Filter injection through either value
+    raw_cursor(["2024-05-01T00:00:00+00:00", f"{ROW_ID},id.neq.x"]),
+    raw_cursor(['2024-05-01",id.neq.x,created_at.eq."2024', ROW_ID]),
+    raw_cursor(["yesterday", ROW_ID]),
+    raw_cursor([20240501, ROW_ID]),
+    raw_cursor(["2024-05-01T00:00:00+00:00", None]),
+])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize("payload", [
+    ["knowledge"],
+    {"knowledge": [0.5, "x),id.neq.(y"]},
+    {"knowledge": ["0.5", ROW_ID]},
+    {"knowledge": [True, ROW_ID]},
+    {"knowledge": [0.5]},
+])
+def test_malformed_search_cursor_is_rejected(payload):
+    with pytest.raises(ValueError):
+        decode_search_cursor(raw_cursor(payload))
+
+
+def test_rejected_cursor_is_a_400():
+    from fastapi import HTTPException
+    from src.routes.storage import _parse_cursor
+
+    with pytest.raises(HTTPException) as error:
+        _parse_cursor(raw_cursor(["2024-05-01T00:00:00+00:00", f"{ROW_ID},id.neq.x"]))
+    assert error.value.status_code == 400
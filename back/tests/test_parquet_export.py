@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta, timezone
+
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.services.export.parquet import (
+    EMBEDDING_DIM,
+    GAME_SESSION_SCHEMA,
+    SESSION_PARTITIONS,
+    ParquetExporter,
+    PartitionedParquetWriter,
+)
+
+PAGE_SIZE = 100
+
+
+class FakeStorage:
+    """Serves one pet's instances, one per day, in export pages like Supabase.iter_pet_export_pages."""
+
+    def __init__(self, instances: int):
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self.instances = [
+            {
+                "id": f"i{n}",
+                "pet_id": "pet",
+                "category": "general" if n % 2 else "science",
+                "created_at": (start + timedelta(days=n)).isoformat(),
+                "content": f"content {n}",
+                "content_type": "text",
+                "metadata": {},
+                "knowledge": [{
+                    "id": f"k{n}",
+                    "url": f"https://example.com/{n}",
+                    "title": "t",
+                    "content": "c",
+                    "created_at": (start + timedelta(days=n)).isoformat(),
+                    "embeddings": [0.1] * EMBEDDING_DIM,
+                }],
+                "images": [],
+            }
+            for n in range(instances)
+        ]
+        self.written_before_page = []
+
+    def get_pet(self, pet_id):
+        return {"id": pet_id}
+
+    def iter_pet_export_pages(self, pet_id, page_size=None, include_embeddings=False):
+        for start in range(0, len(self.instances), PAGE_SIZE):
+            yield self.instances[start:start + PAGE_SIZE]
+
+
+def test_row_groups_span_export_pages(tmp_path):
+    storage = FakeStorage(2000)
+    exporter = ParquetExporter(storage, row_group_size=500)
+    writers = exporter._instance_writers(tmp_path)
+
+    pages = storage.iter_pet_export_pages
+    seen = []
+
+    def recording_pages(*args, **kwargs):
+        for page in pages(*args, **kwargs):
+            seen.append(writers["knowledge"].rows_written)
+            yield page
+
+    storage.iter_pet_export_pages = recording_pages
+    exporter._write_pet("pet", writers)
+
+    # Pages of 100 rows are written every 500 rows, not as they arrive
+    assert seen == [n // 500 * 500 for n in range(0, 2000, PAGE_SIZE)]
+    assert writers["knowledge"].rows_written == 2000
+    assert writers["knowledge"].peak_buffered_rows <= 500
+    assert len(writers["knowledge"]._writers) <= writers["knowledge"].max_open_files
+
+
+def test_export_round_trips_with_bounded_open_files(tmp_path):
+    manifest = ParquetExporter(FakeStorage(300)).export_pet("pet", str(tmp_path))
+
+    knowledge = manifest["datasets"]["knowledge"]
+    assert knowledge["rows"] == 300
+    assert len(knowledge["files"]) == 300
+
+    table = ds.dataset(tmp_path / "knowledge", partitioning="hive").to_table()
+    assert table.num_rows == 300
+    assert sorted(table.column("id").to_pylist()) == sorted(f"k{n}" for n in range(300))
+    assert len(table.column("embeddings")[0]) == EMBEDDING_DIM
+
+
+def test_large_input_is_flushed_every_row_group(tmp_path):
+    writer = PartitionedParquetWriter(
+        tmp_path, GAME_SESSION_SCHEMA, SESSION_PARTITIONS, row_group_size=50, max_open_files=3
+    )
+    rows = (
+        {"id": str(n), "game_type": f"game{n % 5}", "date": "2024-01-01", "session": "{}"}
+        for n in range(1000)
+    )
+    writer.write(rows)
+
+    assert writer.peak_buffered_rows == 50
+    assert writer.rows_written == 1000
+    writer.write({"id": str(n), "game_type": "game0", "date": "2024-01-02", "session": "{}"} for n in range(10))
+    # Partial row groups carry over to the next write
+    assert writer.rows_written == 1000
+    assert writer.rows_written == 1000
+    assert len(writer._writers) <= 3
+
+    files = writer.close()
+    assert writer.rows_written == 1010
+    assert ds.dataset(tmp_path, partitioning="hive").count_rows() == 1010
+    # Evicted partitions reopened as new part files
+    assert any(path.endswith("part-1.parquet") for path in files)
+
+
+def test_small_writes_share_a_row_group(tmp_path):
+    writer = PartitionedParquetWriter(tmp_path, GAME_SESSION_SCHEMA, SESSION_PARTITIONS, row_group_size=50)
+    for page in range(3):
+        writer.write(
+            {"id": f"{page}-{n}", "game_type": "game", "date": "2024-01-01", "session": "{}"}
+            for n in range(10)
+        )
+    assert writer.rows_written == 0
+
+    [path] = writer.close()
+    metadata = pq.ParquetFile(path).metadata
+    assert metadata.num_row_groups == 1
+    assert metadata.num_rows == 30
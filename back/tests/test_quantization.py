@@ -0,0 +1,49 @@
+import numpy as np
+
+from src.services.storage.quantization import QuantizedVectors, fit_pca, quantize
+from src.services.storage.similarity import normalize_rows, normalize_vector
+
+
+def vectors(count=500, dim=64, seed=0):
+    return normalize_rows(np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32))
+
+
+def test_dequantized_values_are_within_half_a_step():
+    values = vectors()
+    codes, scales = quantize(values)
+
+    assert codes.dtype == np.int8
+    assert np.abs(codes).max() <= 127
+    error = np.abs(codes * scales[:, None] - values)
+    assert np.all(error <= scales[:, None] / 2 + 1e-6)
+
+
+def test_scores_are_within_the_quantization_bound():
+    values = vectors()
+    codes, scales = quantize(values)
+    query = normalize_vector(np.random.default_rng(1).standard_normal(64))
+
+    approx = QuantizedVectors(codes, scales).scores(query)
+    exact = values @ query
+    # Each element is off by at most scale / 2, so the dot product by scale / 2 * |q|_1
+    bound = scales / 2 * np.abs(query).sum() + 1e-5
+    assert np.all(np.abs(approx - exact) <= bound)
+
+
+def test_scores_of_selected_rows():
+    values = vectors()
+    quantized = QuantizedVectors(*quantize(values))
+    query = values[0]
+    rows = np.array([0, 10, 20])
+    assert np.allclose(quantized.scores(query, rows), quantized.scores(query)[rows])
+
+
+def test_full_rank_pca_preserves_scores():
+    values = vectors(dim=16)
+    mean, components = fit_pca(values, 16)
+    quantized = QuantizedVectors(*quantize(values, mean, components), mean, components)
+    query = values[3]
+
+    approx = quantized.scores(query)
+    assert np.abs(approx - values @ query).max() < 0.05
+    assert int(np.argmax(approx)) == 3
@@ -0,0 +1,39 @@
+import pytest
+
+from src.scraper.cache import canonicalize_url
+
+
+@pytest.mark.parametrize("variant", [
+    "https://example.com/docs/page",
+    "HTTPS://Example.COM/docs/page",
+    "https://example.com:443/docs/page",
+    "https://example.com/docs/page/",
+    "https://example.com//docs/./guide/../page",
+    "https://example.com/docs/page#section",
+    "https://example.com/docs/page?utm_source=news&utm_medium=email",
+    "https://example.com/docs/page?fbclid=abc",
+    "  https://example.com./docs/page  ",
+])
+def test_equivalent_urls_share_a_key(variant):
+    assert canonicalize_url(variant) == "https://example.com/docs/page"
+
+
+def test_query_is_sorted_and_kept():
+    assert canonicalize_url("https://example.com/search?q=cats&page=2&utm_campaign=x") == \
+        canonicalize_url("https://example.com/search?page=2&q=cats")
+
+
+def test_host_specific_tracking_params():
+    assert canonicalize_url("https://x.com/user/status/1?s=20&t=abc") == "https://x.com/user/status/1"
+    # The same parameter names are meaningful elsewhere
+    assert canonicalize_url("https://example.com/?s=20") == "https://example.com/?s=20"
+
+
+@pytest.mark.parametrize("a, b", [
+    ("https://example.com/page", "http://example.com/page"),
+    ("https://example.com:8443/page", "https://example.com/page"),
+    ("https://example.com/page?id=1", "https://example.com/page?id=2"),
+    ("https://example.com/Page", "https://example.com/page"),
+])
+def test_different_urls_keep_different_keys(a, b):
+    assert canonicalize_url(a) != canonicalize_url(b)
@@ -0,0 +1,133 @@
+import pytest
+import requests
+from notte_core.errors.base import NotteTimeoutError
+
+from src.scraper import guard
+from src.scraper.guard import (
+    BREAKER_CLOSED, BREAKER_HALF_OPEN, BREAKER_OPEN, CircuitBreaker, ScrapeGuard, TokenBucket, is_backend_failure
+)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.mark.parametrize("error", [
+    requests.Timeout("read timed out"),
+    requests.ConnectionError("connection refused"),
+    TimeoutError(),
+    NotteTimeoutError("scrape timed out"),
+    StatusError(503),
+    StatusError(429),
+    ValueError("Request to `/scrape` failed with status code 502: bad gateway"),
+    RuntimeError("unexpected response"),
+])
+def test_backend_failures_count(error):
+    assert is_backend_failure(error)
+
+
+@pytest.mark.parametrize("error", [
+    ValueError("Invalid URL 'not a url'"),
+    StatusError(400),
+    StatusError(404),
+    ValueError("Request to `/scrape` failed with status code 422: invalid url"),
+])
+def test_caller_errors_do_not_count(error):
+    assert not is_backend_failure(error)
+
+
+def test_cause_chain_is_classified():
+    try:
+        try:
+            raise requests.Timeout("read timed out")
+        except requests.Timeout as e:
+            raise RuntimeError("An error occurred while executing the function") from e
+    except RuntimeError as wrapped:
+        assert is_backend_failure(wrapped)
+
+
+def test_caller_errors_leave_the_breaker_closed():
+    guard = ScrapeGuard(domain_rate=1000, domain_burst=1000, failure_threshold=2)
+
+    for _ in range(5):
+        with pytest.raises(ValueError):
+            with guard.slot("https://example.com"):
+                raise ValueError("Invalid URL")
+    assert guard.breaker.state == BREAKER_CLOSED
+    assert guard.breaker.failures == 0
+
+    for _ in range(2):
+        with pytest.raises(requests.Timeout):
+            with guard.slot("https://example.com"):
+                raise requests.Timeout()
+    assert guard.breaker.state == BREAKER_OPEN
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(guard.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_token_bucket_refills_at_its_rate(clock):
+    bucket = TokenBucket(rate=2, burst=2)
+
+    assert bucket.reserve(max_wait=0) == 0.0
+    assert bucket.reserve(max_wait=0) == 0.0
+    assert bucket.reserve(max_wait=0.1) is None
+    assert bucket.rejections == 1
+
+    # A future token is reserved when the wait fits
+    assert bucket.reserve(max_wait=1) == pytest.approx(0.5)
+    assert bucket.waits == 1
+
+    clock[0] += 10
+    assert bucket.reserve(max_wait=0) == 0.0
+    assert bucket.tokens == pytest.approx(1.0)  # capped at the burst, minus the token taken
+
+
+def test_breaker_opens_half_opens_and_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+
+    breaker.record_failure()
+    assert breaker.state == BREAKER_CLOSED
+    breaker.record_failure()
+    assert breaker.state == BREAKER_OPEN
+    assert not breaker.allow()
+    assert breaker.retry_after() == 30
+
+    clock[0] += 30
+    assert breaker.allow()
+    assert breaker.state == BREAKER_HALF_OPEN
+    assert not breaker.allow()  # only one probe at a time
+
+    breaker.record_success()
+    assert breaker.state == BREAKER_CLOSED
+    assert breaker.allow()
+    assert breaker.stats()["trips"] == 1
+
+
+def test_failed_probe_reopens_the_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=5)
+    breaker.record_failure()
+
+    clock[0] += 5
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == BREAKER_OPEN
+    assert breaker.retry_after() == 5
+    assert breaker.trips == 2
+
+
+def test_released_probe_can_be_retried(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=5)
+    breaker.record_failure()
+    clock[0] += 5
+
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == BREAKER_HALF_OPEN
+    assert breaker.allow()
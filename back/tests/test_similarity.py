@@ -0,0 +1,44 @@
+import numpy as np
+
+from src.services.storage.similarity import EmbeddingMatrix, rank_by_similarity, top_k_indices
+
+
+def test_top_k_indices_are_best_first():
+    scores = np.array([0.1, 0.9, 0.5, 0.7, 0.3], dtype=np.float32)
+    assert top_k_indices(scores, 3).tolist() == [1, 3, 2]
+    assert top_k_indices(scores, 10).tolist() == [1, 3, 2, 4, 0]
+    assert top_k_indices(scores, 0).size == 0
+
+
+def test_top_k_matches_a_full_sort():
+    scores = np.random.default_rng(0).random(1000).astype(np.float32)
+    assert top_k_indices(scores, 25).tolist() == np.argsort(-scores)[:25].tolist()
+
+
+def test_rank_by_similarity_orders_and_thresholds():
+    items = [
+        {"id": "orthogonal", "embeddings": [0.0, 1.0]},
+        {"id": "same", "embeddings": [2.0, 0.0]},
+        {"id": "close", "embeddings": "[1.0, 0.5]"},
+    ]
+    results = rank_by_similarity(items, [1.0, 0.0], limit=5, similarity_threshold=0.5)
+    assert [row["id"] for row in results] == ["same", "close"]
+    assert np.isclose(results[0]["similarity"], 1.0)
+    assert np.isclose(results[1]["similarity"], 1 / np.sqrt(1.25))
+
+
+def test_mismatched_and_missing_embeddings_are_skipped():
+    matrix = EmbeddingMatrix.from_items([
+        {"id": "a", "embeddings": [1.0, 0.0]},
+        {"id": "wrong-dim", "embeddings": [1.0, 0.0, 0.0]},
+        {"id": "missing", "embeddings": None},
+        {"id": "malformed", "embeddings": "not json"},
+        {"id": "b", "embeddings": [0.0, 1.0]},
+    ])
+    assert [item["id"] for item in matrix.items] == ["a", "b"]
+    assert matrix.vectors.shape == (2, 2)
+    assert [index for index, _ in matrix.search([0.0, 1.0], limit=1)] == [1]
+
+
+def test_empty_matrix_returns_nothing():
+    assert EmbeddingMatrix.from_items([]).search([1.0, 0.0]) == []
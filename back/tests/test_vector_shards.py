@@ -0,0 +1,101 @@
+from src.services.storage import vector_shards
+from src.services.storage.supabase import Supabase
+from src.services.storage.vector_shards import VectorShardCache
+
+
+def rows(*ids):
+    return [{"id": row_id, "embeddings": [1.0, float(n)]} for n, row_id in enumerate(ids)]
+
+
+def test_shard_is_reloaded_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(vector_shards.time, "monotonic", lambda: now[0])
+    cache = VectorShardCache(ttl=60)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        # Another process deleted "b" between the first and second load
+        return rows("a", "b") if len(loads) == 1 else rows("a")
+
+    assert len(cache.get("pet", loader)) == 2
+    now[0] += 59
+    assert len(cache.get("pet", loader)) == 2
+    assert len(loads) == 1
+
+    now[0] += 1
+    assert len(cache.get("pet", loader)) == 1
+    assert len(loads) == 2
+    stats = cache.stats()
+    assert stats["expirations"] == 1
+    assert stats["bytes"] == cache.get("pet", loader).nbytes
+
+
+def test_local_writes_do_not_extend_ttl(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(vector_shards.time, "monotonic", lambda: now[0])
+    cache = VectorShardCache(ttl=10)
+    cache.get("pet", lambda: rows("a"))
+
+    now[0] = 9
+    cache.add("pet", rows("c"))
+    assert len(cache.get("pet", lambda: rows("a"))) == 2
+
+    now[0] = 10
+    assert len(cache.get("pet", lambda: rows("a"))) == 1
+
+
+class InstanceLookup:
+    """Answers ``table("datainstances").select("pet_id").eq("id", ...).execute()``."""
+
+    def table(self, name):
+        return self
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        return self
+
+    def execute(self):
+        return type("Response", (), {"data": [{"pet_id": "pet"}]})()
+
+
+class ShardStorage(Supabase):
+    def __init__(self):
+        self.client = InstanceLookup()
+        self.vector_shards = VectorShardCache()
+
+    def get_pet(self, pet_id):
+        return {"id": pet_id, "owner_wallet": "wallet"}
+
+
+def test_write_during_first_load_is_not_lost():
+    storage = ShardStorage()
+    assert storage.vector_shards.is_idle()
+
+    def loader():
+        # The shard was read from the database before this write landed
+        storage._update_vector_shards("instance", rows("b"))
+        return rows("a")
+
+    assert len(storage.vector_shards.get(("pet", "pet"), loader)) == 1
+    # The stale shard was not kept, so the next search reloads and sees the write
+    assert len(storage.vector_shards) == 0
+    assert storage.vector_shards.is_idle()
+    assert len(storage.vector_shards.get(("pet", "pet"), lambda: rows("a", "b"))) == 2
+    assert len(storage.vector_shards) == 1
+
+
+def test_failed_load_leaves_the_cache_idle():
+    cache = VectorShardCache()
+
+    def loader():
+        assert not cache.is_idle()
+        raise RuntimeError("database unavailable")
+
+    try:
+        cache.get("pet", loader)
+    except RuntimeError:
+        pass
+    assert cache.is_idle()